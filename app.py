@@ -3,6 +3,7 @@ from __future__ import annotations
 import os
 import json
 import subprocess
+import threading
 from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
@@ -15,17 +16,27 @@ import customtkinter as ctk
 from pdm_sw.workspace import WorkspaceManager
 from pdm_sw.config import ConfigManager, AppConfig, SegmentRule
 from pdm_sw.store import Store
-from pdm_sw.models import Document
+from pdm_sw.activity_writer import ActivityWriter
+from pdm_sw.log_writer import append_line, close_logs
+from pdm_sw.models import Document, DocumentRow
 from pdm_sw.codegen import build_code, build_machine_code, build_group_code
-from pdm_sw.archive import archive_dirs, archive_dirs_for_machine, archive_dirs_for_group, model_path, drw_path, inrev_tag, safe_copy, set_readonly, release_wip, create_inrev, approve_inrev, cancel_inrev, set_obsolete, restore_obsolete
-from pdm_sw.backup import BackupManager
+from pdm_sw.archive import RetryCancelled, archive_dirs, archive_dirs_for_machine, archive_dirs_for_group, model_path, drw_path, inrev_tag, safe_copy, set_readonly, release_wip, create_inrev, approve_inrev, cancel_inrev, set_obsolete, restore_obsolete
+from pdm_sw.backup import BACKUP_EXIT_TIMEOUT_S, BackupJob, BackupManager, wait_backups
+from pdm_sw.backup_verify import install_restore, list_backups, stage_restore, verify_backups
 from pdm_sw.sw_integration import test_solidworks_connection
 from pdm_sw.macro_publish import publish_macro
 from pdm_sw.sw_api import get_solidworks_app, create_model_file, create_drawing_file, open_doc
-from pdm_sw.archive_migration import run_archive_layout_migration
+from pdm_sw.archive_migration import find_open_migration_job, run_archive_layout_migration
+from pdm_sw.archive_snapshot import snapshot_archive
+from pdm_sw.archive_scan import KINDS as ARCHIVE_SCAN_KINDS, scan_archive
+from pdm_sw.checksum_verify import verify_checksums
+from pdm_sw.workflow_batch import BATCH_ACTIONS, run_batch_transition
+from pdm_sw.workspace_pool import WorkspaceContext, WorkspacePool, config_mtime_ns
+from pdm_sw.stat_cache import STAT_CACHE, invalidate_path
 from pdm_sw.session_context import resolve_session_context
 from pdm_sw.sldreg_manager import import_sldreg_filtered, RestoreOptions as SldregRestoreOptions
 from pdm_sw.ui.table import SimpleTable, Table
+from pdm_sw.ui.file_op_mixin import FileOpMixin
 from pdm_sw.ui.rc_copy_mixin import RCCopyMixin
 from pdm_sw.ui.report_mixin import ReportMixin
 from pdm_sw.gui.tab_generatore import TabGeneratore
@@ -43,6 +54,8 @@ LOCAL_SETTINGS_PATH = APP_DIR / "local_settings.json"
 APP_REV = "v50.22"
 APP_TITLE = f"PDM SolidWorks - Workspace Edition | Rev {APP_REV}"
 DOC_LOCK_TTL_SECONDS = 20 * 60
+BACKUP_POLL_MS = 300
+WS_POOL_IDLE_CHECK_MS = 60 * 1000
 WORKFLOW_WIDTH_RATIO_DEFAULT = 0.40
 WORKFLOW_WIDTH_RATIO_MIN = 0.25
 WORKFLOW_WIDTH_RATIO_MAX = 0.60
@@ -59,7 +72,7 @@ def ask(msg: str) -> bool:
     return messagebox.askyesno("PDM", msg)
 
 
-class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
+class PDMApp(RCCopyMixin, ReportMixin, FileOpMixin, ctk.CTk):
     def __init__(self):
         super().__init__()
         ctk.set_appearance_mode("System")
@@ -77,8 +90,16 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
         self.cfg_mgr = ConfigManager(self.ws_mgr.config_path(self.ws_id))
         self.cfg: AppConfig = self.cfg_mgr.load()
 
-        self.store = Store(self.ws_mgr.db_path(self.ws_id))
-        self.backup = BackupManager(self.ws_mgr, self.ws_id, self.store, retention_total=self.cfg.backup.retention_total)
+        self.store = Store(self.ws_mgr.db_path(self.ws_id), recover_intents=True)
+        self.activity_writer = ActivityWriter(self.ws_mgr.db_path(self.ws_id))
+        self.backup = BackupManager(
+            self.ws_mgr, self.ws_id, self.store,
+            retention_total=self.cfg.backup.retention_total,
+            incremental=self.cfg.backup.incremental,
+            chunk_size=self.cfg.backup.chunk_kb * 1024,
+        )
+        # workspace lasciate con uno switch, ancora aperte (ritorno = rebind)
+        self.ws_pool = WorkspacePool()
         self.session = resolve_session_context()
         self.lock_ttl_seconds = DOC_LOCK_TTL_SECONDS
         self.workflow_width_ratio = self._load_workflow_width_ratio()
@@ -92,7 +113,13 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
 
         self._build_ui()
         self._refresh_all()
-        self._log_activity("APP_START", message=f"Desktop avviato | user_source={self.session.get('source','UNKNOWN')}")
+        self._log_activity(
+            "APP_START",
+            message=f"Desktop avviato | user_source={self.session.get('source','UNKNOWN')}",
+            details={"db_open": self.store.open_stats},
+        )
+        self._report_workflow_recovery()
+        self.after(WS_POOL_IDLE_CHECK_MS, self._close_idle_workspaces)
 
     # ---------------- UI
     def _build_ui(self) -> None:
@@ -309,8 +336,12 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
         message: str = "",
         details: dict | None = None,
     ) -> None:
+        # scrittura asincrona (mai bloccare la UI per l'audit); sincrona dentro una
+        # transazione: la riga segue commit/rollback della stessa unit of work
+        writer = getattr(self, "activity_writer", None)
+        sink = writer.submit if writer is not None and not self.store.in_transaction else self.store.add_activity
         try:
-            self.store.add_activity(
+            sink(
                 workspace_id=self.ws_id,
                 session_id=str(self.session.get("session_id", "")),
                 user_id=str(self.session.get("user_id", "")),
@@ -632,10 +663,12 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             self.store.release_session_locks(str(self.session.get("session_id", "")))
         except Exception:
             pass
+        self._close_activity_writer()
         try:
             self.store.close()
         except Exception:
             pass
+        self.ws_pool.close_all()
 
         self.shared_root = new_root
         self.workspaces_dir = self.shared_root / "WORKSPACES"
@@ -645,8 +678,14 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
 
         self.cfg_mgr = ConfigManager(self.ws_mgr.config_path(self.ws_id))
         self.cfg = self.cfg_mgr.load()
-        self.store = Store(self.ws_mgr.db_path(self.ws_id))
-        self.backup = BackupManager(self.ws_mgr, self.ws_id, self.store, retention_total=self.cfg.backup.retention_total)
+        self.store = Store(self.ws_mgr.db_path(self.ws_id), recover_intents=True)
+        self.activity_writer = ActivityWriter(self.ws_mgr.db_path(self.ws_id))
+        self.backup = BackupManager(
+            self.ws_mgr, self.ws_id, self.store,
+            retention_total=self.cfg.backup.retention_total,
+            incremental=self.cfg.backup.incremental,
+            chunk_size=self.cfg.backup.chunk_kb * 1024,
+        )
         self._rebind_workspace_context_to_tabs(refresh_sw_tab=True)
         self._save_local_settings()
         self._refresh_all()
@@ -1569,6 +1608,8 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             else:
                 warn(r2.message + ("\n\n" + r2.details if r2.details else ""))
 
+        invalidate_path(out_model)
+        invalidate_path(out_drw)
         up: dict[str, str] = {}
         if out_model.is_file() or created_model:
             up["file_wip_path"] = str(out_model)
@@ -1906,7 +1947,15 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
         return columns, headings, props_u, key_index
 
     def _flag_file_exists(self, path_s: str) -> str:
-        return "OK" if (path_s and Path(path_s).is_file()) else ""
+        # esistenza da cache elenco cartelle (uno scandir per cartella, TTL)
+        return "OK" if (path_s and STAT_CACHE.is_file(path_s)) else ""
+
+    def _prefetch_file_flags(self, docs) -> None:
+        """Legge in blocco le cartelle dei file M/D dei documenti da mostrare."""
+        paths = []
+        for d in docs:
+            paths.extend(self._best_model_and_drw_paths(d))
+        STAT_CACHE.prefetch(paths)
 
     def _state_row_tag(self, state: str) -> str:
         s = (state or "").strip().upper()
@@ -1985,6 +2034,7 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
 
         codes = [d.code for d in docs]
         custom_bulk = self.store.get_custom_values_bulk(codes, props) if props else {}
+        self._prefetch_file_flags(docs)
 
         rows = []
         for d in docs:
@@ -2557,9 +2607,7 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
     def _wf_backup_event(self, reason: str):
         if not self.cfg.backup.enabled:
             return
-        res = self.backup.backup_now(reason, force=True)
-        if not res.ok:
-            warn(res.message)
+        self._watch_backup_job(self.backup.start_backup(reason, force=True))
 
     def _save_workflow_doc(self, doc: Document) -> None:
         self.store.update_document(
@@ -2747,6 +2795,7 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
 
         # bulk sw props values
         sw_values = self.store.get_custom_values_bulk([d.code for d in docs], props) if props else {}
+        self._prefetch_file_flags(docs)
 
         rows = []
         for d in docs:
@@ -2882,9 +2931,7 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
     def _wf_backup_event(self, reason: str):
         if not self.cfg.backup.enabled:
             return
-        res = self.backup.backup_now(reason, force=True)
-        if not res.ok:
-            warn(res.message)
+        self._watch_backup_job(self.backup.start_backup(reason, force=True))
 
     def _save_workflow_doc(self, doc: Document) -> None:
         self.store.update_document(
@@ -2969,6 +3016,112 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             rev_after=rev_after,
         )
 
+    def _commit_workflow_transition(
+        self,
+        action_label: str,
+        doc: Document,
+        event_type: str,
+        from_state: str,
+        note: str,
+        rev_before: int,
+        clear_checkout: bool = True,
+        result=None,
+        journal=None,
+    ) -> None:
+        """Salva documento, nota, checkout e activity della transizione in un unico commit.
+
+        Con `journal` l'intent write-ahead viene chiuso nello stesso commit.
+        """
+        note_error = None
+        checksums = list(getattr(result, "checksums", None) or [])
+        copies = list(getattr(result, "copies", None) or [])
+        details: dict = {}
+        if copies:
+            total_b = sum(c.bytes for c in copies)
+            total_s = sum(c.seconds for c in copies)
+            details = {
+                "copies": [c.to_details() for c in copies],
+                "copy_bytes": total_b,
+                "copy_ms": round(total_s * 1000.0, 1),
+                "copy_mb_s": round(total_b / total_s / 1e6, 2) if total_s > 0 else 0.0,
+            }
+        with self.store.transaction():
+            self._save_workflow_doc(doc)
+            if journal is not None:
+                self.store.complete_workflow_intent(journal.intent_id)
+            if checksums:
+                self.store.record_file_checksums(
+                    doc.code, [(x.role, x.revision, x.path, x.sha256, x.size) for x in checksums]
+                )
+            try:
+                with self.store.transaction():
+                    self._save_workflow_state_note(
+                        code=doc.code,
+                        event_type=event_type,
+                        from_state=from_state,
+                        to_state=doc.state,
+                        note=note,
+                        rev_before=rev_before,
+                        rev_after=int(doc.revision),
+                    )
+            except Exception as e:
+                note_error = e
+            if clear_checkout:
+                try:
+                    with self.store.transaction():
+                        self.store.clear_document_checkout(doc.code)
+                except Exception:
+                    pass
+            self._log_activity(
+                action=f"WF_{action_label.upper()}",
+                code=doc.code,
+                status="OK",
+                message="Transizione eseguita.",
+                details=details,
+            )
+        if note_error is not None:
+            warn(f"Cambio stato eseguito, ma salvataggio nota fallito: {note_error}")
+
+    def _report_workflow_recovery(self) -> None:
+        """Avvisa se all'apertura del DB sono state completate/annullate transizioni interrotte.
+
+        Una volta sola: lo Store puo tornare dal pool workspace con gli stessi open_stats.
+        """
+        items = list((self.store.open_stats or {}).pop("recovered_intents", None) or [])
+        if not items:
+            return
+        lines = [
+            f"{x['code']} {x['action']}: {x['result']}" + (f" ({x['message']})" if x.get("message") else "")
+            for x in items[:15]
+        ]
+        if len(items) > 15:
+            lines.append(f"... altre {len(items) - 15}")
+        msg = "Transizioni workflow interrotte ripristinate all'apertura del DB:\n" + "\n".join(lines)
+        if any(x["result"] == "FAILED" for x in items):
+            warn(msg + "\n\nVerifica i documenti segnalati (VERIFICA ARCHIVIO).")
+        else:
+            info(msg)
+
+    def _begin_workflow_intent(self, doc: Document, event_type: str, from_state: str, note: str, rev_before: int):
+        """Apre l'intent write-ahead della transizione; None se il DB non lo consente."""
+        try:
+            return self.store.begin_workflow_intent(
+                doc.code,
+                event_type,
+                session_id=str(self.session.get("session_id", "")),
+                host=str(self.session.get("host", "")),
+                payload={
+                    "event_type": event_type,
+                    "from_state": from_state,
+                    "rev_before": int(rev_before),
+                    "note": note,
+                    "clear_checkout": True,
+                    "user": str(self.session.get("display_name", "")),
+                },
+            )
+        except Exception:
+            return None
+
     def _close_sw_docs_for_workflow(self, doc: Document) -> None:
         """Best effort: chiude eventuali documenti SW aperti coinvolti nel workflow."""
         try:
@@ -3043,10 +3196,28 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
                 except Exception:
                     pass
 
+    def _on_file_op_busy(self, busy: bool) -> None:
+        """Hook di FileOpMixin: comandi workflow disabilitati finche l'operazione file e in corso."""
+        tab = getattr(self, "tab_operativo_obj", None)
+        if tab:
+            tab.set_workflow_busy(busy)
+
     def _run_workflow_transition(self, action_label: str, fn, *args, **kwargs):
+        """Lock, chiusura in SolidWorks e operazioni file della transizione.
+
+        begin_intent(), se dato, apre il giornale write-ahead dopo il lock e lo
+        passa a `fn` come journal; se la transizione non riesce prima dei
+        passi file l'intent viene chiuso qui (niente recovery spuria).
+        """
+        begin_intent = kwargs.pop("begin_intent", None)
+        if getattr(self, "_file_op_active", False):
+            warn("Operazione workflow gia in corso: attendere il completamento.")
+            return None
         locked_code = ""
         has_lock = False
-        if args and isinstance(args[0], Document):
+        journal = None
+        succeeded = False
+        if args and isinstance(args[0], (Document, DocumentRow)):
             locked_code = str(args[0].code or "").strip()
             ok, _holder = self._acquire_doc_lock(locked_code, action=f"WF_{action_label.upper()}")
             if not ok:
@@ -3060,11 +3231,26 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
                 kwargs.setdefault("log_file", str(self._workflow_log_path()))
             except Exception:
                 pass
+            if fn in (release_wip, create_inrev, approve_inrev):
+                kwargs.setdefault("progress", self._copy_progress)
+        if begin_intent is not None:
+            journal = begin_intent()
+            if journal is not None:
+                kwargs["journal"] = journal
         try:
-            out = fn(*args, **kwargs)
-            if locked_code:
-                self._log_activity(action=f"WF_{action_label.upper()}", code=locked_code, status="OK", message="Transizione eseguita.")
+            # operazioni file in un thread di lavoro: UI viva e tentativi su file bloccati annullabili
+            out = self._run_file_op(f"Workflow: {action_label} {locked_code}".strip(), fn, *args, **kwargs)
+            # l'activity OK viene scritta da _commit_workflow_transition, nello stesso commit del documento
+            res = out[1] if isinstance(out, tuple) and len(out) > 1 else None
+            if locked_code and res is not None and not getattr(res, "ok", True):
+                self._log_activity(action=f"WF_{action_label.upper()}", code=locked_code, status="ERROR", message=str(getattr(res, "message", "")))
+            succeeded = res is not None and bool(getattr(res, "ok", False))
             return out
+        except RetryCancelled as e:
+            if locked_code:
+                self._log_activity(action=f"WF_{action_label.upper()}", code=locked_code, status="CANCELLED", message=str(e))
+            warn(f"Operazione annullata: nessuna modifica applicata.\n\nDettaglio: {e}")
+            return None
         except FileExistsError as e:
             if locked_code:
                 self._log_activity(action=f"WF_{action_label.upper()}", code=locked_code, status="ERROR", message=f"File exists: {e}")
@@ -3089,9 +3275,31 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             warn(f"Errore durante {action_label}: {e}")
             return None
         finally:
+            if journal is not None and not succeeded:
+                try:
+                    journal.discard(f"{action_label} non eseguita")
+                except Exception:
+                    pass
+            if kwargs.get("progress") is not None:
+                self._copy_progress_done()
             if has_lock and locked_code:
                 self._release_doc_lock(locked_code)
 
+    def _copy_progress(self, done: int, total: int, bps: float) -> None:
+        """Progresso copia file nel titolo finestra (la UI resta ridisegnata)."""
+        try:
+            pct = int(done * 100 / total) if total > 0 else 100
+            self.title(f"{APP_TITLE} - copia file {pct}% ({done / 1e6:.1f}/{total / 1e6:.1f} MB, {bps / 1e6:.1f} MB/s)")
+            self.update_idletasks()
+        except Exception:
+            pass
+
+    def _copy_progress_done(self) -> None:
+        try:
+            self.title(APP_TITLE)
+        except Exception:
+            pass
+
     def _wf_release(self):
         doc = self._load_selected_doc()
         if not doc:
@@ -3113,23 +3321,15 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
         if not res.ok:
             warn(res.message)
             return
-        self._save_workflow_doc(doc2)
-        try:
-            self._save_workflow_state_note(
-                code=doc.code,
-                event_type="RELEASE",
-                from_state=from_state,
-                to_state=doc2.state,
-                note=note,
-                rev_before=rev_before,
-                rev_after=int(doc2.revision),
-            )
-        except Exception as e:
-            warn(f"Cambio stato eseguito, ma salvataggio nota fallito: {e}")
-        try:
-            self.store.clear_document_checkout(doc.code)
-        except Exception:
-            pass
+        self._commit_workflow_transition(
+            "release",
+            doc2,
+            event_type="RELEASE",
+            from_state=from_state,
+            note=note,
+            rev_before=rev_before,
+            result=res,
+        )
         self._wf_backup_event("release")
         self._refresh_all()
 
@@ -3152,19 +3352,16 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
         if not res.ok:
             warn(res.message)
             return
-        self._save_workflow_doc(doc2)
-        try:
-            self._save_workflow_state_note(
-                code=doc.code,
-                event_type="CREATE_REV",
-                from_state=from_state,
-                to_state=doc2.state,
-                note=note,
-                rev_before=rev_before,
-                rev_after=int(doc2.revision),
-            )
-        except Exception as e:
-            warn(f"Cambio stato eseguito, ma salvataggio nota fallito: {e}")
+        self._commit_workflow_transition(
+            "creazione revisione",
+            doc2,
+            event_type="CREATE_REV",
+            from_state=from_state,
+            note=note,
+            rev_before=rev_before,
+            result=res,
+            clear_checkout=False,
+        )
         self._wf_backup_event("create_rev")
         self._refresh_all()
 
@@ -3182,30 +3379,40 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
         note = self._prompt_workflow_note(doc.code, "Approva revisione", from_state, "REL")
         if note is None:
             return
-        out = self._run_workflow_transition("approvazione revisione", approve_inrev, doc, self.cfg.solidworks.archive_root)
-        if out is None:
-            return
-        doc2, res = out
-        if not res.ok:
-            warn(res.message)
-            return
-        self._save_workflow_doc(doc2)
+        journals: list = []
+
+        def _begin():
+            # aperto da _run_workflow_transition dopo il lock, subito prima dei file
+            j = self._begin_workflow_intent(doc, "APPROVE_REV", from_state, note, rev_before)
+            if j is not None:
+                journals.append(j)
+            return j
+
+        journal = None
         try:
-            self._save_workflow_state_note(
-                code=doc.code,
+            out = self._run_workflow_transition(
+                "approvazione revisione", approve_inrev, doc, self.cfg.solidworks.archive_root, begin_intent=_begin
+            )
+            journal = journals[0] if journals else None
+            if out is None:
+                return
+            doc2, res = out
+            if not res.ok:
+                warn(res.message)
+                return
+            self._commit_workflow_transition(
+                "approvazione revisione",
+                doc2,
                 event_type="APPROVE_REV",
                 from_state=from_state,
-                to_state=doc2.state,
                 note=note,
                 rev_before=rev_before,
-                rev_after=int(doc2.revision),
+                result=res,
+                journal=journal,
             )
-        except Exception as e:
-            warn(f"Cambio stato eseguito, ma salvataggio nota fallito: {e}")
-        try:
-            self.store.clear_document_checkout(doc.code)
-        except Exception:
-            pass
+        finally:
+            for j in journals:
+                j.close()
         self._wf_backup_event("approve_rev")
         self._refresh_all()
 
@@ -3230,23 +3437,14 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
         if not res.ok:
             warn(res.message)
             return
-        self._save_workflow_doc(doc2)
-        try:
-            self._save_workflow_state_note(
-                code=doc.code,
-                event_type="CANCEL_REV",
-                from_state=from_state,
-                to_state=doc2.state,
-                note=note,
-                rev_before=rev_before,
-                rev_after=int(doc2.revision),
-            )
-        except Exception as e:
-            warn(f"Cambio stato eseguito, ma salvataggio nota fallito: {e}")
-        try:
-            self.store.clear_document_checkout(doc.code)
-        except Exception:
-            pass
+        self._commit_workflow_transition(
+            "annullamento revisione",
+            doc2,
+            event_type="CANCEL_REV",
+            from_state=from_state,
+            note=note,
+            rev_before=rev_before,
+        )
         self._wf_backup_event("cancel_rev")
         self._refresh_all()
 
@@ -3267,25 +3465,152 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             warn(res.message)
             return
         doc2.obs_prev_state = prev_state if prev_state in ("WIP", "REL", "IN_REV") else ""
-        self._save_workflow_doc(doc2)
+        self._commit_workflow_transition(
+            "impostazione OBS",
+            doc2,
+            event_type="SET_OBSOLETE",
+            from_state=prev_state,
+            note=note,
+            rev_before=rev_before,
+        )
+        self._wf_backup_event("obsolete")
+        self._refresh_all()
+
+    def _batch_precheck(self, action: str):
+        """Verifiche per codice della transizione multipla (messaggio = escluso, senza popup)."""
+        me, _host = self._checkout_identity()
+
+        def check(doc: Document) -> str:
+            needs_checkout = action == "approve" or (action == "release" and str(doc.state or "").upper() == "WIP")
+            if not needs_checkout:
+                return ""
+            if not bool(getattr(doc, "checked_out", False)):
+                return "Documento non in CHECK-OUT."
+            owner = str(getattr(doc, "checkout_owner_user", "") or "").strip()
+            if not me or owner != me:
+                return f"Documento in CHECK-OUT da {owner or 'altro utente'}."
+            return ""
+
+        return check
+
+    def _wf_batch_dialog(self):
+        t = getattr(self, "tab_operativo_obj", None)
+        codes = t._get_selected_rc_codes() if t is not None and hasattr(t, "_get_selected_rc_codes") else []
+        if not codes:
+            warn("Seleziona uno o piu codici nella tabella (Ctrl/Shift + click).")
+            return
+
+        dlg = ctk.CTkToplevel(self)
+        dlg.title("Transizione multipla")
+        dlg.geometry("460x260")
+        dlg.grab_set()
+        ctk.CTkLabel(dlg, text=f"Codici selezionati: {len(codes)}", font=ctk.CTkFont(size=15, weight="bold")).pack(anchor="w", padx=12, pady=(12, 4))
+        preview = ", ".join(codes[:6]) + (" ..." if len(codes) > 6 else "")
+        ctk.CTkLabel(dlg, text=preview, text_color="#555555", wraplength=430, justify="left").pack(anchor="w", padx=12, pady=(0, 10))
+
+        labels = {
+            f"{a.label} ({'/'.join(a.from_states)} -> {a.to_state})": key for key, a in BATCH_ACTIONS.items()
+        }
+        action_var = tk.StringVar(value=next(iter(labels)))
+        ctk.CTkOptionMenu(dlg, variable=action_var, values=list(labels), width=420).pack(anchor="w", padx=12, pady=6)
+
+        def _run():
+            key = labels[action_var.get()]
+            dlg.destroy()
+            self._wf_batch_run(key, codes)
+
+        row = ctk.CTkFrame(dlg, fg_color="transparent")
+        row.pack(fill="x", side="bottom", padx=12, pady=12)
+        ctk.CTkButton(row, text="Annulla", width=110, command=dlg.destroy).pack(side="right", padx=(6, 0))
+        ctk.CTkButton(row, text="ESEGUI", width=110, command=_run).pack(side="right")
+
+    def _wf_batch_run(self, action: str, codes: list) -> None:
+        act = BATCH_ACTIONS[action]
+        note = self._prompt_workflow_note(f"{len(codes)} codici", act.label, "/".join(act.from_states), act.to_state)
+        if note is None:
+            return
+        actor = {
+            "workspace_id": self.ws_id,
+            "session_id": str(self.session.get("session_id", "")),
+            "user_id": str(self.session.get("user_id", "")),
+            "user_display": str(self.session.get("display_name", "")),
+            "host": str(self.session.get("host", "")),
+        }
         try:
-            self._save_workflow_state_note(
-                code=doc.code,
-                event_type="SET_OBSOLETE",
-                from_state=prev_state,
-                to_state=doc2.state,
-                note=note,
-                rev_before=rev_before,
-                rev_after=int(doc2.revision),
+            log_file = str(self._workflow_log_path())
+        except Exception:
+            log_file = None
+
+        if getattr(self, "_file_op_active", False):
+            warn("Operazione file gia in corso: attendere il completamento.")
+            return
+
+        def _progress(done: int, total: int) -> None:
+            try:
+                self.title(f"{APP_TITLE} - transizione multipla {done}/{total}")
+            except Exception:
+                pass
+
+        def _run_files(fn, *args, **kwargs):
+            # fase file in un thread di lavoro: UI attiva, Annulla sui file bloccati
+            return self._run_file_op(
+                f"Transizione multipla: {act.label} ({len(codes)} codici)", fn, *args,
+                progress_fmt=lambda done, total: f"Codici completati: {done}/{total}", **kwargs,
             )
-        except Exception as e:
-            warn(f"Cambio stato eseguito, ma salvataggio nota fallito: {e}")
+
+        self.configure(cursor="watch")
         try:
-            self.store.clear_document_checkout(doc.code)
-        except Exception:
-            pass
-        self._wf_backup_event("obsolete")
-        self._refresh_all()
+            res = run_batch_transition(
+                self.store,
+                action,
+                codes,
+                note,
+                actor,
+                archive_root=str(self.cfg.solidworks.archive_root or ""),
+                log_file=log_file,
+                lock_ttl_seconds=self.lock_ttl_seconds,
+                precheck=self._batch_precheck(action),
+                before_files=self._close_sw_docs_for_workflow,
+                progress=_progress,
+                run_files=_run_files,
+            )
+        except Exception as e:
+            self._log_activity(f"WF_{action.upper()}_BATCH", status="ERROR", message=str(e))
+            warn(f"Transizione multipla fallita: {e}")
+            return
+        finally:
+            self.configure(cursor="")
+            self._copy_progress_done()
+
+        self._log_activity(
+            f"WF_{action.upper()}_BATCH",
+            status="OK" if not res.failed else "WARN",
+            message=f"ok={res.ok_count} err={len(res.failed)} t={res.elapsed_s}s",
+            details={"failed": {x.code: x.message for x in res.failed}},
+        )
+        if res.ok_count:
+            self._wf_backup_event(f"{action}_batch")
+            self._refresh_all()
+        self._show_batch_results(act.label, res)
+
+    def _show_batch_results(self, label: str, res) -> None:
+        top = ctk.CTkToplevel(self)
+        top.title(f"Esito transizione multipla - {label}")
+        top.geometry("760x460")
+        ctk.CTkLabel(
+            top,
+            text=f"{label}: {res.ok_count} OK, {len(res.failed)} non eseguiti ({res.elapsed_s} s)",
+            font=ctk.CTkFont(size=15, weight="bold"),
+        ).pack(anchor="w", padx=12, pady=(12, 6))
+        box = ctk.CTkTextbox(top)
+        box.pack(fill="both", expand=True, padx=12, pady=6)
+        for x in res.items:
+            if x.ok:
+                box.insert("end", f"OK   {x.code}  {x.from_state} -> {x.to_state}  rev {x.rev_after:02d}\n")
+            else:
+                box.insert("end", f"ERR  {x.code}  {x.message}\n")
+        box.configure(state="disabled")
+        ctk.CTkButton(top, text="Chiudi", width=120, command=top.destroy).pack(side="right", padx=12, pady=12)
 
     def _wf_restore_obs(self):
         doc = self._load_selected_doc()
@@ -3310,23 +3635,14 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             warn(res.message)
             return
         doc2.obs_prev_state = ""
-        self._save_workflow_doc(doc2)
-        try:
-            self._save_workflow_state_note(
-                code=doc.code,
-                event_type="RESTORE_OBS",
-                from_state="OBS",
-                to_state=doc2.state,
-                note=note,
-                rev_before=rev_before,
-                rev_after=int(doc2.revision),
-            )
-        except Exception as e:
-            warn(f"Cambio stato eseguito, ma salvataggio nota fallito: {e}")
-        try:
-            self.store.clear_document_checkout(doc.code)
-        except Exception:
-            pass
+        self._commit_workflow_transition(
+            "ripristino da OBS",
+            doc2,
+            event_type="RESTORE_OBS",
+            from_state="OBS",
+            note=note,
+            rev_before=rev_before,
+        )
         self._wf_backup_event("restore_obs")
         self._refresh_all()
 
@@ -3585,7 +3901,7 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
     def _workspace_tools_dialog(self):
         dlg = ctk.CTkToplevel(self)
         dlg.title("Workspace e Cartella Condivisa")
-        dlg.geometry("560x380")
+        dlg.geometry("560x480")
         dlg.grab_set()
 
         ctk.CTkLabel(dlg, text="Strumenti Workspace", font=ctk.CTkFont(size=15, weight="bold")).pack(anchor="w", padx=12, pady=(12, 6))
@@ -3619,14 +3935,351 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             hover_color="#0A58CA",
             command=lambda: _open_and_close("_migrate_archive_layout_dialog"),
         ).grid(row=3, column=0, columnspan=2, sticky="ew", padx=6, pady=6)
+        ctk.CTkButton(
+            grid,
+            text="VERIFICA ARCHIVIO",
+            state="disabled" if getattr(self, "_archive_scan_running", False) else "normal",
+            command=lambda: _open_and_close("_archive_scan_dialog"),
+        ).grid(row=4, column=0, sticky="ew", padx=6, pady=6)
+        ctk.CTkButton(
+            grid,
+            text="VERIFICA CHECKSUM",
+            state="disabled" if getattr(self, "_checksum_verify_running", False) else "normal",
+            command=lambda: _open_and_close("_checksum_verify_dialog"),
+        ).grid(row=4, column=1, sticky="ew", padx=6, pady=6)
+        ctk.CTkButton(
+            grid,
+            text="VERIFICA / RIPRISTINA BACKUP",
+            command=lambda: _open_and_close("_backup_tools_dialog"),
+        ).grid(row=5, column=0, sticky="ew", padx=6, pady=6)
+        ctk.CTkButton(
+            grid,
+            text="SNAPSHOT ARCHIVIO CAD",
+            command=lambda: _open_and_close("_archive_snapshot_dialog"),
+        ).grid(row=5, column=1, sticky="ew", padx=6, pady=6)
 
         ctk.CTkButton(dlg, text="Chiudi", width=120, command=dlg.destroy).pack(side="right", padx=12, pady=12)
 
+    def _backup_tools_dialog(self):
+        backups = list_backups(self.ws_mgr.backups_dir(self.ws_id))
+        dlg = ctk.CTkToplevel(self)
+        dlg.title("Backup workspace")
+        dlg.geometry("1000x520")
+        dlg.transient(self)
+
+        ctk.CTkLabel(dlg, text=f"Backup di {self.ws.name}: {len(backups)}", font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w", padx=12, pady=(12, 6))
+        cols = ["name", "created", "reason", "kind", "size", "status", "detail"]
+        table = SimpleTable(dlg, columns=cols, headings=["File", "Data", "Motivo", "Tipo", "DB (MB)", "Esito", "Dettaglio"], key_index=0)
+        table.pack(fill="both", expand=True, padx=12, pady=6)
+        by_name = {b.name: b for b in backups}
+        status: dict = {b.name: ("" if not b.error else "ERRORE", b.error) for b in backups}
+
+        def _rows() -> None:
+            table.set_rows([
+                [b.name, b.created_at, b.reason, b.kind, f"{b.db_size / 1e6:.1f}", *status[b.name]]
+                for b in backups
+            ])
+
+        _rows()
+        bottom = ctk.CTkFrame(dlg, fg_color="transparent")
+        bottom.pack(fill="x", padx=12, pady=(4, 12))
+        msg_var = tk.StringVar(value="")
+        name_var = tk.StringVar(value="")
+        ctk.CTkLabel(bottom, text="Nome nuova workspace").pack(side="left", padx=(0, 6))
+        ctk.CTkEntry(bottom, textvariable=name_var, width=220).pack(side="left", padx=6)
+        ctk.CTkLabel(bottom, textvariable=msg_var).pack(side="left", padx=12)
+        busy = {"on": False}
+
+        def _background(work, on_done, tick=None) -> None:
+            busy["on"] = True
+
+            def _done(res, exc) -> None:
+                busy["on"] = False
+                on_done(res, exc)
+
+            self._run_in_background(work, _done, tick)
+
+        def _verify() -> None:
+            if busy["on"] or not backups:
+                return
+            msg_var.set(f"Verifica 0/{len(backups)}...")
+            prog = {"i": 0}
+
+            def _progress(i: int, total: int, chk) -> None:
+                # thread worker: solo dati, la UI si aggiorna in _tick
+                status[chk.backup.name] = (chk.status, chk.detail or f"v{chk.user_version} | {len(chk.table_rows)} tabelle | "
+                                           f"{sum(n for n in chk.table_rows.values() if n > 0)} righe")
+                prog["i"] = i
+
+            def _tick() -> None:
+                msg_var.set(f"Verifica {prog['i']}/{len(backups)}...")
+
+            def _done(rep, exc) -> None:
+                if exc is not None:
+                    msg_var.set("")
+                    warn(f"Verifica backup fallita: {exc}")
+                    return
+                try:
+                    _rows()
+                except Exception:
+                    return  # finestra chiusa
+                msg_var.set(f"Verificati {len(rep.checks)} backup, anomalie {len(rep.failed)} ({rep.elapsed_s} s)")
+                self._log_activity(
+                    "BACKUP_VERIFY",
+                    status="OK" if not rep.failed else "WARN",
+                    message=f"backups={len(rep.checks)} failures={len(rep.failed)} t={rep.elapsed_s}s",
+                    details={"report": rep.report_path},
+                )
+
+            report_dir = self._report_dir()
+            _background(lambda: verify_backups(backups, report_dir=report_dir, progress=_progress), _done, _tick)
+
+        def _restore() -> None:
+            if busy["on"]:
+                return
+            sel = table.tree.selection()
+            if not sel:
+                warn("Seleziona un backup.")
+                return
+            info_b = by_name.get(table._item_key(sel[0]))
+            name = (name_var.get() or "").strip()
+            if info_b is None:
+                return
+            if not name:
+                warn("Inserisci il nome della nuova workspace.")
+                return
+            msg_var.set(f"Ripristino {info_b.name}...")
+
+            def _done(staged, exc) -> None:
+                if exc is not None:
+                    msg_var.set("")
+                    self._log_activity("BACKUP_RESTORE", status="ERROR", message=f"{info_b.name}: {exc}")
+                    warn(f"Ripristino fallito: {exc}")
+                    return
+                db, cfg_text = staged
+                try:
+                    ws = install_restore(self.ws_mgr, db, cfg_text, name, f"Ripristino di {info_b.name}")
+                except Exception as e:
+                    warn(f"Ripristino fallito: {e}")
+                    return
+                self._log_activity("BACKUP_RESTORE", status="OK", message=f"{info_b.name} -> {ws.name} ({ws.id})")
+                try:
+                    dlg.destroy()
+                except Exception:
+                    pass
+                if ask(f"Workspace '{ws.name}' creata dal backup {info_b.name}.\n\nAttivarla ora?"):
+                    self._switch_workspace(ws.id)
+
+            base_dir = self.ws_mgr.base_dir
+            _background(lambda: stage_restore(info_b, base_dir), _done)
+
+        ctk.CTkButton(bottom, text="Chiudi", width=100, command=dlg.destroy).pack(side="right", padx=6)
+        ctk.CTkButton(bottom, text="Ripristina in nuova workspace", command=_restore).pack(side="right", padx=6)
+        ctk.CTkButton(bottom, text="Verifica tutti", width=120, command=_verify).pack(side="right", padx=6)
+
+    def _archive_snapshot_dir(self) -> Path:
+        custom = str(getattr(self.cfg.backup, "archive_snapshot_dir", "") or "").strip()
+        return Path(custom) if custom else self.ws_mgr.backups_dir(self.ws_id) / "archive"
+
+    def _archive_snapshot_dialog(self):
+        archive_root = str(getattr(self.cfg.solidworks, "archive_root", "") or "").strip()
+        if not archive_root:
+            warn("Archivio non configurato (tab SolidWorks).")
+            return
+        if getattr(self, "_snapshot_cancel", None) is not None:
+            warn("Snapshot archivio gia in corso.")
+            return
+        store_dir = self._archive_snapshot_dir()
+        if not ask(
+            "Snapshot incrementale dell'archivio CAD.\n\n"
+            f"Archivio: {archive_root}\nDestinazione: {store_dir}\n\n"
+            "Vengono copiati solo i file nuovi o modificati; prima viene eseguito un backup del DB. Procedere?"
+        ):
+            return
+        bkp = self.backup.backup_now("archive_snapshot", force=True)
+        if not bkp.ok:
+            self._log_activity("ARCHIVE_SNAPSHOT", status="ERROR", message=f"Backup DB fallito: {bkp.message}")
+            warn(f"Backup DB fallito: {bkp.message}")
+            return
+
+        cancel = threading.Event()
+        self._snapshot_cancel = cancel
+        prog = {"done": 0, "total": 0}
+
+        def _progress(done: int, total: int) -> None:
+            prog["done"], prog["total"] = done, total
+
+        def _tick() -> None:
+            if prog["total"]:
+                self.title(f"{APP_TITLE} - snapshot archivio {prog['done']}/{prog['total']}")
+
+        def _done(res, exc) -> None:
+            self._snapshot_cancel = None
+            self.title(APP_TITLE)
+            if exc is not None:
+                self._log_activity("ARCHIVE_SNAPSHOT", status="ERROR", message=str(exc))
+                warn(f"Snapshot archivio fallito: {exc}")
+                return
+            self._log_activity(
+                "ARCHIVE_SNAPSHOT",
+                status="OK" if res.ok else "ERROR",
+                message=f"files={res.files} new={res.new_files} changed={res.changed_files} "
+                        f"linked={res.linked} t={res.elapsed_s}s",
+                details={"snapshot": res.path, "db_backup": res.db_backup, "errors": res.errors[:20]},
+            )
+            msg = (
+                f"File: {res.files}\n"
+                f"Nuovi: {res.new_files} | Modificati: {res.changed_files}\n"
+                f"Invariati (hardlink): {res.linked} (di cui verificati con hash: {res.hashed})\n"
+                f"Copiati: {res.bytes_copied / 1e6:.1f} MB\n"
+                f"Snapshot rimossi (retention): {res.removed_snapshots}\n\n"
+                f"Tempo: {res.elapsed_s} s\nSnapshot: {res.path or '-'}\nBackup DB: {res.db_backup}"
+            )
+            if res.errors:
+                warn("Snapshot archivio con errori.\n\n" + msg + "\n\nErrori (estratto):\n" + "\n".join(res.errors[:8]))
+                return
+            info("Snapshot archivio completato.\n\n" + msg)
+
+        retention = int(getattr(self.cfg.backup, "archive_snapshot_retention", 10) or 10)
+        self._run_in_background(
+            lambda: snapshot_archive(
+                archive_root, store_dir, db_backup=str(bkp.path or ""),
+                retention=retention, progress=_progress, cancel=cancel,
+            ),
+            _done,
+            _tick,
+        )
+
+    def _archive_scan_dialog(self):
+        archive_root = str(getattr(self.cfg.solidworks, "archive_root", "") or "").strip()
+        if not archive_root:
+            warn("Archivio non configurato (tab SolidWorks).")
+            return
+        if getattr(self, "_archive_scan_running", False):
+            warn("Verifica archivio gia in corso.")
+            return
+        self._archive_scan_running = True
+        db_path = self.store.db_path
+        report_dir = self._report_dir()
+        prog = {"done": 0, "total": 0}
+
+        def _progress(done: int, total: int) -> None:
+            prog["done"], prog["total"] = done, total
+
+        def _work():
+            # connessione propria: quella della UI e legata al thread Tk
+            store = Store(db_path)
+            try:
+                return scan_archive(store, archive_root, report_dir, progress=_progress)
+            finally:
+                store.close()
+
+        def _tick() -> None:
+            if prog["total"]:
+                self.title(f"{APP_TITLE} - verifica archivio {prog['done']}/{prog['total']} cartelle")
+
+        def _done(res, exc) -> None:
+            self._archive_scan_running = False
+            self.title(APP_TITLE)
+            if exc is not None:
+                self._log_activity("ARCHIVE_SCAN", status="ERROR", message=str(exc))
+                warn(f"Verifica archivio fallita: {exc}")
+                return
+            if not res.ok:
+                warn("Verifica archivio non eseguita.\n\n" + "\n".join(res.errors[:12]))
+                return
+            self._log_activity(
+                "ARCHIVE_SCAN",
+                status="OK" if res.issues == 0 else "WARN",
+                message=f"files={res.files} issues={res.issues} t={res.elapsed_s}s",
+            )
+            msg = (
+                "Verifica archivio completata.\n\n"
+                f"Documenti: {res.docs}\n"
+                f"File CAD in archivio: {res.files} ({res.folders} cartelle)\n"
+                + "".join(f"{k}: {res.counts.get(k, 0)}\n" for k in ARCHIVE_SCAN_KINDS)
+                + f"\nTempo: {res.elapsed_s} s\nReport: {res.report_path}"
+            )
+            if res.errors:
+                msg += "\n\nCartelle non leggibili (estratto):\n" + "\n".join(res.errors[:6])
+            info(msg)
+
+        self.title(f"{APP_TITLE} - verifica archivio...")
+        self._run_in_background(_work, _done, _tick)
+
+    def _checksum_verify_dialog(self):
+        if getattr(self, "_checksum_verify_running", False):
+            warn("Verifica checksum gia in corso.")
+            return
+        self._checksum_verify_running = True
+        db_path = self.store.db_path
+        report_dir = self._report_dir()
+        prog = {"done": 0, "total": 0}
+
+        def _progress(done: int, total: int) -> None:
+            prog["done"], prog["total"] = done, total
+
+        def _work():
+            # connessione propria (verified_at scritto dal worker)
+            store = Store(db_path)
+            try:
+                return verify_checksums(store, report_dir=report_dir, progress=_progress)
+            finally:
+                store.close()
+
+        def _tick() -> None:
+            if prog["total"]:
+                self.title(f"{APP_TITLE} - verifica checksum {prog['done']}/{prog['total']} file")
+
+        def _done(res, exc) -> None:
+            self._checksum_verify_running = False
+            self.title(APP_TITLE)
+            if exc is not None:
+                self._log_activity("CHECKSUM_VERIFY", status="ERROR", message=str(exc))
+                warn(f"Verifica checksum fallita: {exc}")
+                return
+            self._log_activity(
+                "CHECKSUM_VERIFY",
+                status="OK" if res.ok else "WARN",
+                message=f"checked={res.checked} failures={len(res.failures)} t={res.elapsed_s}s",
+            )
+            msg = (
+                f"File REL/REV verificati: {res.checked}\n"
+                f"OK: {res.counts.get('OK', 0)}\n"
+                f"Mancanti: {res.counts.get('MISSING', 0)}\n"
+                f"Contenuto alterato: {res.counts.get('MISMATCH', 0)}\n"
+                f"Errori lettura: {res.counts.get('ERROR', 0)}\n\n"
+                f"Tempo: {res.elapsed_s} s\nReport: {res.report_path}"
+            )
+            if res.failures:
+                msg += "\n\nAnomalie (estratto):\n" + "\n".join(
+                    f"{r['status']} {r['code']} R{r['revision']:02d} {r['role']}" for r in res.failures[:8]
+                )
+                warn(msg)
+                return
+            info(msg)
+
+        self.title(f"{APP_TITLE} - verifica checksum...")
+        self._run_in_background(_work, _done, _tick)
+
     def _migrate_archive_layout_dialog(self):
         archive_root = str(getattr(self.cfg.solidworks, "archive_root", "") or "").strip()
         if not archive_root:
             warn("Archivio non configurato (tab SolidWorks).")
             return
+        try:
+            open_job = find_open_migration_job(self.store, archive_root)
+        except Exception:
+            open_job = None
+        if open_job is not None:
+            if ask(
+                "Esiste una migrazione archivio non completata.\n\n"
+                f"Job {open_job['id']} del {open_job['created_at']} ({open_job['status']})\n"
+                f"Spostamenti completati: {open_job['moves_final']}/{open_job['moves_total']}\n\n"
+                "Riprendere dal punto di interruzione?"
+            ):
+                self._run_archive_migration(archive_root, resume=True, backup_path="")
+                return
         self._log_activity("ARCHIVE_MIGRATION_DRYRUN", status="OK", message="Avvio analisi layout archivio.")
 
         try:
@@ -3673,22 +4326,45 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             warn(f"Backup pre-migrazione fallito: {bkp.message}")
             return
 
+        self._run_archive_migration(archive_root, resume=False, backup_path=str(bkp.path or ""))
+
+    def _run_archive_migration(self, archive_root: str, resume: bool, backup_path: str) -> None:
+        def _progress(done: int, total: int) -> None:
+            try:
+                self.title(f"{APP_TITLE} - migrazione archivio {done}/{total}")
+                self.update_idletasks()
+            except Exception:
+                pass
+
+        self.configure(cursor="watch")
         try:
             result = run_archive_layout_migration(
                 store=self.store,
                 archive_root=archive_root,
                 apply_changes=True,
+                resume=resume,
+                progress=_progress,
             )
         except Exception as e:
             self._log_activity("ARCHIVE_MIGRATION", status="ERROR", message=str(e))
             warn(f"Migrazione archivio fallita: {e}")
             return
+        finally:
+            self.configure(cursor="")
+            self.title(APP_TITLE)
 
-        if not result.get("ok", False):
-            errs = result.get("errors", []) or []
-            self._log_activity("ARCHIVE_MIGRATION", status="ERROR", message="Migrazione con errori.")
+        job_txt = f"job={int(result.get('job_id', 0))}" + (" (ripresa)" if result.get("resumed") else "")
+        if not result.get("ok", False) or int(result.get("moves_pending", 0)):
+            errs = list(result.get("errors", []) or []) + list(result.get("conflicts", []) or [])
+            self._log_activity(
+                "ARCHIVE_MIGRATION",
+                status="ERROR",
+                message=f"Migrazione incompleta {job_txt} pending={int(result.get('moves_pending', 0))}",
+            )
             warn(
-                "Migrazione completata con errori.\n\n"
+                "Migrazione completata con errori.\n"
+                f"Spostamenti da completare: {int(result.get('moves_pending', 0))} "
+                "(rieseguire la migrazione per riprendere).\n\n"
                 + "\n".join(str(x) for x in errs[:12])
             )
             self._refresh_all()
@@ -3697,7 +4373,7 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
         self._log_activity(
             "ARCHIVE_MIGRATION",
             status="OK",
-            message=f"done={int(result.get('moves_done', 0))} docs={int(result.get('docs_updated', 0))}",
+            message=f"{job_txt} done={int(result.get('moves_done', 0))} docs={int(result.get('docs_updated', 0))}",
         )
         self._refresh_all()
         info(
@@ -3705,7 +4381,8 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             f"Documenti aggiornati: {int(result.get('docs_updated', 0))}\n"
             f"Spostamenti eseguiti: {int(result.get('moves_done', 0))}\n"
             f"Spostamenti mancanti (sorgente assente): {int(result.get('moves_missing', 0))}\n"
-            f"Backup: {bkp.path or '(ok)'}"
+            f"Tempo: {result.get('elapsed_s', 0)} s\n"
+            f"Backup: {backup_path or '(eseguito all avvio della migrazione)'}"
         )
 
     def _change_workspace_dialog(self):
@@ -3887,9 +4564,12 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
                 return
             if not ask("Confermi eliminazione?"):
                 return
+            self.ws_pool.discard(ws_id)
             self.ws_mgr.delete(ws_id, delete_folder=bool(del_folder_var.get()))
             dlg.destroy()
             self._switch_workspace(self.ws_mgr.ensure_default().id)
+            # la workspace eliminata, se era la corrente, e finita nel pool con lo switch
+            self.ws_pool.discard(ws_id)
 
         ctk.CTkButton(dlg, text="Cancella", fg_color="#b91c1c", hover_color="#991b1b", command=_ok).pack(pady=14)
 
@@ -3933,39 +4613,123 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             self.monitor_after_id = None
 
         # backup on switch (se dirty) + daily if enabled
+        # in background: il worker usa una connessione propria e prosegue dopo lo switch
         if self.cfg.backup.enabled:
             if self.cfg.backup.daily_enabled:
-                self.backup.maybe_daily_backup()
-            self.backup.backup_now("switch", force=False)
+                self.backup.maybe_daily_backup(background=True)
+            self.backup.start_backup("switch", force=False)
 
-        # close current store
+        # la workspace lasciata resta aperta nel pool (store, config, viste dei tab)
         try:
             self.store.release_session_locks(str(self.session.get("session_id", "")))
         except Exception:
             pass
-        try:
-            self.store.close()
-        except Exception:
-            pass
+        self._park_workspace()
 
         # switch
         self.ws_mgr.set_current(ws_id)
         self.ws_id = ws_id
         self.ws = self.ws_mgr.get(ws_id) or self.ws_mgr.ensure_default()
 
-        self.cfg_mgr = ConfigManager(self.ws_mgr.config_path(ws_id))
-        self.cfg = self.cfg_mgr.load()
-
-        self.store = Store(self.ws_mgr.db_path(ws_id))
-        self.backup = BackupManager(self.ws_mgr, ws_id, self.store, retention_total=self.cfg.backup.retention_total)
+        ctx = self.ws_pool.take(ws_id)
+        if ctx is not None:
+            self.cfg_mgr = ctx.cfg_mgr
+            self.store = ctx.store
+            self.activity_writer = ctx.activity_writer
+            self.backup = ctx.backup
+            self.cfg = ctx.cfg
+            if ctx.config_changed():
+                # config.json modificato nel frattempo (altro PC): si rilegge
+                self.cfg = self.cfg_mgr.load()
+                self.backup.configure(
+                    self.cfg.backup.retention_total,
+                    self.cfg.backup.incremental,
+                    self.cfg.backup.chunk_kb * 1024,
+                )
+        else:
+            self.cfg_mgr = ConfigManager(self.ws_mgr.config_path(ws_id))
+            self.cfg = self.cfg_mgr.load()
+
+            self.store = Store(self.ws_mgr.db_path(ws_id), recover_intents=True)
+            self.activity_writer = ActivityWriter(self.ws_mgr.db_path(ws_id))
+            self.backup = BackupManager(
+                self.ws_mgr, ws_id, self.store,
+                retention_total=self.cfg.backup.retention_total,
+                incremental=self.cfg.backup.incremental,
+                chunk_size=self.cfg.backup.chunk_kb * 1024,
+            )
 
         # Aggiorna riferimenti store/cfg nei tab modulari dopo switch workspace
         self._rebind_workspace_context_to_tabs(refresh_sw_tab=True)
+        if ctx is not None:
+            self._import_tab_view_states(ctx.view_state)
 
+        # incrementale: i tab ripristinati applicano solo le modifiche dal journal
         self._refresh_all()
-        self._log_activity("WORKSPACE_SWITCH", status="OK", message=f"{old_ws} -> {self.ws_id}")
+        self._log_activity(
+            "WORKSPACE_SWITCH",
+            status="OK",
+            message=f"{old_ws} -> {self.ws_id}",
+            # db_open solo per uno Store appena aperto (quello del pool ha le statistiche della prima apertura)
+            details={"db_open": self.store.open_stats if ctx is None else {}, "pooled": ctx is not None, "pool": self.ws_pool.ids()},
+        )
+        self._report_workflow_recovery()
         info(f"Workspace attiva: {self.ws.name}")
 
+    def _park_workspace(self) -> None:
+        """Mette la workspace corrente nel pool (la meno recente oltre il limite viene chiusa)."""
+        writer = self.activity_writer
+        self.activity_writer = None
+        if writer is not None:
+            try:
+                writer.flush(timeout_s=2.0)
+            except Exception:
+                pass
+        ctx = WorkspaceContext(
+            ws_id=self.ws_id,
+            cfg_mgr=self.cfg_mgr,
+            cfg=self.cfg,
+            store=self.store,
+            activity_writer=writer,
+            backup=self.backup,
+            cfg_mtime_ns=config_mtime_ns(self.cfg_mgr),
+            view_state=self._export_tab_view_states(),
+        )
+        self.ws_pool.put(ctx)
+
+    def _export_tab_view_states(self) -> dict:
+        states = {}
+        for tab_name in ("tab_operativo_obj", "tab_gerarchia_obj"):
+            tab = getattr(self, tab_name, None)
+            if not tab:
+                continue
+            try:
+                states[tab_name] = tab.export_view_state()
+            except Exception:
+                pass
+        return states
+
+    def _import_tab_view_states(self, states: dict) -> None:
+        for tab_name, state in states.items():
+            tab = getattr(self, tab_name, None)
+            if not tab or not state:
+                continue
+            try:
+                tab.import_view_state(state)
+            except Exception:
+                pass
+
+    def _close_idle_workspaces(self) -> None:
+        """Chiude le connessioni delle workspace del pool inattive da troppo tempo."""
+        try:
+            self.ws_pool.close_idle()
+        except Exception:
+            pass
+        try:
+            self.after(WS_POOL_IDLE_CHECK_MS, self._close_idle_workspaces)
+        except Exception:
+            pass
+
     # ---------------- refresh
     def _refresh_all(self):
         self._set_ws_label()
@@ -3979,11 +4743,11 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
             self.tab_codifica_obj.refresh_machine_menus()
             self.tab_codifica_obj.refresh_vvv_menu()
         if hasattr(self, 'tab_gerarchia_obj') and self.tab_gerarchia_obj:
-            self.tab_gerarchia_obj.refresh_tree()
+            self.tab_gerarchia_obj.refresh_tree(only_if_changed=True)
         if hasattr(self, 'tab_monitor_obj') and self.tab_monitor_obj:
             self.tab_monitor_obj.refresh()
         if hasattr(self, 'tab_operativo_obj') and self.tab_operativo_obj:
-            self.tab_operativo_obj.refresh_table()
+            self.tab_operativo_obj.refresh_table(incremental=True)
             self.tab_operativo_obj.refresh_workflow()
         
         # Metodi ancora in app.py (da estrarre in futuri tab)
@@ -4003,20 +4767,83 @@ class PDMApp(RCCopyMixin, ReportMixin, ctk.CTk):
                 self.tab_monitor_obj.stop_auto_refresh()
             except Exception:
                 pass
+        if hasattr(self, 'tab_operativo_obj') and self.tab_operativo_obj:
+            try:
+                self.tab_operativo_obj.stop_auto_refresh()
+            except Exception:
+                pass
         
+        # snapshot archivio in corso: interrotto (la cartella .partial viene scartata al prossimo)
+        if getattr(self, "_snapshot_cancel", None) is not None:
+            self._snapshot_cancel.set()
         # daily + switch-like backup on exit (solo se dirty)
         if self.cfg.backup.enabled:
             if self.cfg.backup.daily_enabled:
-                self.backup.maybe_daily_backup()
-            self.backup.backup_now("exit", force=False)
+                self.backup.maybe_daily_backup(background=True)
+            self.backup.start_backup("exit", force=False)
+        # attesa limitata dei backup in corso (anche di workspace lasciate con uno switch)
+        if self.backup.active_jobs():
+            try:
+                self.title(f"{APP_TITLE} - chiusura: backup in corso...")
+                self.configure(cursor="watch")
+                self.update_idletasks()
+            except Exception:
+                pass
+        if not wait_backups(BACKUP_EXIT_TIMEOUT_S):
+            self._log_activity("BACKUP", status="ERROR", message="Backup di chiusura annullato: tempo scaduto.")
         try:
             self.store.release_session_locks(str(self.session.get("session_id", "")))
         except Exception:
             pass
+        try:
+            self.store.prune_changes()
+        except Exception:
+            pass
         self._log_activity("APP_EXIT", status="OK", message="Desktop chiuso.")
+        self._close_activity_writer()
+        self.ws_pool.close_all()
+        close_logs()
         self.store.close()
         self.destroy()
 
+    def _watch_backup_job(self, job: BackupJob | None) -> None:
+        """Avanzamento del backup in background nel titolo; avviso se fallisce."""
+        if job is None:
+            return
+        prefix = f"{APP_TITLE} - backup"
+
+        def _poll() -> None:
+            try:
+                current = self.title()
+            except Exception:
+                return
+            if job.done:
+                if current.startswith(prefix):
+                    self.title(APP_TITLE)
+                res = job.result
+                if res is not None and not res.ok and not job.cancel_event.is_set():
+                    self._log_activity("BACKUP", status="ERROR", message=res.message)
+                    warn(res.message)
+                return
+            if current == APP_TITLE or current.startswith(prefix):
+                self.title(f"{prefix} {job.reason} {job.percent}%")
+            self.after(BACKUP_POLL_MS, _poll)
+
+        self.after(BACKUP_POLL_MS, _poll)
+
+    def _close_activity_writer(self, timeout_s: float | None = None) -> None:
+        """Flush dell'activity log asincrono (attesa limitata al busy timeout del DB)."""
+        writer = getattr(self, "activity_writer", None)
+        if writer is None:
+            return
+        self.activity_writer = None
+        try:
+            ok = writer.close() if timeout_s is None else writer.close(timeout_s=timeout_s)
+            if not ok and writer.lost:
+                append_line(self._workflow_log_path(), f"ACTIVITY WARN | {writer.last_error}")
+        except Exception:
+            pass
+
 
 if __name__ == "__main__":
     app = PDMApp()
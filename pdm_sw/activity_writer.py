@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .store import ACTIVITY_INSERT_SQL, Store
+
+# attesa massima sul DB occupato per una scrittura (busy timeout della connessione)
+BUSY_TIMEOUT_S = 30.0
+# chiusura: copre un'ultima scrittura che aspetta il busy timeout
+CLOSE_TIMEOUT_S = BUSY_TIMEOUT_S + 5.0
+
+
+class ActivityWriter:
+    """Scrittura asincrona dell'activity log.
+
+    Le righe vanno in una coda limitata (submit non blocca mai il thread UI);
+    un thread dedicato, con connessione SQLite propria, le inserisce con
+    executemany in un'unica transazione ogni `flush_interval_ms` o appena ci
+    sono `batch_size` righe. Con il DB occupato da altri utenti le righe restano
+    in attesa e vengono riprovate al giro successivo.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        flush_interval_ms: int = 500,
+        batch_size: int = 200,
+        max_queue: int = 10000,
+    ):
+        self.db_path = Path(db_path)
+        self.flush_interval_s = max(0.01, int(flush_interval_ms) / 1000.0)
+        self.batch_size = max(1, int(batch_size))
+        self.max_pending = max(self.batch_size, int(max_queue))
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=self.max_pending)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()  # contatori aggiornati da thread UI e worker
+        self.written = 0
+        self.dropped = 0
+        self.lost = 0  # righe ancora in coda quando close() ha smesso di attendere
+        self._inflight = 0
+        self.last_error = ""
+        self._thread = threading.Thread(target=self._run, name="pdm-activity-writer", daemon=True)
+        self._thread.start()
+
+    # ---- API thread chiamante (UI)
+    def submit(
+        self,
+        workspace_id: str,
+        session_id: str,
+        user_id: str,
+        user_display: str,
+        host: str,
+        action: str,
+        code: str = "",
+        status: str = "OK",
+        message: str = "",
+        details: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Accoda una riga; False se la coda e piena (riga scartata)."""
+        row = Store.activity_row(
+            workspace_id, session_id, user_id, user_display, host, action,
+            code=code, status=status, message=message, details=details,
+        )
+        if self._stop.is_set():
+            return False
+        try:
+            self._q.put_nowait(row)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def flush(self, timeout_s: float = 5.0) -> bool:
+        """Attende la scrittura delle righe accodate finora (max timeout_s)."""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._q.put(done, timeout=timeout_s)
+        except queue.Full:
+            return False
+        return done.wait(timeout_s)
+
+    def close(self, timeout_s: float = CLOSE_TIMEOUT_S) -> bool:
+        """Svuota la coda e ferma il thread; True se tutto e stato scritto.
+
+        Se il worker non termina entro timeout_s le righe ancora in attesa
+        sono contate in `lost` (e riportate in last_error).
+        """
+        self._stop.set()
+        try:
+            self._q.put_nowait(None)  # sveglia il worker
+        except queue.Full:
+            pass
+        self._thread.join(timeout_s)
+        if self._thread.is_alive():
+            with self._lock:
+                self.lost = self._q.qsize() + self._inflight
+                self.last_error = f"{self.lost} righe activity non scritte alla chiusura (DB occupato)"
+            return False
+        return self._q.empty()
+
+    # ---- worker
+    def _run(self) -> None:
+        conn: Optional[sqlite3.Connection] = None
+        pending: List[Tuple[str, ...]] = []
+        waiters: List[threading.Event] = []
+        deadline = 0.0
+        try:
+            while not self._stop.is_set():
+                timeout = self.flush_interval_s if not pending else max(0.0, deadline - time.monotonic())
+                try:
+                    self._take(self._q.get(timeout=timeout), pending, waiters)
+                except queue.Empty:
+                    pass
+                self._drain(pending, waiters, limit=self.batch_size)
+                self._set_inflight(len(pending))
+                if pending and not deadline:
+                    deadline = time.monotonic() + self.flush_interval_s
+                if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline or waiters):
+                    if conn is None:
+                        conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT_S)
+                    if self._write(conn, pending):
+                        pending.clear()
+                        self._set_inflight(0)
+                        deadline = 0.0
+                    else:
+                        # DB occupato/non raggiungibile: riprova al prossimo giro
+                        deadline = time.monotonic() + self.flush_interval_s
+                        if len(pending) > self.max_pending:
+                            over = len(pending) - self.max_pending
+                            del pending[:over]
+                            with self._lock:
+                                self.dropped += over
+                for w in waiters:
+                    w.set()
+                waiters.clear()
+
+            # chiusura: scrive tutto quello che resta (un tentativo)
+            self._drain(pending, waiters, limit=0)
+            self._set_inflight(len(pending))
+            if pending:
+                if conn is None:
+                    conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT_S)
+                if self._write(conn, pending):
+                    pending.clear()
+                else:
+                    with self._lock:
+                        self.dropped += len(pending)
+                self._set_inflight(0)
+        finally:
+            for w in waiters:
+                w.set()
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def _set_inflight(self, n: int) -> None:
+        with self._lock:
+            self._inflight = n
+
+    def _drain(self, pending: List[Tuple[str, ...]], waiters: List[threading.Event], limit: int) -> None:
+        """Preleva senza attendere quanto gia in coda (limit=0: tutto)."""
+        while (limit <= 0) or (len(pending) < limit):
+            try:
+                self._take(self._q.get_nowait(), pending, waiters)
+            except queue.Empty:
+                break
+
+    @staticmethod
+    def _take(item: Any, pending: List[Tuple[str, ...]], waiters: List[threading.Event]) -> None:
+        if item is None:
+            return
+        if isinstance(item, threading.Event):
+            waiters.append(item)
+        else:
+            pending.append(item)
+
+    def _write(self, conn: sqlite3.Connection, rows: List[Tuple[str, ...]]) -> bool:
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.executemany(ACTIVITY_INSERT_SQL, rows)
+            conn.commit()
+            with self._lock:
+                self.written += len(rows)
+            return True
+        except Exception as e:
+            with self._lock:
+                self.last_error = f"{type(e).__name__}: {e}"
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return False
@@ -1,18 +1,30 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import errno
+import hashlib
 import os
+import random
 import shutil
 import stat
+import sys
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from .models import Document, DocType
+from .log_writer import append_line
+from .stat_cache import invalidate_path
 
 IN_REV_DIR = "IN_REV"
 REV_DIR = "REV"
+COPY_CHUNK = 1024 * 1024
+# pipeline modello e disegno in parallelo: una transizione dura max(modello, disegno)
+FILE_PIPELINE_WORKERS = 2
 
 
 def ext_for_doc_type(doc_type: DocType) -> str:
@@ -102,16 +114,8 @@ def rev_tag(code: str, revision: int) -> str:
 
 
 def _append_log(log_file: str | Path | None, message: str) -> None:
-    if not log_file:
-        return
-    try:
-        p = Path(log_file)
-        ensure_dir(p.parent)
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with p.open("a", encoding="utf-8") as f:
-            f.write(f"{ts} | {message}\n")
-    except Exception:
-        pass
+    # scrittura bufferizzata su thread dedicato (niente open/close per riga sulla share)
+    append_line(log_file, message)
 
 
 def _is_lock_like_oserror(e: OSError) -> bool:
@@ -121,23 +125,321 @@ def _is_lock_like_oserror(e: OSError) -> bool:
     return win in (5, 32, 33) or eno in (13,)
 
 
-def _run_with_retries(fn, attempts: int = 4, delay_s: float = 0.2) -> None:
-    attempts = max(1, int(attempts))
+class RetryCancelled(Exception):
+    """Attesa su file bloccato interrotta dall'utente."""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Tentativi su errori da file bloccato: backoff esponenziale con jitter."""
+
+    attempts: int = 4
+    base_delay_s: float = 0.1
+    max_delay_s: float = 2.0
+    jitter: float = 0.5  # ampiezza relativa della variazione casuale
+
+    def delay(self, retry: int) -> float:
+        d = min(self.max_delay_s, self.base_delay_s * (2 ** max(0, int(retry))))
+        return max(0.0, d * (1.0 - self.jitter / 2.0 + random.random() * self.jitter))
+
+
+DEFAULT_RETRY = RetryPolicy()
+# sovrascrittura REL in approvazione: file spesso ancora aperto (SolidWorks, Explorer)
+COPY_REPLACE_RETRY = RetryPolicy(attempts=9, base_delay_s=0.1, max_delay_s=2.0)
+
+
+class RetryMonitor:
+    """Stato dei tentativi in corso, leggibile e annullabile da un altro thread (UI).
+
+    Attivato con use_retry_monitor(); l'attesa tra i tentativi si interrompe
+    subito con cancel(). I passi di rollback girano dentro shield() e non
+    sono annullabili.
+    """
+
+    def __init__(self) -> None:
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.waiting: Optional[Dict[str, Any]] = None
+        self.retries = 0
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @contextmanager
+    def shield(self) -> Iterator[None]:
+        prev = getattr(self._local, "shielded", False)
+        self._local.shielded = True
+        try:
+            yield
+        finally:
+            self._local.shielded = prev
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return dict(self.waiting) if self.waiting else None
+
+    def sleep(self, delay_s: float, what: str, attempt: int, attempts: int, error: BaseException) -> None:
+        shielded = bool(getattr(self._local, "shielded", False))
+        with self._lock:
+            self.retries += 1
+            self.waiting = {
+                "what": what, "attempt": attempt, "attempts": attempts,
+                "delay_s": delay_s, "error": f"{type(error).__name__}: {error}",
+            }
+        try:
+            if shielded:
+                time.sleep(delay_s)
+            elif self._cancel.wait(delay_s):
+                raise RetryCancelled(f"Operazione annullata (file bloccato: {what})") from error
+        finally:
+            with self._lock:
+                self.waiting = None
+
+
+# monitor del contesto corrente: altri thread (snapshot, migrazione, batch) non lo vedono
+_RETRY_MONITOR: ContextVar[Optional[RetryMonitor]] = ContextVar("pdm_retry_monitor", default=None)
+
+
+@contextmanager
+def use_retry_monitor(monitor: Optional[RetryMonitor]) -> Iterator[Optional[RetryMonitor]]:
+    """Rende `monitor` attivo per le operazioni file del thread corrente.
+
+    I pool che lavorano per conto del chiamante (_run_pipelines) copiano il
+    contesto nei worker.
+    """
+    token = _RETRY_MONITOR.set(monitor)
+    try:
+        yield monitor
+    finally:
+        _RETRY_MONITOR.reset(token)
+
+
+@contextmanager
+def _retry_shield() -> Iterator[None]:
+    m = _RETRY_MONITOR.get()
+    if m is None:
+        yield
+        return
+    with m.shield():
+        yield
+
+
+def _run_with_retries(fn, policy: RetryPolicy = DEFAULT_RETRY, what: str = "") -> None:
+    attempts = max(1, int(policy.attempts))
     for i in range(attempts):
         try:
             fn()
             return
         except OSError as e:
             if (i < attempts - 1) and _is_lock_like_oserror(e):
-                time.sleep(delay_s)
+                delay = policy.delay(i)
+                m = _RETRY_MONITOR.get()
+                if m is not None:
+                    m.sleep(delay, what or str(getattr(e, "filename", "") or ""), i + 1, attempts, e)
+                else:
+                    time.sleep(delay)
                 continue
             raise
 
 
-def safe_copy(src: Path, dst: Path, overwrite: bool = False, log_file: str | Path | None = None) -> None:
+def file_sha256(path: Path) -> Tuple[str, int]:
+    """(sha256 esadecimale, dimensione) del file, lettura a blocchi."""
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(COPY_CHUNK)
+            if not buf:
+                break
+            h.update(buf)
+            size += len(buf)
+    return h.hexdigest(), size
+
+
+# (byte copiati, byte totali, byte/s medi)
+ProgressFn = Callable[[int, int, float], None]
+
+# blocco per singola chiamata zero-copy: abbastanza grande da non pesare in
+# syscall, abbastanza piccolo da notificare il progresso
+ZERO_COPY_CHUNK = 8 * 1024 * 1024
+PROGRESS_MIN_INTERVAL_S = 0.1
+_ZERO_COPY_FALLBACK_ERRNOS = {
+    getattr(errno, n) for n in ("EXDEV", "ENOSYS", "EINVAL", "EOPNOTSUPP", "ENOTSUP", "EBADF", "ENOTSOCK") if hasattr(errno, n)
+}
+
+
+@dataclass
+class CopyStats:
+    src: str
+    dst: str
+    bytes: int = 0
+    seconds: float = 0.0
+    method: str = ""  # copy_file_range | sendfile | chunked
+    sha256: str = ""
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def digest(self) -> Optional[Tuple[str, int]]:
+        return (self.sha256, self.bytes) if self.sha256 else None
+
+    def summary(self) -> str:
+        return (
+            f"{self.bytes / 1e6:.1f} MB in {self.seconds:.2f} s "
+            f"({self.bytes_per_s / 1e6:.1f} MB/s, {self.method})"
+        )
+
+    def to_details(self) -> Dict[str, Any]:
+        """Voce per i details dell'activity log."""
+        return {
+            "src": self.src,
+            "dst": self.dst,
+            "bytes": self.bytes,
+            "ms": round(self.seconds * 1000.0, 1),
+            "mb_s": round(self.bytes_per_s / 1e6, 2),
+            "method": self.method,
+        }
+
+
+def _zero_copy(fi, fo, total: int, report: Callable[[int], None]) -> Tuple[int, str]:
+    """Copia nel kernel (copy_file_range, poi sendfile su Linux).
+
+    Ritorna (byte copiati, metodo); metodo "" se nessuna primitiva e
+    disponibile, il filesystem la rifiuta o si ferma prima della fine
+    (ritorno 0, come gestisce shutil): il chiamante prosegue a blocchi
+    dall'offset ritornato.
+    """
+    candidates = []
+    if hasattr(os, "copy_file_range"):
+        candidates.append(("copy_file_range", lambda i, o, n: os.copy_file_range(i, o, n)))
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        candidates.append(("sendfile", lambda i, o, n: os.sendfile(o, i, None, n)))
+    fd_in, fd_out = fi.fileno(), fo.fileno()
+    done = 0
+    for name, fn in candidates:
+        try:
+            while done < total:
+                n = fn(fd_in, fd_out, min(ZERO_COPY_CHUNK, total - done))
+                if n == 0:
+                    break
+                done += n
+                report(done)
+            return done, (name if done >= total else "")
+        except OSError as e:
+            if e.errno not in _ZERO_COPY_FALLBACK_ERRNOS:
+                raise
+            if done:
+                return done, ""
+    return done, ""
+
+
+def copy_file(
+    src: Path,
+    dst: Path,
+    progress: Optional[ProgressFn] = None,
+    hash_content: bool = False,
+    chunk_size: int = COPY_CHUNK,
+) -> CopyStats:
+    """Copia src -> dst (contenuto + metadati come copy2) con progresso.
+
+    Senza hash usa la copia zero-copy del kernel se disponibile; con
+    hash_content legge a blocchi grandi e calcola lo SHA-256 nello stesso
+    passaggio (i dati devono comunque passare dallo spazio utente).
+    """
+    t0 = time.perf_counter()
+    stats = CopyStats(str(src), str(dst))
+    h = hashlib.sha256() if hash_content else None
+    last = [0.0]
+
+    def report(done: int) -> None:
+        if progress is None:
+            return
+        now = time.perf_counter()
+        if done < total and (now - last[0]) < PROGRESS_MIN_INTERVAL_S:
+            return
+        last[0] = now
+        try:
+            progress(done, total, done / max(now - t0, 1e-6))
+        except Exception:
+            pass
+
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        total = os.fstat(fi.fileno()).st_size
+        done, method = (0, "")
+        if h is None and total > 0:
+            done, method = _zero_copy(fi, fo, total, report)
+        if not method:
+            method = "chunked"
+            fi.seek(done)
+            fo.seek(done)
+            buf = bytearray(max(64 * 1024, int(chunk_size)))
+            view = memoryview(buf)
+            while True:
+                n = fi.readinto(buf)
+                if not n:
+                    break
+                if h is not None:
+                    h.update(view[:n])
+                fo.write(view[:n])
+                done += n
+                report(done)
+    if done != total:
+        raise OSError(f"Copia incompleta: {done}/{total} byte ({src} -> {dst})")
+    shutil.copystat(src, dst)
+    stats.bytes = done
+    stats.method = method
+    stats.sha256 = h.hexdigest() if h is not None else ""
+    stats.seconds = time.perf_counter() - t0
+    if progress is not None and total == 0:
+        report(0)
+    return stats
+
+
+def _copy_with_retries(
+    src: Path,
+    dst: Path,
+    progress: Optional[ProgressFn] = None,
+    hash_content: bool = False,
+    policy: RetryPolicy = DEFAULT_RETRY,
+) -> CopyStats:
+    out: List[CopyStats] = []
+    _run_with_retries(
+        lambda: out.append(copy_file(src, dst, progress=progress, hash_content=hash_content)),
+        policy=policy,
+        what=str(dst),
+    )
+    return out[-1]
+
+
+def _copy_log_suffix(stats: CopyStats) -> str:
+    tail = f" | {stats.summary()}"
+    if stats.sha256:
+        tail += f" | sha256={stats.sha256}"
+    return tail
+
+
+def safe_copy(
+    src: Path,
+    dst: Path,
+    overwrite: bool = False,
+    log_file: str | Path | None = None,
+    progress: Optional[ProgressFn] = None,
+    hash_content: bool = False,
+) -> Optional[CopyStats]:
+    """Copia con log; ritorna le statistiche (None se src assente).
+
+    hash_content=True calcola lo SHA-256 durante la copia (registro checksum).
+    """
     if not src.exists():
         _append_log(log_file, f"FS COPY SKIP (src missing) | {src} -> {dst}")
-        return
+        return None
     ensure_dir(dst.parent)
     _append_log(log_file, f"FS COPY START | {src} -> {dst} | overwrite={overwrite}")
     if dst.exists():
@@ -145,11 +447,19 @@ def safe_copy(src: Path, dst: Path, overwrite: bool = False, log_file: str | Pat
             _append_log(log_file, f"FS COPY FAIL (dst exists) | {dst}")
             raise FileExistsError(f"File destinazione gia esistente: {dst}")
         safe_delete(dst, strict=True, log_file=log_file)
-    _run_with_retries(lambda: shutil.copy2(src, dst))
-    _append_log(log_file, f"FS COPY OK | {src} -> {dst}")
-
-
-def safe_copy_replace(src: Path, dst: Path, log_file: str | Path | None = None) -> None:
+    stats = _copy_with_retries(src, dst, progress=progress, hash_content=hash_content)
+    invalidate_path(dst)
+    _append_log(log_file, f"FS COPY OK | {src} -> {dst}{_copy_log_suffix(stats)}")
+    return stats
+
+
+def safe_copy_replace(
+    src: Path,
+    dst: Path,
+    log_file: str | Path | None = None,
+    progress: Optional[ProgressFn] = None,
+    hash_content: bool = False,
+) -> Optional[CopyStats]:
     """Sovrascrive dst tramite copia diretta senza delete/rename.
 
     Utile su Windows quando un file sorgente/destinazione e aperto senza share-delete:
@@ -157,23 +467,32 @@ def safe_copy_replace(src: Path, dst: Path, log_file: str | Path | None = None)
     """
     if not src.exists():
         _append_log(log_file, f"FS COPY_REPLACE SKIP (src missing) | {src} -> {dst}")
-        return
+        return None
     ensure_dir(dst.parent)
     _append_log(log_file, f"FS COPY_REPLACE START | {src} -> {dst}")
     if dst.exists():
         set_readonly(dst, False)
-    _run_with_retries(lambda: shutil.copy2(src, dst), attempts=30, delay_s=0.25)
-    _append_log(log_file, f"FS COPY_REPLACE OK | {src} -> {dst}")
-
-
-def safe_move(src: Path, dst: Path, overwrite: bool = False, log_file: str | Path | None = None) -> None:
+    stats = _copy_with_retries(src, dst, progress=progress, hash_content=hash_content, policy=COPY_REPLACE_RETRY)
+    invalidate_path(dst)
+    _append_log(log_file, f"FS COPY_REPLACE OK | {src} -> {dst}{_copy_log_suffix(stats)}")
+    return stats
+
+
+def safe_move(
+    src: Path,
+    dst: Path,
+    overwrite: bool = False,
+    log_file: str | Path | None = None,
+    progress: Optional[ProgressFn] = None,
+) -> Optional[CopyStats]:
+    """Sposta con log; ritorna le statistiche solo se e servita una copia (cross-volume)."""
     if not src.exists():
         _append_log(log_file, f"FS MOVE SKIP (src missing) | {src} -> {dst}")
-        return
+        return None
     ensure_dir(dst.parent)
     try:
         if src.resolve() == dst.resolve():
-            return
+            return None
     except Exception:
         pass
     _append_log(log_file, f"FS MOVE START | {src} -> {dst} | overwrite={overwrite}")
@@ -185,9 +504,11 @@ def safe_move(src: Path, dst: Path, overwrite: bool = False, log_file: str | Pat
     # Se il move richiede copy+delete (cross-volume), il sorgente deve essere scrivibile.
     set_readonly(src, False)
     try:
-        _run_with_retries(lambda: os.replace(str(src), str(dst)))
+        _run_with_retries(lambda: os.replace(str(src), str(dst)), what=str(src))
+        invalidate_path(src)
+        invalidate_path(dst)
         _append_log(log_file, f"FS MOVE OK (rename) | {src} -> {dst}")
-        return
+        return None
     except OSError as e:
         win = int(getattr(e, "winerror", 0) or 0)
         eno = int(getattr(e, "errno", 0) or 0)
@@ -197,9 +518,10 @@ def safe_move(src: Path, dst: Path, overwrite: bool = False, log_file: str | Pat
             raise
     _append_log(log_file, f"FS MOVE FALLBACK copy+delete | {src} -> {dst}")
     # fallback cross-volume: copy + delete sorgente
-    safe_copy(src, dst, overwrite=overwrite, log_file=log_file)
+    stats = safe_copy(src, dst, overwrite=overwrite, log_file=log_file, progress=progress)
     safe_delete(src, strict=True, log_file=log_file)
     _append_log(log_file, f"FS MOVE OK (copy+delete) | {src} -> {dst}")
+    return stats
 
 
 def safe_delete(p: Path, strict: bool = False, log_file: str | Path | None = None) -> bool:
@@ -209,7 +531,8 @@ def safe_delete(p: Path, strict: bool = False, log_file: str | Path | None = Non
             return True
         _append_log(log_file, f"FS DELETE START | {p}")
         set_readonly(p, False)
-        _run_with_retries(lambda: p.unlink())
+        _run_with_retries(lambda: p.unlink(), what=str(p))
+        invalidate_path(p)
         _append_log(log_file, f"FS DELETE OK | {p}")
         return True
     except Exception as e:
@@ -219,13 +542,164 @@ def safe_delete(p: Path, strict: bool = False, log_file: str | Path | None = Non
         return False
 
 
+@dataclass
+class FileChecksum:
+    role: str  # REL_MODEL, REL_DRW, REV_MODEL, REV_DRW
+    revision: int
+    path: str
+    sha256: str
+    size: int
+
+
 @dataclass
 class WorkflowResult:
     ok: bool
     message: str
+    checksums: List[FileChecksum] = field(default_factory=list)
+    copies: List[CopyStats] = field(default_factory=list)
+    # passi per annullare le operazioni file se poi il salvataggio DB fallisce (release, crea revisione)
+    undo: Optional["_Undo"] = field(default=None, repr=False, compare=False)
+
+
+def _checksum(role: str, revision: int, path: Path, digest: Optional[Tuple[str, int]] = None) -> Optional[FileChecksum]:
+    """Checksum per il registro: usa il digest della copia, altrimenti legge il file una volta."""
+    try:
+        if digest is None:
+            if not path.is_file():
+                return None
+            digest = file_sha256(path)
+        return FileChecksum(role, int(revision), str(path), digest[0], int(digest[1]))
+    except Exception:
+        return None
+
+
+def _same_content(src: Path, dst: Path) -> Optional[Tuple[str, int]]:
+    """Digest di dst se src e dst esistono con stesso contenuto, altrimenti None."""
+    try:
+        if not (src.is_file() and dst.is_file()):
+            return None
+        if src.stat().st_size != dst.stat().st_size:
+            return None
+        a = file_sha256(src)
+        b = file_sha256(dst)
+        return b if a == b else None
+    except Exception:
+        return None
+
+
+class _ProgressMux:
+    """Somma il progresso delle copie concorrenti e lo consegna nel thread
+    chiamante (i callback UI, es. Tk, non sono thread-safe)."""
+
+    def __init__(self, progress: Optional[ProgressFn]):
+        self.progress = progress
+        self._streams: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._t0 = time.perf_counter()
+
+    def stream(self, key: str) -> Optional[ProgressFn]:
+        if self.progress is None:
+            return None
+
+        def cb(done: int, total: int, _bps: float) -> None:
+            with self._lock:
+                self._streams[key] = (done, total)
+                self._dirty = True
+
+        return cb
+
+    def flush(self) -> None:
+        if self.progress is None or not self._dirty:
+            return
+        with self._lock:
+            done = sum(d for d, _t in self._streams.values())
+            total = sum(t for _d, t in self._streams.values())
+            self._dirty = False
+        try:
+            self.progress(done, total, done / max(time.perf_counter() - self._t0, 1e-6))
+        except Exception:
+            pass
+
+
+class _Undo:
+    """Passi di rollback registrati dalle pipeline; eseguiti in ordine inverso."""
+
+    def __init__(self) -> None:
+        self._steps: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, fn: Callable[[], Any]) -> None:
+        with self._lock:
+            self._steps.append(fn)
+
+    def run(self, log_file: str | Path | None = None) -> int:
+        """Esegue il rollback; ritorna il numero di passi falliti o non eseguiti.
+
+        Al primo passo fallito si ferma: i passi precedenti (es. rimozione
+        della copia REV) possono servire a ripristinare quello fallito e i
+        file restano come sono per la recovery del giornale.
+        """
+        with self._lock:
+            steps = list(reversed(self._steps))
+            self._steps.clear()
+        with _retry_shield():  # il rollback non si annulla
+            for i, fn in enumerate(steps):
+                try:
+                    fn()
+                except Exception as e:
+                    _append_log(
+                        log_file,
+                        f"WF WARN ROLLBACK | {type(e).__name__}: {e} | interrotto, {len(steps) - i - 1} passi non eseguiti",
+                    )
+                    return len(steps) - i
+        return 0
+
+
+def _run_pipelines(tasks: List[Callable[[], Any]], mux: _ProgressMux) -> List[Optional[BaseException]]:
+    """Esegue le pipeline (modello, disegno) in parallelo su un piccolo pool.
+
+    Il thread chiamante attende consegnando il progresso; ritorna l'eccezione
+    di ciascuna pipeline (None se completata).
+    """
+    errors: List[Optional[BaseException]] = [None] * len(tasks)
+    if not tasks:
+        return errors
+    with ThreadPoolExecutor(max_workers=min(FILE_PIPELINE_WORKERS, len(tasks)), thread_name_prefix="pdm-wf-file") as pool:
+        # ogni worker eredita il contesto (monitor tentativi) del chiamante
+        futs = {pool.submit(copy_context().run, t): i for i, t in enumerate(tasks)}
+        pending = set(futs)
+        while pending:
+            done, pending = wait(pending, timeout=0.1)
+            mux.flush()
+            for f in done:
+                errors[futs[f]] = f.exception()
+    mux.flush()
+    return errors
+
+
+def _same_path(a: Path, b: Path) -> bool:
+    try:
+        return os.path.normcase(str(a.resolve())) == os.path.normcase(str(b.resolve()))
+    except Exception:
+        return str(a) == str(b)
 
 
-def release_wip(doc: Document, archive_root: str, log_file: str | Path | None = None) -> Tuple[Document, WorkflowResult]:
+def _same_volume(path: Path, folder: Path) -> bool:
+    """True se `path` e `folder` stanno sullo stesso volume (rename possibile)."""
+    try:
+        ensure_dir(folder)
+        return os.stat(path).st_dev == os.stat(folder).st_dev
+    except Exception:
+        return False
+
+
+def release_wip(
+    doc: Document,
+    archive_root: str,
+    log_file: str | Path | None = None,
+    progress: Optional[ProgressFn] = None,
+) -> Tuple[Document, WorkflowResult]:
     _append_log(log_file, f"WF START RELEASE | code={doc.code} | state={doc.state} | rev={int(doc.revision):02d}")
     if doc.state != "WIP":
         _append_log(log_file, "WF FAIL RELEASE | stato non valido (serve WIP)")
@@ -243,9 +717,36 @@ def release_wip(doc: Document, archive_root: str, log_file: str | Path | None =
     src_drw = Path(doc.file_wip_drw_path) if doc.file_wip_drw_path else drw_path(current, doc.code)
     dst_drw = drw_path(current, doc.code)
 
-    if src_model.exists():
-        safe_move(src_model, dst_model, overwrite=True, log_file=log_file)
-        set_readonly(dst_model, True)
+    has_model = src_model.exists()
+    has_drw = src_drw.exists()
+    copies: List[CopyStats] = []
+    undo = _Undo()
+    mux = _ProgressMux(progress)
+
+    def release_one(src: Path, dst: Path, key: str) -> None:
+        cs = safe_move(src, dst, overwrite=True, log_file=log_file, progress=mux.stream(key))
+        if cs is not None:
+            copies.append(cs)
+        def _back() -> None:
+            if not _same_path(src, dst):
+                safe_move(dst, src, overwrite=True, log_file=log_file)
+            set_readonly(src, False)  # torna WIP modificabile
+        undo.add(_back)
+        set_readonly(dst, True)
+
+    tasks = []
+    if has_model:
+        tasks.append(lambda: release_one(src_model, dst_model, "model"))
+    if has_drw:
+        tasks.append(lambda: release_one(src_drw, dst_drw, "drw"))
+    errors = [e for e in _run_pipelines(tasks, mux) if e is not None]
+    if errors:
+        # rollback congiunto: modello e disegno tornano entrambi in WIP
+        undo.run(log_file)
+        _append_log(log_file, f"WF FAIL RELEASE | {type(errors[0]).__name__}: {errors[0]} | rollback eseguito")
+        raise errors[0]
+
+    if has_model:
         doc.file_rel_path = str(dst_model)
         doc.file_wip_path = str(dst_model)
     else:
@@ -257,9 +758,7 @@ def release_wip(doc: Document, archive_root: str, log_file: str | Path | None =
             doc.file_rel_path = ""
             doc.file_wip_path = ""
 
-    if src_drw.exists():
-        safe_move(src_drw, dst_drw, overwrite=True, log_file=log_file)
-        set_readonly(dst_drw, True)
+    if has_drw:
         doc.file_rel_drw_path = str(dst_drw)
         doc.file_wip_drw_path = str(dst_drw)
     else:
@@ -272,11 +771,21 @@ def release_wip(doc: Document, archive_root: str, log_file: str | Path | None =
 
     doc.state = "REL"
     # first release keeps revision as is (default 0 => 00)
+    # registro checksum: nel layout corrente il rilascio non copia (stesso file), una lettura
+    sums = [
+        _checksum("REL_MODEL", doc.revision, Path(doc.file_rel_path)) if doc.file_rel_path else None,
+        _checksum("REL_DRW", doc.revision, Path(doc.file_rel_drw_path)) if doc.file_rel_drw_path else None,
+    ]
     _append_log(log_file, f"WF OK RELEASE | code={doc.code} | new_state={doc.state} | rev={int(doc.revision):02d}")
-    return doc, WorkflowResult(True, "Rilasciato (REL).")
+    return doc, WorkflowResult(True, "Rilasciato (REL).", [x for x in sums if x], copies, undo=undo)
 
 
-def create_inrev(doc: Document, archive_root: str, log_file: str | Path | None = None) -> Tuple[Document, WorkflowResult]:
+def create_inrev(
+    doc: Document,
+    archive_root: str,
+    log_file: str | Path | None = None,
+    progress: Optional[ProgressFn] = None,
+) -> Tuple[Document, WorkflowResult]:
     _append_log(log_file, f"WF START CREATE_INREV | code={doc.code} | state={doc.state} | rev={int(doc.revision):02d}")
     if doc.state != "REL":
         _append_log(log_file, "WF FAIL CREATE_INREV | stato non valido (serve REL)")
@@ -299,33 +808,71 @@ def create_inrev(doc: Document, archive_root: str, log_file: str | Path | None =
     )
     dst_drw = drw_path(inrev, tag)
 
-    if src_model.exists():
-        safe_copy(src_model, dst_model, overwrite=True, log_file=log_file)
-        set_readonly(dst_model, False)
-        doc.file_inrev_path = str(dst_model)
-    else:
-        doc.file_inrev_path = ""
+    has_model = src_model.exists()
+    has_drw = src_drw.exists()
+    copies: List[CopyStats] = []
+    undo = _Undo()
+    mux = _ProgressMux(progress)
+
+    def copy_one(src: Path, dst: Path, key: str) -> None:
+        undo.add(lambda: safe_delete(dst, strict=False, log_file=log_file))
+        cs = safe_copy(src, dst, overwrite=True, log_file=log_file, progress=mux.stream(key))
+        if cs is not None:
+            copies.append(cs)
+        set_readonly(dst, False)
 
-    if src_drw.exists():
-        safe_copy(src_drw, dst_drw, overwrite=True, log_file=log_file)
-        set_readonly(dst_drw, False)
-        doc.file_inrev_drw_path = str(dst_drw)
-    else:
-        doc.file_inrev_drw_path = ""
+    tasks = []
+    if has_model:
+        tasks.append(lambda: copy_one(src_model, dst_model, "model"))
+    if has_drw:
+        tasks.append(lambda: copy_one(src_drw, dst_drw, "drw"))
+    errors = [e for e in _run_pipelines(tasks, mux) if e is not None]
+    if errors:
+        # nessuna copia IN_REV parziale: si rimuovono entrambe
+        undo.run(log_file)
+        _append_log(log_file, f"WF FAIL CREATE_INREV | {type(errors[0]).__name__}: {errors[0]} | rollback eseguito")
+        raise errors[0]
+
+    doc.file_inrev_path = str(dst_model) if has_model else ""
+    doc.file_inrev_drw_path = str(dst_drw) if has_drw else ""
 
     doc.state = "IN_REV"
     _append_log(log_file, f"WF OK CREATE_INREV | code={doc.code} | new_state={doc.state} | rev={int(doc.revision):02d}")
-    return doc, WorkflowResult(True, "Revisione creata (IN_REV).")
+    return doc, WorkflowResult(True, "Revisione creata (IN_REV).", copies=copies, undo=undo)
 
 
-def approve_inrev(doc: Document, archive_root: str, log_file: str | Path | None = None) -> Tuple[Document, WorkflowResult]:
+def _discard_journal(journal: Any, message: str) -> None:
+    # transizione rifiutata prima dei passi file: l'intent non resta aperto per la recovery
+    if journal is not None:
+        try:
+            journal.discard(message)
+        except Exception:
+            pass
+
+
+def approve_inrev(
+    doc: Document,
+    archive_root: str,
+    log_file: str | Path | None = None,
+    progress: Optional[ProgressFn] = None,
+    journal: Any = None,
+) -> Tuple[Document, WorkflowResult]:
+    """Approva la revisione: REL -> REV, IN_REV -> REL, pulizia IN_REV.
+
+    journal: giornale write-ahead opzionale (wf_journal.WorkflowJournal).
+    Ogni passo file viene registrato prima di eseguirlo; con il giornale,
+    sullo stesso volume REL -> REV e IN_REV -> REL diventano rename (niente
+    copia dati) perche un'interruzione viene annullata dalla recovery.
+    """
     _append_log(log_file, f"WF START APPROVE_INREV | code={doc.code} | state={doc.state} | rev={int(doc.revision):02d}")
     if doc.state != "IN_REV":
         _append_log(log_file, "WF FAIL APPROVE_INREV | stato non valido (serve IN_REV)")
+        _discard_journal(journal, "stato non valido")
         return doc, WorkflowResult(False, "Per approvare serve stato IN_REV.")
 
     if not archive_root:
         _append_log(log_file, "WF FAIL APPROVE_INREV | archivio non configurato")
+        _discard_journal(journal, "archivio non configurato")
         return doc, WorkflowResult(False, "Archivio non configurato (SolidWorks > Archivio).")
 
     current, _rel, inrev, rev = archive_dirs(archive_root, doc.mmm, doc.gggg)
@@ -343,76 +890,204 @@ def approve_inrev(doc: Document, archive_root: str, log_file: str | Path | None
     rev_model_dst = model_path(rev, rel_tag, doc.doc_type)
     rev_drw_dst = drw_path(rev, rel_tag)
 
-    if rel_model.exists() and rev_model_dst.exists():
+    # REV gia presente e identica al REL (es. approvazione ripetuta dopo un errore): niente ricopia
+    rev_model_same = _same_content(rel_model, rev_model_dst)
+    rev_drw_same = _same_content(rel_drw, rev_drw_dst)
+    if rel_model.exists() and rev_model_dst.exists() and rev_model_same is None:
         _append_log(log_file, f"WF FAIL APPROVE_INREV | revisione gia presente: {rev_model_dst}")
+        _discard_journal(journal, "revisione gia presente")
         return doc, WorkflowResult(False, f"Revisione gia presente in archivio REV: {rev_model_dst}")
-    if rel_drw.exists() and rev_drw_dst.exists():
+    if rel_drw.exists() and rev_drw_dst.exists() and rev_drw_same is None:
         _append_log(log_file, f"WF FAIL APPROVE_INREV | drawing revisione gia presente: {rev_drw_dst}")
+        _discard_journal(journal, "disegno revisione gia presente")
         return doc, WorkflowResult(False, f"Disegno revisione gia presente in archivio REV: {rev_drw_dst}")
 
-    created_rev_model = False
-    created_rev_drw = False
+    # promote INREV copy to REL with base code name
+    inrev_model = Path(doc.file_inrev_path) if doc.file_inrev_path else model_path(inrev, inrev_tag(doc.code, cur_rev), doc.doc_type)
+    inrev_drw = Path(doc.file_inrev_drw_path) if doc.file_inrev_drw_path else drw_path(inrev, inrev_tag(doc.code, cur_rev))
+    cur_model = model_path(current, doc.code, doc.doc_type)
+    cur_drw = drw_path(current, doc.code)
+
+    sums: List[FileChecksum] = []
+    copies: List[CopyStats] = []
+    promoted: Dict[str, Path] = {}
+    renamed: set = set()
+    undo = _Undo()
+    mux = _ProgressMux(progress)
+
+    def jstep(op: str, src: Path, dst: Path | str = "", restore_from: Path | str = "") -> int:
+        return journal.step(op, src, dst, restore_from) if journal is not None else 0
+
+    def jdone(seq: int) -> None:
+        if journal is not None and seq:
+            journal.done(seq)
+
+    def add_sum(role: str, revision: int, path: Path, digest: Optional[Tuple[str, int]] = None) -> None:
+        cks = _checksum(role, revision, path, digest)
+        if cks:
+            sums.append(cks)
+
+    def approve_renames(key: str, rel_src: Path, rev_dst: Path, inrev_src: Path, cur_dst: Path) -> bool:
+        """Percorso rapido (rename); False se il REL e bloccato e serve la copia."""
+        role = "MODEL" if key == "model" else "DRW"
+        seq = jstep("MOVE", rel_src, rev_dst)
+        try:
+            safe_move(rel_src, rev_dst, overwrite=False, log_file=log_file)
+        except OSError as e:
+            if not _is_lock_like_oserror(e):
+                raise
+            _append_log(log_file, f"WF WARN APPROVE_INREV | rename bloccato, uso copia | {rel_src}: {e}")
+            return False
+        jdone(seq)
+
+        def restore_rel() -> None:
+            safe_move(rev_dst, rel_src, overwrite=False, log_file=log_file)
+            set_readonly(rel_src, True)
+        undo.add(restore_rel)
+        set_readonly(rev_dst, True)
+        add_sum(f"REV_{role}", cur_rev, rev_dst)
+
+        seq = jstep("MOVE", inrev_src, cur_dst)
+        try:
+            safe_move(inrev_src, cur_dst, overwrite=False, log_file=log_file)
+        except Exception as e:
+            raise PermissionError(f"{e} | source={inrev_src} -> dest={cur_dst}") from e
+        jdone(seq)
+        undo.add(lambda: safe_move(cur_dst, inrev_src, overwrite=False, log_file=log_file))
+        set_readonly(cur_dst, True)
+        add_sum(f"REL_{role}", cur_rev + 1, cur_dst)
+        renamed.add(key)
+        return True
 
-    try:
+    def approve_one(
+        key: str,
+        rel_src: Path,
+        rev_dst: Path,
+        rev_same: Optional[Tuple[str, int]],
+        inrev_src: Path,
+        cur_dst: Path,
+    ) -> None:
+        role = "MODEL" if key == "model" else "DRW"
+        if (
+            journal is not None
+            and rev_same is None
+            and rel_src.exists()
+            and inrev_src.exists()
+            and _same_path(rel_src, cur_dst)
+            and _same_volume(rel_src, rev_dst.parent)
+            and _same_volume(inrev_src, cur_dst.parent)
+        ):
+            if approve_renames(key, rel_src, rev_dst, inrev_src, cur_dst):
+                return
         # REL -> REV: copia (non move) per ridurre i lock WinError 32 su rename.
-        if rel_model.exists():
-            safe_copy(rel_model, rev_model_dst, overwrite=False, log_file=log_file)
-            set_readonly(rev_model_dst, True)
-            created_rev_model = True
-        if rel_drw.exists():
-            safe_copy(rel_drw, rev_drw_dst, overwrite=False, log_file=log_file)
-            set_readonly(rev_drw_dst, True)
-            created_rev_drw = True
-
-        # promote INREV copy to REL with base code name
-        inrev_model = Path(doc.file_inrev_path) if doc.file_inrev_path else model_path(inrev, inrev_tag(doc.code, cur_rev), doc.doc_type)
-        inrev_drw = Path(doc.file_inrev_drw_path) if doc.file_inrev_drw_path else drw_path(inrev, inrev_tag(doc.code, cur_rev))
-
-        if inrev_model.exists():
-            dst = model_path(current, doc.code, doc.doc_type)
-            try:
-                safe_copy_replace(inrev_model, dst, log_file=log_file)
-            except Exception as e:
-                raise PermissionError(f"{e} | source={inrev_model} -> dest={dst}") from e
-            set_readonly(dst, True)
-            if not safe_delete(inrev_model, strict=False, log_file=log_file):
-                _append_log(log_file, f"WF WARN APPROVE_INREV | impossibile eliminare IN_REV model: {inrev_model}")
-            doc.file_rel_path = str(dst)
-            doc.file_wip_path = str(dst)
-        else:
-            doc.file_rel_path = doc.file_rel_path or ""
-            doc.file_wip_path = doc.file_wip_path or doc.file_rel_path
-
-        if inrev_drw.exists():
-            dst = drw_path(current, doc.code)
-            try:
-                safe_copy_replace(inrev_drw, dst, log_file=log_file)
-            except Exception as e:
-                raise PermissionError(f"{e} | source={inrev_drw} -> dest={dst}") from e
-            set_readonly(dst, True)
-            if not safe_delete(inrev_drw, strict=False, log_file=log_file):
-                _append_log(log_file, f"WF WARN APPROVE_INREV | impossibile eliminare IN_REV drw: {inrev_drw}")
-            doc.file_rel_drw_path = str(dst)
-            doc.file_wip_drw_path = str(dst)
+        if rev_same is not None:
+            _append_log(log_file, f"FS COPY SKIP (identico) | {rel_src} -> {rev_dst}")
+            add_sum(f"REV_{role}", cur_rev, rev_dst, rev_same)
+        elif rel_src.exists():
+            seq = jstep("COPY", rel_src, rev_dst)
+            undo.add(lambda: safe_delete(rev_dst, strict=False, log_file=log_file))
+            cs = safe_copy(rel_src, rev_dst, overwrite=False, log_file=log_file, progress=mux.stream(f"{key}_rev"), hash_content=True)
+            jdone(seq)
+            set_readonly(rev_dst, True)
+            if cs is not None:
+                copies.append(cs)
+                add_sum(f"REV_{role}", cur_rev, rev_dst, cs.digest)
+
+        if not inrev_src.exists():
+            return
+        # rollback del REL sovrascritto: dalla copia REV se era lo stesso file, altrimenti rimozione
+        if cur_dst.exists() and _same_path(rel_src, cur_dst) and rev_dst.exists():
+            seq = jstep("REPLACE", inrev_src, cur_dst, rev_dst)
+
+            def restore_current() -> None:
+                safe_copy_replace(rev_dst, cur_dst, log_file=log_file)
+                set_readonly(cur_dst, True)
+            undo.add(restore_current)
+        elif not cur_dst.exists():
+            seq = jstep("COPY", inrev_src, cur_dst)
+            undo.add(lambda: safe_delete(cur_dst, strict=False, log_file=log_file))
         else:
-            doc.file_rel_drw_path = doc.file_rel_drw_path or ""
-            doc.file_wip_drw_path = doc.file_wip_drw_path or doc.file_rel_drw_path
-    except Exception as e:
-        # rollback best-effort delle copie REV create in questa esecuzione
-        if created_rev_model:
-            safe_delete(rev_model_dst, strict=False, log_file=log_file)
-        if created_rev_drw:
-            safe_delete(rev_drw_dst, strict=False, log_file=log_file)
-        _append_log(log_file, f"WF FAIL APPROVE_INREV | promote failed: {e}")
-        return doc, WorkflowResult(False, f"Impossibile approvare revisione: {e}")
+            seq = jstep("REPLACE", inrev_src, cur_dst)
+        try:
+            cs = safe_copy_replace(inrev_src, cur_dst, log_file=log_file, progress=mux.stream(f"{key}_rel"), hash_content=True)
+        except Exception as e:
+            raise PermissionError(f"{e} | source={inrev_src} -> dest={cur_dst}") from e
+        jdone(seq)
+        set_readonly(cur_dst, True)
+        if cs is not None:
+            copies.append(cs)
+            add_sum(f"REL_{role}", cur_rev + 1, cur_dst, cs.digest)
+        promoted[key] = inrev_src
+
+    errors = [
+        e for e in _run_pipelines(
+            [
+                lambda: approve_one("model", rel_model, rev_model_dst, rev_model_same, inrev_model, cur_model),
+                lambda: approve_one("drw", rel_drw, rev_drw_dst, rev_drw_same, inrev_drw, cur_drw),
+            ],
+            mux,
+        )
+        if e is not None
+    ]
+    if errors:
+        # rollback congiunto: REL ripristinati, copie REV di questa esecuzione rimosse, IN_REV intatti
+        failed = undo.run(log_file)
+        _append_log(log_file, f"WF FAIL APPROVE_INREV | promote failed: {errors[0]}")
+        if journal is not None and not failed:
+            journal.rolled_back(str(errors[0]))  # altrimenti resta PENDING per la recovery
+        msg = f"Impossibile approvare revisione: {errors[0]}"
+        if failed:
+            msg += " (ripristino file incompleto: copie REV conservate, vedi log)"
+        return doc, WorkflowResult(False, msg)
+
+    if "model" in promoted or "model" in renamed:
+        doc.file_rel_path = str(cur_model)
+        doc.file_wip_path = str(cur_model)
+    else:
+        doc.file_rel_path = doc.file_rel_path or ""
+        doc.file_wip_path = doc.file_wip_path or doc.file_rel_path
+    if "drw" in promoted or "drw" in renamed:
+        doc.file_rel_drw_path = str(cur_drw)
+        doc.file_wip_drw_path = str(cur_drw)
+    else:
+        doc.file_rel_drw_path = doc.file_rel_drw_path or ""
+        doc.file_wip_drw_path = doc.file_wip_drw_path or doc.file_rel_drw_path
 
     # increment revision
     doc.revision = cur_rev + 1
     doc.state = "REL"
     doc.file_inrev_path = ""
     doc.file_inrev_drw_path = ""
+    res = WorkflowResult(True, f"Approvato: REL rev {doc.revision:02d}.", sums, copies)
+
+    cleanup: List[Tuple[str, Path, int]] = []
+    if journal is not None:
+        # pulizia IN_REV pianificata prima del punto di commit: dopo, la recovery completa invece di annullare
+        try:
+            cleanup = [(key, src, jstep("DELETE", src)) for key, src in promoted.items()]
+            journal.files_done(doc, res)
+        except Exception as e:
+            failed = undo.run(log_file)
+            if not failed:
+                journal.rolled_back(str(e))
+            _append_log(log_file, f"WF FAIL APPROVE_INREV | giornale non scrivibile: {e}")
+            return doc, WorkflowResult(False, f"Impossibile approvare revisione: giornale non scrivibile: {e}")
+    else:
+        cleanup = [(key, src, 0) for key, src in promoted.items()]
+
+    # i sorgenti IN_REV si eliminano solo dopo che entrambe le promozioni sono riuscite
+    for key, inrev_src, seq in cleanup:
+        if not safe_delete(inrev_src, strict=False, log_file=log_file):
+            what = "model" if key == "model" else "drw"
+            _append_log(log_file, f"WF WARN APPROVE_INREV | impossibile eliminare IN_REV {what}: {inrev_src}")
+            continue
+        try:
+            jdone(seq)
+        except Exception:
+            pass  # la recovery ripete l'eliminazione (idempotente)
+
     _append_log(log_file, f"WF OK APPROVE_INREV | code={doc.code} | new_state={doc.state} | rev={int(doc.revision):02d}")
-    return doc, WorkflowResult(True, f"Approvato: REL rev {doc.revision:02d}.")
+    return doc, res
 
 
 def cancel_inrev(doc: Document, log_file: str | Path | None = None) -> Tuple[Document, WorkflowResult]:
@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import json
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from .archive import (
     IN_REV_DIR,
@@ -17,6 +23,10 @@ from .archive import (
 from .models import Document
 from .store import Store
 
+DEFAULT_MIGRATION_WORKERS = 4
+# stati finali di uno spostamento (gli altri vengono ritentati alla ripresa)
+FINAL_MOVE_STATUSES = ("DONE", "MISSING")
+
 
 @dataclass
 class _MoveItem:
@@ -160,15 +170,8 @@ def _collect_history_moves(
     return out
 
 
-def run_archive_layout_migration(
-    store: Store,
-    archive_root: str,
-    apply_changes: bool = False,
-) -> Dict[str, Any]:
-    root = Path(str(archive_root or "").strip())
-    if not str(root).strip():
-        return {"ok": False, "error": "Archivio non configurato.", "apply_changes": bool(apply_changes)}
-
+def _build_plan(store: Store, root: Path) -> Tuple[int, List[_MoveItem], List[str], Dict[str, Dict[str, str]]]:
+    """Calcola spostamenti, conflitti e aggiornamenti percorso per tutti i documenti."""
     docs = store.list_documents(include_obs=True)
     move_map: Dict[str, _MoveItem] = {}
     conflicts: List[str] = []
@@ -242,50 +245,302 @@ def run_archive_layout_migration(
         if updates:
             updates_by_code[doc.code] = updates
 
-    moves = list(move_map.values())
-    moved = 0
-    skipped_missing = 0
-    move_errors: List[str] = []
-    runtime_conflicts = list(conflicts)
+    return len(docs), list(move_map.values()), conflicts, updates_by_code
+
+
+def _ts() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def find_open_migration_job(store: Store, archive_root: str) -> Optional[Dict[str, Any]]:
+    """Job di migrazione non completato per `archive_root` (da riprendere), se esiste."""
+    r = store.conn.execute(
+        "SELECT id, status, created_at FROM archive_migration_jobs WHERE archive_root=? AND status NOT IN ('DONE', 'ABANDONED') "
+        "ORDER BY id DESC LIMIT 1;",
+        (str(Path(str(archive_root or "").strip())),),
+    ).fetchone()
+    if not r:
+        return None
+    placeholders = ",".join("?" * len(FINAL_MOVE_STATUSES))
+    total, done = store.conn.execute(
+        f"SELECT count(*), sum(CASE WHEN status IN ({placeholders}) THEN 1 ELSE 0 END) "
+        "FROM archive_migration_moves WHERE job_id=?;",
+        (*FINAL_MOVE_STATUSES, r["id"]),
+    ).fetchone()
+    return {
+        "id": int(r["id"]), "status": str(r["status"]), "created_at": str(r["created_at"]),
+        "moves_total": int(total or 0), "moves_final": int(done or 0),
+    }
+
+
+def _create_job(
+    store: Store,
+    root: Path,
+    docs_scanned: int,
+    moves: List[_MoveItem],
+    conflicts: List[str],
+    updates_by_code: Dict[str, Dict[str, str]],
+) -> int:
+    now = _ts()
+    with store.transaction():
+        # un piano nuovo sostituisce i job rimasti aperti: non verranno piu ripresi
+        store.conn.execute(
+            "UPDATE archive_migration_jobs SET status='ABANDONED', updated_at=? "
+            "WHERE archive_root=? AND status NOT IN ('DONE', 'ABANDONED');",
+            (now, str(root)),
+        )
+        cur = store.conn.execute(
+            "INSERT INTO archive_migration_jobs(archive_root, status, conflicts_json, docs_scanned, created_at, updated_at) "
+            "VALUES(?, 'RUNNING', ?, ?, ?, ?);",
+            (str(root), json.dumps(conflicts, ensure_ascii=False), int(docs_scanned), now, now),
+        )
+        job_id = int(cur.lastrowid)
+        store.conn.executemany(
+            "INSERT INTO archive_migration_moves(job_id, seq, code, reason, src, dst, updated_at) VALUES(?, ?, ?, ?, ?, ?, ?);",
+            [(job_id, i, m.code, m.reason, str(m.src), str(m.dst), now) for i, m in enumerate(moves, start=1)],
+        )
+        store.conn.executemany(
+            "INSERT INTO archive_migration_updates(job_id, code, fields_json) VALUES(?, ?, ?);",
+            [(job_id, code, json.dumps(f, ensure_ascii=False)) for code, f in updates_by_code.items()],
+        )
+    return job_id
 
-    if apply_changes:
-        for m in moves:
-            try:
-                if not m.src.exists():
-                    skipped_missing += 1
-                    continue
-                if m.dst.exists() and _norm_path(m.src) != _norm_path(m.dst):
-                    runtime_conflicts.append(f"{m.code}: target gia presente | {m.dst}")
-                    continue
-                safe_move(m.src, m.dst, overwrite=False)
-                moved += 1
-            except FileExistsError:
-                runtime_conflicts.append(f"{m.code}: target gia presente | {m.dst}")
-            except Exception as e:
-                move_errors.append(f"{m.code}: move error {m.src} -> {m.dst} | {e}")
 
-        docs_updated = 0
-        for code, fields in updates_by_code.items():
+def _apply_move(src: Path, dst: Path) -> Tuple[str, str]:
+    """Esegue uno spostamento; ritorna (stato, dettaglio). Idempotente alla ripresa."""
+    try:
+        if not src.exists():
+            if dst.exists():
+                return "DONE", "gia a destinazione"
+            return "MISSING", ""
+        if dst.exists() and _norm_path(src) != _norm_path(dst):
+            return "CONFLICT", f"target gia presente | {dst}"
+        safe_move(src, dst, overwrite=False)
+        return "DONE", ""
+    except FileExistsError:
+        return "CONFLICT", f"target gia presente | {dst}"
+    except Exception as e:
+        return "ERROR", f"move error {src} -> {dst} | {e}"
+
+
+def _run_folder(rows: List[Tuple[int, str, str]], out: "queue.SimpleQueue[Tuple[int, str, str]]") -> None:
+    # una cartella destinazione per task: niente scritture concorrenti nella stessa directory
+    for seq, src, dst in rows:
+        status, detail = _apply_move(Path(src), Path(dst))
+        out.put((seq, status, detail))
+
+
+def _execute_job(
+    store: Store,
+    job_id: int,
+    workers: int,
+    progress: Optional[Callable[[int, int], None]],
+) -> None:
+    placeholders = ",".join("?" * len(FINAL_MOVE_STATUSES))
+    total = int(store.conn.execute("SELECT count(*) FROM archive_migration_moves WHERE job_id=?;", (job_id,)).fetchone()[0])
+    rows = store.conn.execute(
+        f"SELECT seq, src, dst FROM archive_migration_moves WHERE job_id=? AND status NOT IN ({placeholders}) ORDER BY seq;",
+        (job_id, *FINAL_MOVE_STATUSES),
+    ).fetchall()
+    done = total - len(rows)
+    groups: Dict[str, List[Tuple[int, str, str]]] = {}
+    for r in rows:
+        key = os.path.normcase(os.path.dirname(os.path.normpath(str(r["dst"]))))
+        groups.setdefault(key, []).append((int(r["seq"]), str(r["src"]), str(r["dst"])))
+
+    results: "queue.SimpleQueue[Tuple[int, str, str]]" = queue.SimpleQueue()
+
+    def drain() -> int:
+        batch = []
+        while True:
+            try:
+                seq, status, detail = results.get_nowait()
+            except queue.Empty:
+                break
+            batch.append((status, detail, _ts(), job_id, seq))
+        if batch:
+            # stato degli spostamenti salvato a blocchi: alla ripresa si riparte da qui
+            with store.transaction():
+                store.conn.executemany(
+                    "UPDATE archive_migration_moves SET status=?, error=?, updated_at=? WHERE job_id=? AND seq=?;",
+                    batch,
+                )
+        return len(batch)
+
+    if progress:
+        try:
+            progress(done, total)
+        except Exception:
+            pass
+    if not groups:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(int(workers), len(groups))), thread_name_prefix="pdm-arch-migr") as pool:
+        pending = {pool.submit(_run_folder, g, results) for g in groups.values()}
+        while pending:
+            finished, pending = wait(pending, timeout=0.2)
+            n = drain()
+            for f in finished:
+                f.result()
+            if n:
+                done += n
+                if progress:
+                    try:
+                        progress(done, total)
+                    except Exception:
+                        pass
+    n = drain()
+    if n and progress:
+        try:
+            progress(done + n, total)
+        except Exception:
+            pass
+
+
+def _finish_job(store: Store, job_id: int) -> Tuple[int, List[str]]:
+    """Aggiorna i documenti (una transazione) per i codici con spostamenti completati.
+
+    I documenti modificati dopo la creazione del job non vengono toccati
+    (update SKIPPED, segnalato negli errori): i percorsi del piano sono vecchi.
+    """
+    created_at = str(store.conn.execute(
+        "SELECT created_at FROM archive_migration_jobs WHERE id=?;", (job_id,)
+    ).fetchone()[0])
+    placeholders = ",".join("?" * len(FINAL_MOVE_STATUSES))
+    blocked = {
+        str(r["code"])
+        for r in store.conn.execute(
+            f"SELECT DISTINCT code FROM archive_migration_moves WHERE job_id=? AND status NOT IN ({placeholders});",
+            (job_id, *FINAL_MOVE_STATUSES),
+        ).fetchall()
+    }
+    todo = store.conn.execute(
+        "SELECT u.code, u.fields_json, d.updated_at FROM archive_migration_updates u "
+        "LEFT JOIN documents d ON d.code=u.code "
+        "WHERE u.job_id=? AND u.status NOT IN ('DONE', 'SKIPPED') ORDER BY u.code;",
+        (job_id,),
+    ).fetchall()
+    errors: List[str] = []
+    updated = 0
+    with store.transaction():
+        for r in todo:
+            code = str(r["code"])
+            if code in blocked:
+                continue
+            if str(r["updated_at"] or "") > created_at:
+                store.conn.execute(
+                    "UPDATE archive_migration_updates SET status='SKIPPED' WHERE job_id=? AND code=?;", (job_id, code)
+                )
+                errors.append(f"{code}: modificato dopo il piano di migrazione, percorsi DB non aggiornati (verificare)")
+                continue
             try:
-                store.update_document(code, **fields)
-                docs_updated += 1
+                with store.transaction():
+                    store.update_document(code, **json.loads(r["fields_json"]))
+                    store.conn.execute(
+                        "UPDATE archive_migration_updates SET status='DONE' WHERE job_id=? AND code=?;", (job_id, code)
+                    )
+                updated += 1
             except Exception as e:
-                move_errors.append(f"{code}: update_document error | {e}")
+                errors.append(f"{code}: update_document error | {e}")
+        left = store.conn.execute(
+            "SELECT count(*) FROM archive_migration_updates WHERE job_id=? AND status NOT IN ('DONE', 'SKIPPED');", (job_id,)
+        ).fetchone()[0]
+        status = "DONE" if not blocked and not left else "INCOMPLETE"
+        store.conn.execute(
+            "UPDATE archive_migration_jobs SET status=?, updated_at=? WHERE id=?;", (status, _ts(), job_id)
+        )
+    return updated, errors
+
+
+def run_archive_layout_migration(
+    store: Store,
+    archive_root: str,
+    apply_changes: bool = False,
+    workers: int = DEFAULT_MIGRATION_WORKERS,
+    resume: bool = True,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """Analizza (apply_changes=False) o esegue la migrazione al layout archivio corrente.
+
+    In esecuzione il piano e salvato come job (archive_migration_*): gli
+    spostamenti girano su un pool limitato, un task per cartella
+    destinazione, e lo stato di ogni spostamento e salvato a blocchi. Con
+    resume=True un job non completato per lo stesso archivio viene ripreso
+    invece di ricalcolare il piano. I documenti sono aggiornati in un'unica
+    transazione, solo per i codici con tutti gli spostamenti completati.
+    progress(done, total) e chiamato nel thread chiamante.
+    """
+    t0 = time.perf_counter()
+    root = Path(str(archive_root or "").strip())
+    if not str(archive_root or "").strip():
+        return {"ok": False, "error": "Archivio non configurato.", "apply_changes": bool(apply_changes)}
+
+    open_job = find_open_migration_job(store, str(root)) if (apply_changes and resume) else None
+    if open_job is None:
+        docs_scanned, moves, conflicts, updates_by_code = _build_plan(store, root)
+        if not apply_changes:
+            return {
+                "ok": True,
+                "apply_changes": False,
+                "archive_root": str(root),
+                "docs_scanned": docs_scanned,
+                "docs_to_update": len(updates_by_code),
+                "docs_updated": len(updates_by_code),
+                "moves_planned": len(moves),
+                "moves_done": 0,
+                "moves_missing": 0,
+                "conflicts": conflicts,
+                "errors": [],
+                "sample_moves": [f"{m.code} | {m.reason} | {m.src} -> {m.dst}" for m in moves[:25]],
+            }
+        job_id = _create_job(store, root, docs_scanned, moves, conflicts, updates_by_code)
     else:
-        docs_updated = len(updates_by_code)
+        job_id = open_job["id"]
+        with store.transaction():
+            store.conn.execute(
+                "UPDATE archive_migration_jobs SET status='RUNNING', updated_at=? WHERE id=?;", (_ts(), job_id)
+            )
 
-    ok = (len(move_errors) == 0)
+    _execute_job(store, job_id, workers, progress)
+    docs_updated, update_errors = _finish_job(store, job_id)
+
+    job = store.conn.execute(
+        "SELECT status, conflicts_json, docs_scanned FROM archive_migration_jobs WHERE id=?;", (job_id,)
+    ).fetchone()
+    counts = {
+        str(r["status"]): int(r["n"])
+        for r in store.conn.execute(
+            "SELECT status, count(*) AS n FROM archive_migration_moves WHERE job_id=? GROUP BY status;", (job_id,)
+        ).fetchall()
+    }
+    problems = store.conn.execute(
+        "SELECT code, status, error FROM archive_migration_moves WHERE job_id=? AND status IN ('CONFLICT', 'ERROR') ORDER BY seq;",
+        (job_id,),
+    ).fetchall()
+    sample = store.conn.execute(
+        "SELECT code, reason, src, dst FROM archive_migration_moves WHERE job_id=? ORDER BY seq LIMIT 25;", (job_id,)
+    ).fetchall()
+    move_errors = [f"{r['code']}: {r['error']}" for r in problems if r["status"] == "ERROR"] + update_errors
+    conflicts = list(json.loads(job["conflicts_json"] or "[]")) + [
+        f"{r['code']}: {r['error']}" for r in problems if r["status"] == "CONFLICT"
+    ]
     return {
-        "ok": ok,
-        "apply_changes": bool(apply_changes),
+        "ok": len(move_errors) == 0,
+        "apply_changes": True,
         "archive_root": str(root),
-        "docs_scanned": len(docs),
-        "docs_to_update": len(updates_by_code),
+        "job_id": job_id,
+        "job_status": str(job["status"]),
+        "resumed": open_job is not None,
+        "docs_scanned": int(job["docs_scanned"]),
+        "docs_to_update": int(store.conn.execute(
+            "SELECT count(*) FROM archive_migration_updates WHERE job_id=?;", (job_id,)
+        ).fetchone()[0]),
         "docs_updated": int(docs_updated),
-        "moves_planned": len(moves),
-        "moves_done": int(moved),
-        "moves_missing": int(skipped_missing),
-        "conflicts": runtime_conflicts,
+        "moves_planned": sum(counts.values()),
+        "moves_done": counts.get("DONE", 0),
+        "moves_missing": counts.get("MISSING", 0),
+        "moves_pending": counts.get("PLANNED", 0) + counts.get("ERROR", 0) + counts.get("CONFLICT", 0),
+        "conflicts": conflicts,
         "errors": move_errors,
-        "sample_moves": [f"{m.code} | {m.reason} | {m.src} -> {m.dst}" for m in moves[:25]],
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+        "sample_moves": [f"{r['code']} | {r['reason']} | {r['src']} -> {r['dst']}" for r in sample],
     }
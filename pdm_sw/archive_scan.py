@@ -0,0 +1,303 @@
+"""Verifica integrita archivio CAD: percorsi DB <-> file su disco.
+
+Scansiona `archive_root` in parallelo (un task per cartella MMM e MMM/GGGG,
+ognuno legge base, IN_REV e REV con os.scandir) e confronta con la tabella
+documents. Esiti:
+- MISSING: percorso in DB ma file assente
+- ORPHAN: file CAD in archivio non referenziato da alcun documento
+- WRONG_STATE_FOLDER: file in una cartella non coerente con colonna/stato
+- READONLY_MISMATCH: attributo sola lettura diverso da apply_state_permissions
+
+Uso CLI:
+    python -m pdm_sw.archive_scan <ws_dir> <archive_root> [--workers 8]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import re
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .archive import IN_REV_DIR, REV_DIR
+from .store import Store
+
+CAD_EXTS = (".sldprt", ".sldasm", ".slddrw")
+KINDS = ("MISSING", "ORPHAN", "WRONG_STATE_FOLDER", "READONLY_MISMATCH")
+REPORT_FIELDS = ["kind", "code", "state", "column", "path", "expected", "detail"]
+
+# colonne percorso: (nome, cartella attesa, stato in cui il file e scrivibile)
+_PATH_COLUMNS = (
+    ("file_wip_path", "current", "WIP"),
+    ("file_rel_path", "current", ""),
+    ("file_inrev_path", "inrev", "IN_REV"),
+    ("file_wip_drw_path", "current", "WIP"),
+    ("file_rel_drw_path", "current", ""),
+    ("file_inrev_drw_path", "inrev", "IN_REV"),
+)
+_REV_NAME_RE = re.compile(r"^(?P<code>.+)_R\d{2}$")
+
+# (percorso normalizzato, nome originale, sola lettura)
+_FileEntry = Tuple[str, str, bool]
+
+
+def _norm(p: str) -> str:
+    return os.path.normcase(os.path.normpath(p))
+
+
+@dataclass
+class ArchiveScanResult:
+    ok: bool
+    report_path: str = ""
+    folders: int = 0
+    files: int = 0
+    docs: int = 0
+    elapsed_s: float = 0.0
+    counts: Dict[str, int] = field(default_factory=lambda: {k: 0 for k in KINDS})
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def issues(self) -> int:
+        return sum(self.counts.values())
+
+
+@dataclass
+class _Expected:
+    code: str
+    state: str
+    columns: List[str]
+    writable: bool
+    folder: str  # cartella attesa (normalizzata)
+
+
+def _list_files(folder: str) -> Tuple[List[_FileEntry], List[str], str]:
+    """File CAD e sottocartelle di `folder` (un solo scandir, stat dal listing)."""
+    files: List[_FileEntry] = []
+    subdirs: List[str] = []
+    try:
+        with os.scandir(folder) as it:
+            for e in it:
+                try:
+                    if e.is_dir():
+                        subdirs.append(e.name)
+                        continue
+                    if not e.is_file():
+                        continue
+                    low = e.name.lower()
+                    if low.startswith("~$") or not low.endswith(CAD_EXTS):
+                        continue
+                    ro = not (e.stat().st_mode & stat.S_IWUSR)
+                    files.append((_norm(e.path), e.name, ro))
+                except OSError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError):
+        return [], [], ""
+    except OSError as e:
+        return [], [], f"{folder}: {e}"
+    return files, subdirs, ""
+
+
+def _scan_unit(base: str) -> Tuple[Dict[str, List[_FileEntry]], List[str], List[str]]:
+    """Task di un worker: base + IN_REV + REV. Ritorna (file per cartella, sottocartelle, errori)."""
+    out: Dict[str, List[_FileEntry]] = {}
+    errors: List[str] = []
+    files, subdirs, err = _list_files(base)
+    out[_norm(base)] = files
+    if err:
+        errors.append(err)
+    for sub in (IN_REV_DIR, REV_DIR):
+        if sub not in subdirs:
+            continue
+        p = os.path.join(base, sub)
+        sub_files, _dirs, sub_err = _list_files(p)
+        out[_norm(p)] = sub_files
+        if sub_err:
+            errors.append(sub_err)
+    others = [d for d in subdirs if d not in (IN_REV_DIR, REV_DIR)]
+    return out, others, errors
+
+
+def _doc_base(root: str, doc_type: str, mmm: str, gggg: str) -> str:
+    if str(doc_type or "").upper() == "MACHINE":
+        return _norm(os.path.join(root, mmm))
+    return _norm(os.path.join(root, mmm, gggg))
+
+
+def _expected_paths(store: Store, root: str) -> Tuple[Dict[str, _Expected], Set[str], int]:
+    """Mappa percorso normalizzato -> atteso, piu insieme dei codici documento."""
+    expected: Dict[str, _Expected] = {}
+    codes: Set[str] = set()
+    docs = store.list_documents(include_obs=True)
+    for d in docs:
+        codes.add(d.code.lower())
+        base = _doc_base(root, d.doc_type, d.mmm, d.gggg)
+        for col, where, writable_state in _PATH_COLUMNS:
+            raw = str(getattr(d, col, "") or "").strip()
+            if not raw:
+                continue
+            key = _norm(raw)
+            folder = base if where == "current" else os.path.join(base, _norm(IN_REV_DIR))
+            writable = bool(writable_state) and d.state == writable_state
+            hit = expected.get(key)
+            if hit is None:
+                expected[key] = _Expected(d.code, d.state, [col], writable, folder)
+            elif hit.code == d.code:
+                hit.columns.append(col)
+                hit.writable = hit.writable or writable
+            else:
+                hit.columns.append(f"{col}@{d.code}")
+    return expected, codes, len(docs)
+
+
+def scan_archive(
+    store: Store,
+    archive_root: str,
+    report_dir: str | Path,
+    workers: int = 8,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> ArchiveScanResult:
+    """Scansione parallela dell'archivio e report CSV in `report_dir`."""
+    t0 = time.perf_counter()
+    res = ArchiveScanResult(ok=False)
+    root = str(archive_root or "").strip()
+    if not root or not os.path.isdir(root):
+        res.errors.append(f"Archivio non trovato: {root or '(vuoto)'}")
+        return res
+
+    expected, codes, res.docs = _expected_paths(store, root)
+    listings: Dict[str, List[_FileEntry]] = {}
+    done = 0
+    total = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        pending = set()
+        try:
+            with os.scandir(root) as it:
+                mmm_dirs = [e.path for e in it if e.is_dir()]
+        except OSError as e:
+            res.errors.append(f"{root}: {e}")
+            mmm_dirs = []
+        for p in mmm_dirs:
+            pending.add(pool.submit(_scan_unit, p))
+        # cartelle dei percorsi DB fuori dal layout standard (una lettura per cartella)
+        extra = {os.path.dirname(k) for k in expected}
+        total = len(pending)
+        while pending:
+            fut = next(as_completed(pending))
+            pending.discard(fut)
+            folder_files, subdirs, errors = fut.result()
+            listings.update(folder_files)
+            res.errors.extend(errors)
+            done += 1
+            base = next(iter(folder_files))
+            if os.path.dirname(base) == _norm(root):
+                for sub in subdirs:
+                    pending.add(pool.submit(_scan_unit, os.path.join(base, sub)))
+                    total += 1
+            if progress:
+                try:
+                    progress(done, total)
+                except Exception:
+                    pass
+        extra_dirs = sorted(extra - set(listings))
+        for f, fut in zip(extra_dirs, [pool.submit(_list_files, f) for f in extra_dirs]):
+            files, _dirs, err = fut.result()
+            listings[f] = files
+            if err:
+                res.errors.append(err)
+
+    rows: List[Dict[str, str]] = []
+
+    def add(kind: str, code: str, state: str, column: str, path: str, expected_v: str = "", detail: str = "") -> None:
+        res.counts[kind] = res.counts.get(kind, 0) + 1
+        rows.append({
+            "kind": kind, "code": code, "state": state, "column": column,
+            "path": path, "expected": expected_v, "detail": detail,
+        })
+
+    on_disk: Dict[str, _FileEntry] = {}
+    for files in listings.values():
+        for entry in files:
+            on_disk[entry[0]] = entry
+    res.folders = len(listings)
+    res.files = len(on_disk)
+
+    for key, exp in expected.items():
+        cols = ",".join(exp.columns)
+        entry = on_disk.get(key)
+        if entry is None:
+            add("MISSING", exp.code, exp.state, cols, key)
+            continue
+        folder = os.path.dirname(key)
+        if folder != exp.folder:
+            add("WRONG_STATE_FOLDER", exp.code, exp.state, cols, key, exp.folder)
+        elif exp.folder.endswith(os.sep + _norm(IN_REV_DIR)) and exp.state != "IN_REV":
+            add("WRONG_STATE_FOLDER", exp.code, exp.state, cols, key, "", "copia IN_REV con documento non in revisione")
+        readonly = entry[2]
+        if readonly == exp.writable:
+            add(
+                "READONLY_MISMATCH", exp.code, exp.state, cols, key,
+                "scrivibile" if exp.writable else "sola lettura",
+                "sola lettura" if readonly else "scrivibile",
+            )
+
+    rev_suffix = os.sep + _norm(REV_DIR)
+    for key, (_path, name, _ro) in on_disk.items():
+        if key in expected:
+            continue
+        folder = os.path.dirname(key)
+        stem = os.path.splitext(name)[0]
+        if folder.endswith(rev_suffix):
+            m = _REV_NAME_RE.match(stem)
+            if m and m.group("code").lower() in codes:
+                continue  # revisione storica di un documento noto
+        add("ORPHAN", stem if stem.lower() in codes else "", "", "", key)
+
+    out_dir = Path(report_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"archive_scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    rows.sort(key=lambda r: (KINDS.index(r["kind"]), r["path"]))
+    with path.open("w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=REPORT_FIELDS, delimiter=";")
+        w.writeheader()
+        w.writerows(rows)
+
+    res.report_path = str(path)
+    res.elapsed_s = round(time.perf_counter() - t0, 3)
+    res.ok = True
+    return res
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Verifica integrita archivio CAD rispetto al DB.")
+    ap.add_argument("ws_dir", help="cartella workspace (contiene pdm.db)")
+    ap.add_argument("archive_root", help="radice archivio CAD")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--report-dir", default="", help="default: <ws_dir>/REPORTS")
+    a = ap.parse_args(list(argv) if argv is not None else None)
+
+    ws_dir = Path(a.ws_dir)
+    store = Store(ws_dir / "pdm.db")
+    try:
+        res = scan_archive(store, a.archive_root, Path(a.report_dir) if a.report_dir else ws_dir / "REPORTS", workers=a.workers)
+    finally:
+        store.close()
+    for err in res.errors[:20]:
+        print(f"ERRORE: {err}")
+    if not res.ok:
+        return 1
+    print(f"Documenti: {res.docs} | cartelle: {res.folders} | file CAD: {res.files} | {res.elapsed_s} s")
+    for k in KINDS:
+        print(f"  {k:<20}{res.counts.get(k, 0):>8}")
+    print(f"Report: {res.report_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,331 @@
+"""Snapshot incrementali dell'archivio CAD (archive_root).
+
+Ogni snapshot e una cartella <store>/<timestamp>/ con files/ (stessa
+struttura dell'archivio) e manifest.json (dimensione, mtime e SHA-256 per
+file, backup DB corrispondente). L'archivio e letto in parallelo con
+os.scandir (un task per cartella di primo livello); rispetto allo snapshot
+precedente:
+- stessa dimensione e mtime: file invariato, hardlink alla copia precedente
+- stessa dimensione, mtime diverso: confronto SHA-256 (es. copia che
+  preserva il contenuto ma non la data)
+- altrimenti copia, con hash calcolato durante la copia.
+
+Lo snapshot e scritto in <timestamp>.partial e rinominato a fine lavoro: una
+cartella senza suffisso e sempre completa. Gli hardlink rendono la
+retention una semplice rimozione delle cartelle vecchie.
+
+Uso CLI:
+    python -m pdm_sw.archive_snapshot <archive_root> <store_dir> [--db-backup FILE] [--workers 8]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .archive import copy_file, file_sha256, set_readonly
+
+SNAPSHOT_FORMAT = "pdm-archive-snapshot-v1"
+MANIFEST_NAME = "manifest.json"
+FILES_DIR = "files"
+PARTIAL_SUFFIX = ".partial"
+DEFAULT_SNAPSHOT_RETENTION = 10
+
+# percorso relativo (separatore /) -> (dimensione, mtime_ns)
+_Listing = Dict[str, Tuple[int, int]]
+
+
+class SnapshotCancelled(Exception):
+    pass
+
+
+@dataclass
+class SnapshotResult:
+    ok: bool
+    path: str = ""
+    db_backup: str = ""
+    files: int = 0
+    new_files: int = 0
+    changed_files: int = 0
+    linked: int = 0
+    hashed: int = 0
+    bytes_copied: int = 0
+    removed_snapshots: int = 0
+    elapsed_s: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+
+def _walk(folder: str, rel: str, out: _Listing, errors: List[str]) -> None:
+    try:
+        with os.scandir(folder) as it:
+            for e in it:
+                r = f"{rel}/{e.name}" if rel else e.name
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        _walk(e.path, r, out, errors)
+                        continue
+                    if not e.is_file(follow_symlinks=False) or e.name.startswith("~$"):
+                        continue
+                    st = e.stat()
+                    out[r] = (int(st.st_size), int(st.st_mtime_ns))
+                except OSError as ex:
+                    errors.append(f"{e.path}: {ex}")
+    except OSError as ex:
+        errors.append(f"{folder}: {ex}")
+
+
+def list_archive(root: str | Path, workers: int = 8) -> Tuple[_Listing, List[str]]:
+    """File dell'archivio con dimensione e mtime; un task per cartella di primo livello."""
+    root = str(root)
+    listing: _Listing = {}
+    errors: List[str] = []
+    tops: List[Tuple[str, str]] = []
+    try:
+        with os.scandir(root) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    tops.append((e.path, e.name))
+                elif e.is_file(follow_symlinks=False) and not e.name.startswith("~$"):
+                    st = e.stat()
+                    listing[e.name] = (int(st.st_size), int(st.st_mtime_ns))
+    except OSError as ex:
+        return {}, [f"{root}: {ex}"]
+
+    def _task(path: str, name: str) -> Tuple[_Listing, List[str]]:
+        out: _Listing = {}
+        errs: List[str] = []
+        _walk(path, name, out, errs)
+        return out, errs
+
+    with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="pdm-snap-scan") as pool:
+        for fut in as_completed([pool.submit(_task, p, n) for p, n in tops]):
+            part, errs = fut.result()
+            listing.update(part)
+            errors.extend(errs)
+    return listing, errors
+
+
+def list_snapshots(store_dir: str | Path) -> List[Path]:
+    """Snapshot completi, dal piu recente."""
+    d = Path(store_dir)
+    if not d.is_dir():
+        return []
+    out = [p for p in d.iterdir() if p.is_dir() and not p.name.endswith(PARTIAL_SUFFIX) and (p / MANIFEST_NAME).is_file()]
+    return sorted(out, key=lambda p: p.name, reverse=True)
+
+
+def read_snapshot_manifest(snapshot_dir: str | Path) -> Dict[str, Any]:
+    m = json.loads((Path(snapshot_dir) / MANIFEST_NAME).read_text(encoding="utf-8"))
+    if m.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Formato snapshot non supportato: {m.get('format')}")
+    return m
+
+
+def _rmtree(path: Path) -> bool:
+    """rmtree che toglie la sola lettura (Windows non cancella file read-only); True se rimossa."""
+    def _onerror(func, p, _exc):
+        try:
+            os.chmod(p, stat.S_IWRITE | stat.S_IREAD)
+            func(p)
+        except OSError:
+            pass
+
+    shutil.rmtree(path, onerror=_onerror)
+    return not Path(path).exists()
+
+
+def _link_or_copy(src: Path, dst: Path) -> bool:
+    """Hardlink (True) o, se il volume non li supporta, copia (False)."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        copy_file(src, dst)
+        set_readonly(dst, False)
+        return False
+
+
+def _process(
+    rel: str,
+    cur: Tuple[int, int],
+    prev: Optional[List[Any]],
+    archive_root: Path,
+    prev_files: Optional[Path],
+    out_files: Path,
+) -> Tuple[str, List[Any]]:
+    """Un file: ritorna (esito, voce manifest [size, mtime_ns, sha256]).
+
+    esito: LINKED | LINKED_HASHED | NEW | CHANGED
+    """
+    src = archive_root / rel
+    dst = out_files / rel
+    size, mtime_ns = cur
+    old = prev_files / rel if prev_files is not None and prev else None
+    if prev and old is not None and old.is_file() and int(prev[0]) == size:
+        if int(prev[1]) == mtime_ns:
+            _link_or_copy(old, dst)
+            return "LINKED", [size, mtime_ns, prev[2]]
+        digest, _n = file_sha256(src)
+        if digest == prev[2]:
+            _link_or_copy(old, dst)
+            return "LINKED_HASHED", [size, mtime_ns, digest]
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    stats = copy_file(src, dst, hash_content=True)
+    # copy_file copia anche la sola lettura dei file REL: la retention deve poter cancellare
+    set_readonly(dst, False)
+    try:
+        os.utime(dst, ns=(mtime_ns, mtime_ns))
+    except OSError:
+        pass
+    return ("CHANGED" if prev else "NEW"), [size, mtime_ns, stats.sha256]
+
+
+def snapshot_archive(
+    archive_root: str | Path,
+    store_dir: str | Path,
+    db_backup: str = "",
+    workers: int = 8,
+    retention: int = DEFAULT_SNAPSHOT_RETENTION,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> SnapshotResult:
+    """Crea uno snapshot incrementale di `archive_root` in `store_dir`.
+
+    db_backup: percorso del backup DB preso insieme allo snapshot (finisce
+    nel manifest). progress(file, totale) gira nel thread chiamante.
+    """
+    t0 = time.perf_counter()
+    res = SnapshotResult(ok=False, db_backup=str(db_backup or ""))
+    root = Path(str(archive_root or "").strip())
+    if not str(archive_root or "").strip() or not root.is_dir():
+        res.errors.append(f"Archivio non trovato: {archive_root or '(vuoto)'}")
+        return res
+    store = Path(store_dir)
+    store.mkdir(parents=True, exist_ok=True)
+    # snapshot interrotti (crash, chiusura app) non sono riutilizzabili
+    for p in store.glob(f"*{PARTIAL_SUFFIX}"):
+        _rmtree(p)
+
+    prev_dir = next(iter(list_snapshots(store)), None)
+    prev_entries: Dict[str, List[Any]] = {}
+    if prev_dir is not None:
+        try:
+            prev_entries = dict(read_snapshot_manifest(prev_dir).get("files") or {})
+        except Exception as e:
+            res.errors.append(f"Manifest precedente non leggibile ({prev_dir.name}): {e}")
+            prev_dir = None
+
+    listing, scan_errors = list_archive(root, workers)
+    res.errors.extend(scan_errors)
+    name = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    n = 1
+    while (store / name).exists():
+        n += 1
+        name = f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{n}"
+    work_dir = store / f"{name}{PARTIAL_SUFFIX}"
+    out_files = work_dir / FILES_DIR
+    out_files.mkdir(parents=True, exist_ok=True)
+    prev_files = prev_dir / FILES_DIR if prev_dir is not None else None
+
+    entries: Dict[str, List[Any]] = {}
+    total = len(listing)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="pdm-snap-copy") as pool:
+            futs = {
+                pool.submit(_process, rel, cur, prev_entries.get(rel), root, prev_files, out_files): rel
+                for rel, cur in listing.items()
+            }
+            for i, fut in enumerate(as_completed(futs), start=1):
+                if cancel is not None and cancel.is_set():
+                    for f in futs:
+                        f.cancel()
+                    raise SnapshotCancelled("Snapshot annullato.")
+                rel = futs[fut]
+                try:
+                    outcome, entry = fut.result()
+                except Exception as e:
+                    res.errors.append(f"{rel}: {type(e).__name__}: {e}")
+                    continue
+                entries[rel] = entry
+                if outcome.startswith("LINKED"):
+                    res.linked += 1
+                    res.hashed += outcome == "LINKED_HASHED"
+                else:
+                    res.bytes_copied += int(entry[0])
+                    res.new_files += outcome == "NEW"
+                    res.changed_files += outcome == "CHANGED"
+                if progress:
+                    try:
+                        progress(i, total)
+                    except Exception:
+                        pass
+
+        res.files = len(entries)
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "archive_root": str(root),
+            "db_backup": Path(res.db_backup).name if res.db_backup else "",
+            "db_backup_path": res.db_backup,
+            "previous": prev_dir.name if prev_dir is not None else "",
+            "stats": {
+                "files": res.files, "new": res.new_files, "changed": res.changed_files,
+                "linked": res.linked, "hashed": res.hashed, "bytes_copied": res.bytes_copied,
+                "errors": len(res.errors),
+            },
+            "files": entries,
+        }
+        (work_dir / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        final = store / name
+        os.replace(work_dir, final)
+        res.path = str(final)
+    except SnapshotCancelled as e:
+        _rmtree(work_dir)
+        res.errors.append(str(e))
+        res.elapsed_s = round(time.perf_counter() - t0, 3)
+        return res
+    except Exception:
+        _rmtree(work_dir)
+        raise
+
+    # retention: i file condivisi restano nei snapshot successivi (hardlink)
+    for old in list_snapshots(store)[max(1, int(retention)):]:
+        if _rmtree(old):
+            res.removed_snapshots += 1
+        else:
+            res.errors.append(f"Snapshot non rimosso (retention): {old}")
+    res.ok = not res.errors
+    res.elapsed_s = round(time.perf_counter() - t0, 3)
+    return res
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Snapshot incrementale dell'archivio CAD.")
+    ap.add_argument("archive_root")
+    ap.add_argument("store_dir", help="cartella degli snapshot")
+    ap.add_argument("--db-backup", default="", help="backup DB da collegare allo snapshot")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--retention", type=int, default=DEFAULT_SNAPSHOT_RETENTION)
+    a = ap.parse_args(list(argv) if argv is not None else None)
+
+    res = snapshot_archive(a.archive_root, a.store_dir, db_backup=a.db_backup, workers=a.workers, retention=a.retention)
+    print(f"Snapshot: {res.path or '-'} | {res.elapsed_s} s")
+    print(f"  file {res.files} | nuovi {res.new_files} | modificati {res.changed_files} | "
+          f"collegati {res.linked} (di cui verificati hash {res.hashed}) | copiati {res.bytes_copied / 1e6:.1f} MB")
+    for e in res.errors[:20]:
+        print(f"ERRORE: {e}")
+    return 0 if res.ok else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,16 +2,38 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Callable, Dict, List, Optional
 from datetime import datetime, date
 import json
+import queue
+import sqlite3
+import threading
+import time
+import weakref
 import zipfile
 
+from .backup_chain import (
+    DEFAULT_CHUNK_SIZE,
+    MANIFEST_FORMAT,
+    MANIFEST_SUFFIX,
+    BackupCancelled,
+    collect_garbage,
+    store_chunks,
+    write_manifest,
+)
 from .version import __version__
 from .workspace import WorkspaceManager
 from .store import Store
 
 
+# copia a passi: BACKUP_PAGES pagine per passo, pausa tra i passi per lasciare spazio agli altri writer
+# (nel callback di progresso: il parametro sleep di Connection.backup vale solo dopo BUSY/LOCKED)
+BACKUP_PAGES = 256
+BACKUP_SLEEP_S = 0.005
+# attesa massima dei backup in corso alla chiusura dell'app
+BACKUP_EXIT_TIMEOUT_S = 60.0
+
+
 def _ts() -> str:
     return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
@@ -23,12 +45,124 @@ class BackupResult:
     path: str = ""
 
 
+def stepped_sqlite_backup(
+    db_path: Path,
+    dest_db_path: Path,
+    pages: int = BACKUP_PAGES,
+    sleep_s: float = BACKUP_SLEEP_S,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> None:
+    """Copia online di `db_path` con connessione propria, `pages` pagine per passo.
+
+    Copia uno snapshot coerente senza checkpoint FULL: in WAL gli altri
+    writer non vengono bloccati. Tra un passo e l'altro attende `sleep_s`.
+    progress(copiate, totali) gira nel thread chiamante; con `cancel`
+    impostato solleva BackupCancelled.
+    """
+    pause = max(0.0, float(sleep_s))
+    dest_db_path = Path(dest_db_path)
+    dest_db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _step(status: int, remaining: int, total: int) -> None:
+        if cancel is not None and cancel.is_set():
+            raise BackupCancelled("Backup annullato.")
+        if progress:
+            try:
+                progress(total - remaining, total)
+            except Exception:
+                pass
+        if remaining > 0 and pause > 0:
+            if cancel is not None:
+                if cancel.wait(pause):
+                    raise BackupCancelled("Backup annullato.")
+            else:
+                time.sleep(pause)
+
+    src = sqlite3.connect(str(db_path), timeout=30.0, isolation_level=None)
+    dest = sqlite3.connect(str(dest_db_path))
+    try:
+        # snapshot di lettura per tutta la copia: in WAL i writer proseguono e
+        # la copia non riparte a ogni loro commit
+        src.execute("BEGIN;")
+        src.execute("SELECT count(*) FROM sqlite_master;").fetchone()
+        src.backup(dest, pages=max(1, int(pages)), progress=_step, sleep=pause)
+    finally:
+        dest.close()
+        try:
+            src.execute("ROLLBACK;")
+        except Exception:
+            pass
+        src.close()
+
+
+class BackupJob:
+    """Backup accodato al worker di BackupManager (stato letto dal thread UI)."""
+
+    def __init__(self, reason: str, force: bool, on_done: Optional[Callable[[BackupResult], None]] = None):
+        self.reason = reason
+        self.force = force
+        self.on_done = on_done
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+        self.pages_done = 0
+        self.pages_total = 0
+        self.phase = "queued"
+        self.result: Optional[BackupResult] = None
+
+    @property
+    def done(self) -> bool:
+        return self.done_event.is_set()
+
+    @property
+    def percent(self) -> int:
+        return int(self.pages_done * 100 / self.pages_total) if self.pages_total else 0
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def wait(self, timeout_s: Optional[float] = None) -> bool:
+        return self.done_event.wait(timeout_s)
+
+
+_MANAGERS: "weakref.WeakSet[BackupManager]" = weakref.WeakSet()
+
+
+def wait_backups(timeout_s: float = BACKUP_EXIT_TIMEOUT_S) -> bool:
+    """Attende i backup in corso di tutte le workspace (anche quelle lasciate con uno switch)."""
+    deadline = time.monotonic() + max(0.0, float(timeout_s))
+    ok = True
+    for m in list(_MANAGERS):
+        ok = m.wait_idle(max(0.0, deadline - time.monotonic())) and ok
+    return ok
+
+
 class BackupManager:
-    def __init__(self, ws_mgr: WorkspaceManager, ws_id: str, store: Store, retention_total: int = 30):
+    def __init__(
+        self,
+        ws_mgr: WorkspaceManager,
+        ws_id: str,
+        store: Store,
+        retention_total: int = 30,
+        incremental: bool = True,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
         self.ws_mgr = ws_mgr
         self.ws_id = ws_id
         self.store = store
+        self.configure(retention_total, incremental, chunk_size)
+        self._q: "queue.Queue[BackupJob]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs: List[BackupJob] = []
+        self._thread: Optional[threading.Thread] = None
+        _MANAGERS.add(self)
+
+    def configure(self, retention_total: int, incremental: bool, chunk_size: int) -> None:
+        """Parametri da config workspace (anche dopo una rilettura di config.json)."""
         self.retention_total = max(1, int(retention_total))
+        # incremental: blocchi deduplicati + manifest; altrimenti zip completo
+        self.incremental = bool(incremental)
+        self.chunk_size = max(4096, int(chunk_size))
 
     def _meta(self) -> Dict:
         return self.ws_mgr.read_meta(self.ws_id)
@@ -37,17 +171,32 @@ class BackupManager:
         self.ws_mgr.write_meta(self.ws_id, meta)
 
     def backup_now(self, reason: str, force: bool = False) -> BackupResult:
+        """Backup sincrono (es. prima di una migrazione, serve l'esito subito)."""
         if not force and not self.store.dirty:
             return BackupResult(True, "Nessuna modifica: backup non necessario.")
+        self.store.clear_dirty()
+        res = self._write_backup(reason)
+        if not res.ok:
+            self.store.dirty = True
+        return res
 
+    def _write_backup(
+        self,
+        reason: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> BackupResult:
         backups_dir = self.ws_mgr.backups_dir(self.ws_id)
         backups_dir.mkdir(parents=True, exist_ok=True)
 
-        tmp_db = backups_dir / f"tmp_{_ts()}.db"
+        tmp_db = backups_dir / f"tmp_{_ts()}_{reason}.db"
         zip_path = backups_dir / f"{_ts()}_{reason}.zip"
+        out_path = backups_dir / f"{_ts()}_{reason}{MANIFEST_SUFFIX}" if self.incremental else zip_path
 
         try:
-            self.store.backup_sqlite_to(tmp_db)
+            stepped_sqlite_backup(self.store.db_path, tmp_db, progress=progress, cancel=cancel)
+            if cancel is not None and cancel.is_set():
+                raise BackupCancelled("Backup annullato.")
             cfg_path = self.ws_mgr.config_path(self.ws_id)
             manifest = {
                 "workspace_id": self.ws_id,
@@ -56,11 +205,25 @@ class BackupManager:
                 "app_version": __version__,
             }
 
-            with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
-                z.write(tmp_db, arcname="pdm.db")
-                if cfg_path.exists():
-                    z.write(cfg_path, arcname="config.json")
-                z.writestr("manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
+            if self.incremental:
+                st = store_chunks(tmp_db, backups_dir, self.chunk_size, cancel=cancel)
+                manifest.update({
+                    "format": MANIFEST_FORMAT,
+                    "chunk_size": self.chunk_size,
+                    "db_size": st.size,
+                    "db_sha256": st.sha256,
+                    "new_chunks": st.new_chunks,
+                    "new_bytes": st.new_bytes,
+                    "config": cfg_path.read_text(encoding="utf-8") if cfg_path.exists() else "",
+                    "chunks": st.hashes,
+                })
+                write_manifest(out_path, manifest)
+            else:
+                with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+                    z.write(tmp_db, arcname="pdm.db")
+                    if cfg_path.exists():
+                        z.write(cfg_path, arcname="config.json")
+                    z.writestr("manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
 
             try:
                 tmp_db.unlink(missing_ok=True)  # py3.11+
@@ -71,10 +234,14 @@ class BackupManager:
                     pass
 
             self._enforce_retention(backups_dir)
-
-            # reset dirty after successful backup
-            self.store.clear_dirty()
-            return BackupResult(True, "Backup creato.", str(zip_path))
+            return BackupResult(True, "Backup creato.", str(out_path))
+        except BackupCancelled as e:
+            for p in (tmp_db, zip_path, out_path):
+                try:
+                    p.unlink(missing_ok=True)
+                except Exception:
+                    pass
+            return BackupResult(False, str(e))
         except Exception as e:
             try:
                 tmp_db.unlink(missing_ok=True)
@@ -82,7 +249,92 @@ class BackupManager:
                 pass
             return BackupResult(False, f"Backup fallito: {e}")
 
-    def maybe_daily_backup(self) -> Optional[BackupResult]:
+    # ---- backup in background
+    def start_backup(
+        self,
+        reason: str,
+        force: bool = False,
+        on_done: Optional[Callable[[BackupResult], None]] = None,
+    ) -> Optional[BackupJob]:
+        """Accoda un backup al worker; None se non necessario (nessuna modifica).
+
+        Il flag dirty e azzerato subito (le modifiche successive finiscono nel
+        backup seguente) e ripristinato se il backup fallisce o viene annullato.
+        on_done(result) gira nel thread worker.
+        """
+        if not force and not self.store.dirty:
+            return None
+        self.store.clear_dirty()
+        job = BackupJob(reason, force, on_done)
+        with self._lock:
+            self._jobs.append(job)
+            self._q.put(job)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="pdm-backup", daemon=True)
+                self._thread.start()
+        return job
+
+    def _run(self) -> None:
+        while True:
+            try:
+                job = self._q.get(timeout=1.0)
+            except queue.Empty:
+                with self._lock:
+                    if self._q.empty():
+                        self._thread = None
+                        return
+                continue
+            if job.cancel_event.is_set():
+                job.result = BackupResult(False, "Backup annullato.")
+            else:
+                job.phase = "db"
+
+                def _progress(done: int, total: int, job: BackupJob = job) -> None:
+                    job.pages_done, job.pages_total = done, total
+
+                job.result = self._write_backup(job.reason, progress=_progress, cancel=job.cancel_event)
+            if not job.result.ok:
+                self.store.dirty = True
+            job.phase = "done"
+            if job.on_done is not None:
+                try:
+                    job.on_done(job.result)
+                except Exception:
+                    pass
+            with self._lock:
+                try:
+                    self._jobs.remove(job)
+                except ValueError:
+                    pass
+            job.done_event.set()
+
+    def active_jobs(self) -> List[BackupJob]:
+        with self._lock:
+            return list(self._jobs)
+
+    def wait_idle(self, timeout_s: float = BACKUP_EXIT_TIMEOUT_S, cancel_on_timeout: bool = True) -> bool:
+        """Attende i backup accodati (max timeout_s); allo scadere li annulla.
+
+        True se tutti i backup sono terminati entro il tempo.
+        """
+        deadline = time.monotonic() + max(0.0, float(timeout_s))
+        for job in self.active_jobs():
+            if not job.wait(max(0.0, deadline - time.monotonic())):
+                if cancel_on_timeout:
+                    for j in self.active_jobs():
+                        j.cancel()
+                    # l'annullamento interviene al passo successivo
+                    for j in self.active_jobs():
+                        j.wait(2.0)
+                return False
+        return True
+
+    def maybe_daily_backup(self, background: bool = False) -> Optional[BackupResult | BackupJob]:
+        """Backup giornaliero (se dirty e non ancora fatto oggi).
+
+        Con background=True ritorna il BackupJob accodato; la data in meta e
+        salvata solo a backup riuscito.
+        """
         meta = self._meta()
         today = date.today().isoformat()
         last = str(meta.get("last_daily_backup", ""))
@@ -90,16 +342,31 @@ class BackupManager:
             return None
         if not self.store.dirty:
             return None
+
+        def _mark(res: BackupResult) -> None:
+            if res.ok:
+                meta["last_daily_backup"] = today
+                self._save_meta(meta)
+
+        if background:
+            return self.start_backup("daily", force=True, on_done=_mark)
         res = self.backup_now("daily", force=True)
-        if res.ok:
-            meta["last_daily_backup"] = today
-            self._save_meta(meta)
+        _mark(res)
         return res
 
     def _enforce_retention(self, backups_dir: Path) -> None:
-        zips = sorted(backups_dir.glob("*.zip"), key=lambda p: p.name, reverse=True)
-        for p in zips[self.retention_total:]:
+        # zip e manifest insieme: il nome inizia col timestamp
+        items = list(backups_dir.glob("*.zip")) + list(backups_dir.glob(f"*{MANIFEST_SUFFIX}"))
+        items.sort(key=lambda p: p.name, reverse=True)
+        removed = False
+        for p in items[self.retention_total:]:
             try:
                 p.unlink()
+                removed = removed or p.name.endswith(MANIFEST_SUFFIX)
+            except Exception:
+                pass
+        if removed:
+            try:
+                collect_garbage(backups_dir)
             except Exception:
                 pass
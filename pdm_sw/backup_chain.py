@@ -0,0 +1,178 @@
+"""Backup incrementali deduplicati del database workspace.
+
+Il file DB viene diviso in blocchi di dimensione fissa, salvati (compressi)
+in backups/chunks/<xx>/<sha256>.zz una sola volta; ogni backup e un piccolo
+manifest JSON con l'elenco ordinato degli hash. Il ripristino riassembla il
+DB di qualsiasi backup; la retention elimina i manifest vecchi e i blocchi
+non piu referenziati.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+CHUNKS_DIR = "chunks"
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_FORMAT = "pdm-chunked-v1"
+DEFAULT_CHUNK_SIZE = 256 * 1024
+# blocchi toccati da meno di cosi possono appartenere a un backup in scrittura
+GC_GRACE_S = 3600
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+@dataclass
+class ChunkStats:
+    chunks: int = 0
+    new_chunks: int = 0
+    new_bytes: int = 0
+    size: int = 0
+    sha256: str = ""
+    hashes: List[str] = field(default_factory=list)
+
+
+def chunk_path(backups_dir: Path, digest: str) -> Path:
+    return Path(backups_dir) / CHUNKS_DIR / digest[:2] / f"{digest}.zz"
+
+
+def store_chunks(
+    src: Path,
+    backups_dir: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    cancel: Optional[threading.Event] = None,
+) -> ChunkStats:
+    """Salva i blocchi di `src` non ancora presenti; ritorna hash e statistiche."""
+    st = ChunkStats()
+    size = max(4096, int(chunk_size))
+    total = hashlib.sha256()
+    with Path(src).open("rb") as f:
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise BackupCancelled("Backup annullato.")
+            data = f.read(size)
+            if not data:
+                break
+            total.update(data)
+            st.size += len(data)
+            digest = hashlib.sha256(data).hexdigest()
+            st.hashes.append(digest)
+            st.chunks += 1
+            p = chunk_path(backups_dir, digest)
+            if p.exists():
+                # mtime aggiornato: la GC non tocca blocchi riusati da un backup in corso
+                try:
+                    os.utime(p, None)
+                except OSError:
+                    pass
+                continue
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(zlib.compress(data, 6))
+            os.replace(tmp, p)
+            st.new_chunks += 1
+            st.new_bytes += len(data)
+    st.sha256 = total.hexdigest()
+    return st
+
+
+def write_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def read_manifest(path: Path) -> Dict[str, Any]:
+    m = json.loads(Path(path).read_text(encoding="utf-8"))
+    if m.get("format") != MANIFEST_FORMAT:
+        raise ValueError(f"Formato manifest non supportato: {m.get('format')}")
+    return m
+
+
+def list_manifests(backups_dir: Path) -> List[Path]:
+    """Manifest dal piu recente (nome = timestamp)."""
+    d = Path(backups_dir)
+    if not d.is_dir():
+        return []
+    return sorted(d.glob(f"*{MANIFEST_SUFFIX}"), key=lambda p: p.name, reverse=True)
+
+
+def iter_chunks(backups_dir: Path, manifest: Dict[str, Any]) -> Iterator[bytes]:
+    """Blocchi del DB in ordine, verificati contro il proprio hash."""
+    for digest in manifest.get("chunks", []):
+        p = chunk_path(backups_dir, digest)
+        if not p.is_file():
+            raise FileNotFoundError(f"Blocco mancante: {p.name}")
+        data = zlib.decompress(p.read_bytes())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Blocco corrotto: {p.name}")
+        yield data
+
+
+def restore_db(manifest_path: Path, dest_db_path: Path) -> Dict[str, Any]:
+    """Riassembla il DB del manifest in `dest_db_path` (mai sovrascritto).
+
+    Ritorna il manifest; ValueError/FileNotFoundError se blocchi o hash
+    complessivo non tornano.
+    """
+    manifest_path = Path(manifest_path)
+    dest_db_path = Path(dest_db_path)
+    if dest_db_path.exists():
+        raise FileExistsError(f"Destinazione gia presente: {dest_db_path}")
+    m = read_manifest(manifest_path)
+    dest_db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest_db_path.with_name(dest_db_path.name + ".part")
+    h = hashlib.sha256()
+    try:
+        with tmp.open("wb") as f:
+            for data in iter_chunks(manifest_path.parent, m):
+                h.update(data)
+                f.write(data)
+        if h.hexdigest() != m.get("db_sha256") or tmp.stat().st_size != int(m.get("db_size", -1)):
+            raise ValueError("DB ripristinato non corrisponde al manifest.")
+        os.replace(tmp, dest_db_path)
+    finally:
+        try:
+            tmp.unlink(missing_ok=True)
+        except Exception:
+            pass
+    return m
+
+
+def collect_garbage(backups_dir: Path, grace_s: int = GC_GRACE_S) -> int:
+    """Elimina i blocchi non referenziati da alcun manifest; ritorna quanti."""
+    root = Path(backups_dir) / CHUNKS_DIR
+    if not root.is_dir():
+        return 0
+    used = set()
+    for p in list_manifests(backups_dir):
+        try:
+            used.update(read_manifest(p).get("chunks", []))
+        except Exception:
+            # manifest illeggibile: meglio non eliminare nulla
+            return 0
+    limit = time.time() - max(0, int(grace_s))
+    removed = 0
+    for sub in root.iterdir():
+        if not sub.is_dir():
+            continue
+        for p in sub.glob("*.zz"):
+            if p.stem in used:
+                continue
+            try:
+                if p.stat().st_mtime > limit:
+                    continue
+                p.unlink()
+                removed += 1
+            except OSError:
+                pass
+    return removed
@@ -0,0 +1,332 @@
+"""Elenco, verifica e ripristino dei backup workspace (zip e manifest a blocchi).
+
+La verifica estrae il DB di ogni backup in una cartella temporanea e, su un
+pool di worker, esegue PRAGMA integrity_check e conta le righe per tabella.
+Il ripristino crea una nuova workspace (WorkspaceManager.create) con DB e
+configurazione del backup scelto; la workspace corrente non viene toccata.
+
+Uso CLI:
+    python -m pdm_sw.backup_verify <ws_dir> [--workers 4]
+    python -m pdm_sw.backup_verify <ws_dir> --restore <file backup> --name NOME
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .backup_chain import MANIFEST_SUFFIX, read_manifest, restore_db
+from .workspace import Workspace, WorkspaceManager
+
+REPORT_FIELDS = ["status", "backup", "kind", "created_at", "reason", "user_version", "tables", "rows", "detail"]
+
+
+@dataclass
+class BackupInfo:
+    path: str
+    kind: str  # ZIP | CHUNKED
+    created_at: str = ""
+    reason: str = ""
+    workspace_id: str = ""
+    app_version: str = ""
+    size_bytes: int = 0
+    db_size: int = 0
+    error: str = ""
+
+    @property
+    def name(self) -> str:
+        return Path(self.path).name
+
+
+@dataclass
+class BackupCheck:
+    backup: BackupInfo
+    status: str = "OK"  # OK | CORRUPT | ERROR
+    user_version: int = 0
+    table_rows: Dict[str, int] = field(default_factory=dict)
+    detail: str = ""
+    elapsed_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "OK"
+
+
+@dataclass
+class VerifyReport:
+    checks: List[BackupCheck] = field(default_factory=list)
+    report_path: str = ""
+    elapsed_s: float = 0.0
+
+    @property
+    def failed(self) -> List[BackupCheck]:
+        return [c for c in self.checks if not c.ok]
+
+
+def _read_info(p: Path) -> BackupInfo:
+    info = BackupInfo(path=str(p), kind="CHUNKED" if p.name.endswith(MANIFEST_SUFFIX) else "ZIP")
+    try:
+        info.size_bytes = p.stat().st_size
+        if info.kind == "ZIP":
+            with zipfile.ZipFile(p) as z:
+                names = set(z.namelist())
+                m = json.loads(z.read("manifest.json").decode("utf-8")) if "manifest.json" in names else {}
+                if "pdm.db" in names:
+                    info.db_size = int(z.getinfo("pdm.db").file_size)
+        else:
+            m = read_manifest(p)
+            info.db_size = int(m.get("db_size", 0))
+        info.created_at = str(m.get("created_at", ""))
+        info.reason = str(m.get("reason", ""))
+        info.workspace_id = str(m.get("workspace_id", ""))
+        info.app_version = str(m.get("app_version", ""))
+    except Exception as e:
+        info.error = f"{type(e).__name__}: {e}"
+    return info
+
+
+def list_backups(backups_dir: str | Path) -> List[BackupInfo]:
+    """Backup della cartella (zip e manifest), dal piu recente."""
+    d = Path(backups_dir)
+    if not d.is_dir():
+        return []
+    items = list(d.glob("*.zip")) + list(d.glob(f"*{MANIFEST_SUFFIX}"))
+    items.sort(key=lambda p: p.name, reverse=True)
+    return [_read_info(p) for p in items]
+
+
+def extract_backup(info: BackupInfo, dest_db: str | Path) -> Optional[str]:
+    """Scrive il DB del backup in `dest_db`; ritorna config.json del backup (se presente)."""
+    dest_db = Path(dest_db)
+    if info.kind == "CHUNKED":
+        return str(restore_db(Path(info.path), dest_db).get("config", "") or "") or None
+    if dest_db.exists():
+        raise FileExistsError(f"Destinazione gia presente: {dest_db}")
+    dest_db.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(info.path) as z:
+        with z.open("pdm.db") as src, dest_db.open("wb") as out:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+        if "config.json" in z.namelist():
+            return z.read("config.json").decode("utf-8")
+    return None
+
+
+def check_db(db_path: str | Path) -> BackupCheck:
+    """integrity_check + righe per tabella (tabelle virtuali escluse) su un DB estratto.
+
+    Il DB e una copia privata: aperto in scrittura, alla chiusura SQLite
+    rimuove -wal/-shm (in sola lettura resterebbero accanto al file).
+    """
+    chk = BackupCheck(backup=BackupInfo(path=str(db_path), kind="DB"))
+    conn = sqlite3.connect(str(db_path))
+    try:
+        res = [str(r[0]) for r in conn.execute("PRAGMA integrity_check;").fetchall()]
+        if res != ["ok"]:
+            chk.status = "CORRUPT"
+            chk.detail = "; ".join(res[:5])
+        chk.user_version = int(conn.execute("PRAGMA user_version;").fetchone()[0])
+        tables = [
+            str(r[0]) for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+                "AND sql NOT LIKE 'CREATE VIRTUAL%' ORDER BY name;"
+            ).fetchall()
+        ]
+        for t in tables:
+            try:
+                chk.table_rows[t] = int(conn.execute(f'SELECT count(*) FROM "{t}";').fetchone()[0])
+            except sqlite3.DatabaseError as e:
+                # tabelle ombra FTS senza modulo: non sono dati del PDM
+                chk.table_rows[t] = -1
+                if chk.status == "OK" and not t.startswith("documents_fts"):
+                    chk.status = "CORRUPT"
+                    chk.detail = f"{t}: {e}"
+    finally:
+        conn.close()
+    return chk
+
+
+def verify_backup(info: BackupInfo, tmp_dir: str | Path | None = None) -> BackupCheck:
+    t0 = time.perf_counter()
+    chk = BackupCheck(backup=info)
+    try:
+        if info.error:
+            raise ValueError(info.error)
+        with tempfile.TemporaryDirectory(prefix="pdm_bkchk_", dir=str(tmp_dir) if tmp_dir else None) as td:
+            db = Path(td) / "pdm.db"
+            extract_backup(info, db)
+            res = check_db(db)
+        chk.status, chk.user_version, chk.table_rows, chk.detail = res.status, res.user_version, res.table_rows, res.detail
+    except Exception as e:
+        chk.status = "ERROR"
+        chk.detail = f"{type(e).__name__}: {e}"
+    chk.elapsed_s = round(time.perf_counter() - t0, 3)
+    return chk
+
+
+def verify_backups(
+    backups: List[BackupInfo],
+    workers: int = 4,
+    report_dir: str | Path | None = None,
+    tmp_dir: str | Path | None = None,
+    progress: Optional[Callable[[int, int, BackupCheck], None]] = None,
+) -> VerifyReport:
+    """Verifica parallela; progress(i, totale, check) gira nel thread chiamante.
+
+    Con report_dir scrive <report_dir>/backup_verify_<ts>.csv (una riga per backup).
+    """
+    t0 = time.perf_counter()
+    rep = VerifyReport()
+    with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="pdm-bk-verify") as pool:
+        for i, chk in enumerate(pool.map(lambda b: verify_backup(b, tmp_dir), backups), start=1):
+            rep.checks.append(chk)
+            if progress:
+                try:
+                    progress(i, len(backups), chk)
+                except Exception:
+                    pass
+
+    if report_dir is not None:
+        out_dir = Path(report_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"backup_verify_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        with path.open("w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=REPORT_FIELDS, delimiter=";")
+            w.writeheader()
+            for c in rep.checks:
+                w.writerow({
+                    "status": c.status, "backup": c.backup.name, "kind": c.backup.kind,
+                    "created_at": c.backup.created_at, "reason": c.backup.reason,
+                    "user_version": c.user_version, "tables": len(c.table_rows),
+                    "rows": sum(n for n in c.table_rows.values() if n > 0), "detail": c.detail,
+                })
+        rep.report_path = str(path)
+    rep.elapsed_s = round(time.perf_counter() - t0, 3)
+    return rep
+
+
+def detach_restored_db(db_path: str | Path) -> Dict[str, int]:
+    """Neutralizza nel DB ripristinato lo stato legato alle sessioni del backup.
+
+    Le transizioni workflow aperte (PENDING/FILES_DONE) contengono percorsi
+    assoluti dell'archivio: all'apertura il ripristino le completerebbe o
+    annullerebbe sull'archivio attuale. Vengono marcate ABANDONED; i lock
+    documento (sessioni non piu esistenti) vengono eliminati.
+    """
+    out = {"intents": 0, "locks": 0}
+    conn = sqlite3.connect(str(db_path))
+    try:
+        tables = {str(r[0]) for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()}
+        with conn:
+            if "wf_intents" in tables:
+                out["intents"] = conn.execute(
+                    "UPDATE wf_intents SET status='ABANDONED', updated_at=? WHERE status IN ('PENDING', 'FILES_DONE');",
+                    (datetime.now().isoformat(timespec="seconds"),),
+                ).rowcount
+            if "document_locks" in tables:
+                out["locks"] = conn.execute("DELETE FROM document_locks;").rowcount
+    finally:
+        conn.close()
+    return out
+
+
+def stage_restore(info: BackupInfo, staging_dir: str | Path) -> tuple[Path, Optional[str]]:
+    """Estrae, verifica e separa (detach_restored_db) il DB del backup in `staging_dir`.
+
+    Fase lenta, thread worker.
+
+    Ritorna (db estratto, config.json del backup); ValueError se il DB e corrotto.
+    """
+    staging_dir = Path(staging_dir)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    db = staging_dir / f"_restore_{uuid.uuid4().hex[:8]}.db"
+    try:
+        cfg_text = extract_backup(info, db)
+        chk = check_db(db)
+        if not chk.ok:
+            raise ValueError(f"Backup non integro: {chk.detail}")
+        detach_restored_db(db)
+    except Exception:
+        try:
+            db.unlink(missing_ok=True)
+        except Exception:
+            pass
+        raise
+    return db, cfg_text
+
+
+def install_restore(
+    ws_mgr: WorkspaceManager,
+    staged_db: str | Path,
+    cfg_text: Optional[str],
+    name: str,
+    description: str = "",
+) -> Workspace:
+    """Crea la workspace e vi sposta il DB preparato da stage_restore (fase rapida)."""
+    ws = ws_mgr.create(name, description)
+    ws_dir = ws_mgr.workspace_dir(ws.id)
+    os.replace(str(staged_db), str(ws_dir / "pdm.db"))
+    if cfg_text:
+        (ws_dir / "config.json").write_text(cfg_text, encoding="utf-8")
+    return ws
+
+
+def restore_to_workspace(ws_mgr: WorkspaceManager, info: BackupInfo, name: str, description: str = "") -> Workspace:
+    staged, cfg_text = stage_restore(info, ws_mgr.base_dir)
+    try:
+        return install_restore(ws_mgr, staged, cfg_text, name, description)
+    finally:
+        try:
+            Path(staged).unlink(missing_ok=True)
+        except Exception:
+            pass
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Verifica e ripristino dei backup workspace.")
+    ap.add_argument("ws_dir", help="cartella workspace (contiene backups/)")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--report-dir", default="", help="default: <ws_dir>/REPORTS")
+    ap.add_argument("--restore", default="", help="file backup da ripristinare in una nuova workspace")
+    ap.add_argument("--name", default="", help="nome della workspace ripristinata")
+    a = ap.parse_args(list(argv) if argv is not None else None)
+
+    ws_dir = Path(a.ws_dir)
+    backups = list_backups(ws_dir / "backups")
+    if a.restore:
+        pick = [b for b in backups if b.name == Path(a.restore).name]
+        if not pick:
+            print(f"Backup non trovato: {a.restore}")
+            return 2
+        ws = restore_to_workspace(
+            WorkspaceManager(ws_dir.parent), pick[0],
+            a.name or f"Ripristino {pick[0].created_at[:10]}", f"Ripristino di {pick[0].name}",
+        )
+        print(f"Workspace creata: {ws.name} ({ws.id})")
+        return 0
+
+    rep = verify_backups(
+        backups, workers=a.workers,
+        report_dir=Path(a.report_dir) if a.report_dir else ws_dir / "REPORTS",
+    )
+    print(f"Backup verificati: {len(rep.checks)} | {rep.elapsed_s} s")
+    for c in rep.checks:
+        rows = sum(n for n in c.table_rows.values() if n > 0)
+        print(f"{c.status:<8}{c.backup.name} | v{c.user_version} | tabelle {len(c.table_rows)} righe {rows} {c.detail}")
+    print(f"Report: {rep.report_path}")
+    return 0 if not rep.failed else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1 @@
+"""Benchmark interni (non usati dall'app): `python -m pdm_sw.bench` e `python -m pdm_sw.bench.<modulo>`."""
@@ -0,0 +1,125 @@
+"""Benchmark Store su workspace sintetico.
+
+Uso:
+    python -m pdm_sw.bench --documents 50000 --save baseline.json
+    python -m pdm_sw.bench --documents 50000 --compare baseline.json
+    python -m pdm_sw.bench --scenarios search_documents,allocate_seq
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .scenarios import SCENARIOS, Sample
+from .synthetic import SyntheticSpec, generate_workspace
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round((pct / 100.0) * (len(s) - 1)))))
+    return s[k]
+
+
+def summarize(samples: List[Sample]) -> Dict[str, Any]:
+    times = [t for t, _ in samples]
+    total_t = sum(times)
+    total_rows = sum(r for _, r in samples)
+    return {
+        "ops": len(samples),
+        "median_ms": round(statistics.median(times) * 1000.0, 3) if times else 0.0,
+        "p95_ms": round(_percentile(times, 95) * 1000.0, 3),
+        "rows": total_rows,
+        "rows_per_s": round(total_rows / total_t, 1) if total_t > 0 else 0.0,
+    }
+
+
+def run(spec: SyntheticSpec, names: List[str], repeat: int, db_path: Optional[Path] = None) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="pdm_bench_") as tmp:
+        db = Path(db_path) if db_path else Path(tmp) / "pdm.db"
+        t0 = time.perf_counter()
+        counts = generate_workspace(db, spec) if not db.exists() else {}
+        gen_s = time.perf_counter() - t0
+        results: Dict[str, Any] = {}
+        for name in names:
+            results[name] = summarize(SCENARIOS[name](db, repeat))
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "spec": spec.to_dict(),
+        "repeat": repeat,
+        "generate_s": round(gen_s, 3),
+        "counts": counts,
+        "results": results,
+    }
+
+
+def format_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    lines = [
+        f"PDM-SW bench {report['created_at']} | python {report['python']} | sqlite {report['sqlite']}",
+        f"spec: {report['spec']} | generazione {report['generate_s']} s",
+        f"{'scenario':<24}{'ops':>6}{'median ms':>12}{'p95 ms':>12}{'rows/s':>14}" + ("   vs baseline" if baseline else ""),
+    ]
+    base_res = (baseline or {}).get("results", {})
+    for name, r in report["results"].items():
+        line = f"{name:<24}{r['ops']:>6}{r['median_ms']:>12.3f}{r['p95_ms']:>12.3f}{r['rows_per_s']:>14.1f}"
+        b = base_res.get(name)
+        if b and b.get("median_ms"):
+            delta = (r["median_ms"] - b["median_ms"]) / b["median_ms"] * 100.0
+            line += f"   median {delta:+.1f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    d = SyntheticSpec()
+    ap.add_argument("--machines", type=int, default=d.machines)
+    ap.add_argument("--groups-per-machine", type=int, default=d.groups_per_machine)
+    ap.add_argument("--documents", type=int, default=d.documents)
+    ap.add_argument("--props-per-doc", type=int, default=d.props_per_doc)
+    ap.add_argument("--notes-per-doc", type=float, default=d.notes_per_doc)
+    ap.add_argument("--activity", type=int, default=d.activity)
+    ap.add_argument("--seed", type=int, default=d.seed)
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help="elenco separato da virgole")
+    ap.add_argument("--db", default="", help="DB da riusare/creare (default: temporaneo)")
+    ap.add_argument("--save", default="", help="salva il report JSON (baseline)")
+    ap.add_argument("--compare", default="", help="confronta con un report JSON salvato")
+    a = ap.parse_args()
+
+    names = [n.strip() for n in a.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        ap.error(f"scenari sconosciuti: {', '.join(unknown)} (disponibili: {', '.join(SCENARIOS)})")
+
+    spec = SyntheticSpec(
+        machines=a.machines,
+        groups_per_machine=a.groups_per_machine,
+        documents=a.documents,
+        props_per_doc=a.props_per_doc,
+        notes_per_doc=a.notes_per_doc,
+        activity=a.activity,
+        seed=a.seed,
+    )
+    report = run(spec, names, max(1, a.repeat), Path(a.db) if a.db else None)
+    baseline = json.loads(Path(a.compare).read_text(encoding="utf-8")) if a.compare else None
+    print(format_report(report, baseline))
+    if a.save:
+        Path(a.save).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Report salvato: {a.save}")
+
+
+if __name__ == "__main__":
+    main()
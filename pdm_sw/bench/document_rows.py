@@ -0,0 +1,97 @@
+"""Benchmark Store.list_documents: sqlite3.Row + Document vs DocumentRow.
+
+Uso:
+    python -m pdm_sw.bench.document_rows --rows 100000 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from ..models import Document
+from ..store import Store
+from .synthetic import SyntheticSpec, generate_workspace
+
+
+def _legacy_row_to_doc(r: sqlite3.Row) -> Document:
+    # Conversione com'era prima di DocumentRow (r.keys() ripetuto per riga)
+    return Document(
+        id=int(r["id"]),
+        code=str(r["code"]),
+        doc_type=str(r["doc_type"]),
+        mmm=str(r["mmm"]),
+        gggg=str(r["gggg"]),
+        seq=int(r["seq"]),
+        vvv=str(r["vvv"] or ""),
+        revision=int(r["revision"]),
+        state=str(r["state"]),
+        obs_prev_state=str(r["obs_prev_state"] if "obs_prev_state" in r.keys() else ""),
+        description=str(r["description"] or ""),
+        checked_out=(int(r["checked_out"] or 0) != 0) if "checked_out" in r.keys() else False,
+        checkout_owner_user=str(r["checkout_owner_user"] if "checkout_owner_user" in r.keys() else ""),
+        checkout_owner_host=str(r["checkout_owner_host"] if "checkout_owner_host" in r.keys() else ""),
+        checkout_at=str(r["checkout_at"] if "checkout_at" in r.keys() else ""),
+        file_wip_path=str(r["file_wip_path"] or ""),
+        file_rel_path=str(r["file_rel_path"] or ""),
+        file_inrev_path=str(r["file_inrev_path"] or ""),
+        file_wip_drw_path=str(r["file_wip_drw_path"] or ""),
+        file_rel_drw_path=str(r["file_rel_drw_path"] or ""),
+        file_inrev_drw_path=str(r["file_inrev_drw_path"] or ""),
+        created_at=str(r["created_at"]),
+        updated_at=str(r["updated_at"]),
+    )
+
+
+def _timed(fn: Callable[[], int], repeat: int) -> List[float]:
+    out = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def run(rows: int = 100000, repeat: int = 5) -> None:
+    with tempfile.TemporaryDirectory(prefix="pdm_bench_") as tmp:
+        db = Path(tmp) / "pdm.db"
+        generate_workspace(db, SyntheticSpec(documents=rows, props_per_doc=0, notes_per_doc=0, activity=0))
+        store = Store(db)
+        try:
+
+            def legacy() -> int:
+                cur = store.conn.execute("SELECT * FROM documents ORDER BY updated_at DESC, id DESC;")
+                return len([_legacy_row_to_doc(r) for r in cur.fetchall()])
+
+            def current() -> int:
+                return len(store.list_documents(include_obs=True))
+
+            assert legacy() == current() == rows
+            print(f"list_documents(include_obs=True), {rows} righe, {repeat} ripetizioni")
+            base_med = 0.0
+            for label, fn in (("sqlite3.Row + Document", legacy), ("DocumentRow", current)):
+                t = _timed(fn, repeat)
+                med = statistics.median(t)
+                base_med = base_med or med
+                print(
+                    f"  {label:<24} mediana {med * 1000:8.1f} ms  min {min(t) * 1000:8.1f} ms"
+                    f"  {rows / med:10.0f} righe/s  x{base_med / med:.2f}"
+                )
+        finally:
+            store.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--repeat", type=int, default=5)
+    a = ap.parse_args()
+    run(rows=a.rows, repeat=a.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Scenari temporizzati su Store (vedi `python -m pdm_sw.bench`).
+
+Ogni scenario riceve il percorso del DB sintetico e ritorna una lista di
+campioni (secondi, righe elaborate): uno per operazione misurata.
+"""
+from __future__ import annotations
+
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from ..store import Store
+from .synthetic import PROP_NAMES
+
+Sample = Tuple[float, int]
+Scenario = Callable[[Path, int], List[Sample]]
+
+
+def _timed(fn: Callable[[], int]) -> Sample:
+    t0 = time.perf_counter()
+    rows = fn()
+    return time.perf_counter() - t0, int(rows)
+
+
+def _pairs(store: Store) -> List[Tuple[str, str]]:
+    return [
+        (str(r["mmm"]), str(r["gggg"]))
+        for r in store.conn.execute("SELECT mmm, gggg FROM groups ORDER BY mmm, gggg;").fetchall()
+    ]
+
+
+def bench_allocate_seq(db_path: Path, repeat: int) -> List[Sample]:
+    store = Store(db_path)
+    try:
+        pairs = _pairs(store) or [("999", "9999")]
+        out = []
+        for i in range(repeat * 20):
+            mmm, gggg = pairs[i % len(pairs)]
+            out.append(_timed(lambda: (store.allocate_seq(mmm, gggg, "", "PART"), 1)[1]))
+        return out
+    finally:
+        store.close()
+
+
+def bench_search_documents(db_path: Path, repeat: int) -> List[Sample]:
+    store = Store(db_path)
+    try:
+        pairs = _pairs(store) or [("", "")]
+        rnd = random.Random(1)
+        out = []
+        for _ in range(repeat):
+            mmm, gggg = rnd.choice(pairs)
+            for kw in (
+                {},
+                {"query": "PIASTRA"},
+                {"query": "PIAS TEL"},
+                {"mmm": mmm},
+                {"mmm": mmm, "gggg": gggg, "state": "REL"},
+                {"doc_type": "ASSY", "include_obs": True},
+            ):
+                out.append(_timed(lambda: len(store.search_documents(**kw))))
+        return out
+    finally:
+        store.close()
+
+
+def bench_get_custom_values_bulk(db_path: Path, repeat: int) -> List[Sample]:
+    store = Store(db_path)
+    try:
+        codes = [str(r[0]) for r in store.conn.execute("SELECT code FROM documents ORDER BY id LIMIT 5000;").fetchall()]
+        out = []
+        for _ in range(repeat):
+            for n in (500, 5000):
+                sub = codes[:n]
+                out.append(_timed(lambda: sum(len(v) for v in store.get_custom_values_bulk(sub, list(PROP_NAMES)).values())))
+        return out
+    finally:
+        store.close()
+
+
+def bench_list_recent_activity(db_path: Path, repeat: int) -> List[Sample]:
+    store = Store(db_path)
+    try:
+        out = []
+        for _ in range(repeat):
+            for n in (200, 2000):
+                out.append(_timed(lambda: len(store.list_recent_activity(limit=n))))
+        return out
+    finally:
+        store.close()
+
+
+def bench_lock_contention(db_path: Path, repeat: int, workers: int = 4) -> List[Sample]:
+    """Piu sessioni (thread con connessione propria) contendono gli stessi lock."""
+    probe = Store(db_path)
+    try:
+        codes = [str(r[0]) for r in probe.conn.execute("SELECT code FROM documents ORDER BY id LIMIT 8;").fetchall()]
+    finally:
+        probe.close()
+    codes = codes or ["BENCH-LOCK"]
+    out: List[Sample] = []
+    out_lock = threading.Lock()
+
+    def worker(k: int) -> None:
+        store = Store(db_path)
+        sess = f"bench-lock-{k}"
+        rnd = random.Random(k)
+        local: List[Sample] = []
+        try:
+            for _ in range(repeat * 10):
+                code = rnd.choice(codes)
+                t0 = time.perf_counter()
+                ok, _status, _holder = store.acquire_document_lock(code, sess, "bench", "BENCH-HOST", ttl_seconds=60)
+                if ok:
+                    store.release_document_lock(code, sess)
+                local.append((time.perf_counter() - t0, 1))
+        finally:
+            store.release_session_locks(sess)
+            store.close()
+        with out_lock:
+            out.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(max(1, workers))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+
+def bench_backup_sqlite_to(db_path: Path, repeat: int) -> List[Sample]:
+    store = Store(db_path)
+    try:
+        rows = int(store.conn.execute("SELECT COUNT(*) FROM documents;").fetchone()[0])
+        out = []
+        with tempfile.TemporaryDirectory(prefix="pdm_bench_bk_") as tmp:
+            for i in range(max(1, repeat // 2)):
+                dest = Path(tmp) / f"backup_{i}.db"
+                out.append(_timed(lambda: (store.backup_sqlite_to(dest), rows)[1]))
+                dest.unlink()
+        return out
+    finally:
+        store.close()
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "allocate_seq": bench_allocate_seq,
+    "search_documents": bench_search_documents,
+    "get_custom_values_bulk": bench_get_custom_values_bulk,
+    "list_recent_activity": bench_list_recent_activity,
+    "lock_contention": bench_lock_contention,
+    "backup_sqlite_to": bench_backup_sqlite_to,
+}
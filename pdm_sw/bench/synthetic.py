@@ -0,0 +1,150 @@
+"""Generatore di workspace sintetici per i benchmark.
+
+Crea un DB con macchine, gruppi, documenti, valori custom, note di stato e
+activity log in quantita configurabili, con inserimenti executemany in
+un'unica transazione.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from ..store import ACTIVITY_INSERT_SQL, Store
+
+STATES = ("WIP", "REL", "IN_REV", "OBS")
+PROP_NAMES = ("MATERIALE", "TRATTAMENTO", "FORNITORE", "PESO", "NOTE")
+WORDS = (
+    "PIASTRA", "TELAIO", "STAFFA", "PERNO", "BOCCOLA", "SUPPORTO", "CARTER",
+    "ALBERO", "FLANGIA", "RULLO", "GUIDA", "MOTORE", "RIDUTTORE", "PANNELLO",
+)
+MATERIALS = ("S235JR", "C45", "AISI304", "AL6082", "POM", "PA6")
+
+
+@dataclass
+class SyntheticSpec:
+    machines: int = 20
+    groups_per_machine: int = 10
+    documents: int = 20000
+    props_per_doc: int = 3
+    notes_per_doc: float = 0.5
+    activity: int = 50000
+    seed: int = 42
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _pairs(spec: SyntheticSpec) -> List[Tuple[str, str]]:
+    return [
+        (f"{m:03d}", f"{g + 1:04d}")
+        for m in range(1, max(1, spec.machines) + 1)
+        for g in range(max(1, spec.groups_per_machine))
+    ]
+
+
+def generate_workspace(db_path: Path, spec: SyntheticSpec) -> Dict[str, int]:
+    """Popola db_path (nuovo o vuoto) secondo spec; ritorna i conteggi righe."""
+    rnd = random.Random(spec.seed)
+    store = Store(Path(db_path))
+    try:
+        pairs = _pairs(spec)
+        base_time = datetime(2025, 1, 1, 8, 0, 0)
+        counts = {"machines": 0, "groups": 0, "documents": 0, "custom_values": 0, "state_notes": 0, "activity": 0}
+
+        machines = sorted({m for m, _ in pairs})
+        groups = [(m, g, f"GRUPPO {m}/{g}", base_time.isoformat()) for m, g in pairs]
+        next_seq: Dict[Tuple[str, str], List[int]] = {p: [1, 9999] for p in pairs}
+
+        docs: List[Tuple[Any, ...]] = []
+        custom: List[Tuple[str, str, str, str]] = []
+        notes: List[Tuple[Any, ...]] = []
+        for i in range(max(0, spec.documents)):
+            mmm, gggg = pairs[i % len(pairs)]
+            counters = next_seq[(mmm, gggg)]
+            is_assy = rnd.random() < 0.2
+            if is_assy:
+                seq = counters[1]
+                counters[1] -= 1
+            else:
+                seq = counters[0]
+                counters[0] += 1
+            code = f"{mmm}_{gggg}-{seq:04d}"
+            state = STATES[rnd.randrange(len(STATES))]
+            rev = rnd.randrange(0, 6) if state != "WIP" else 0
+            ts = (base_time + timedelta(minutes=i)).isoformat(timespec="seconds")
+            base = f"C:/ARCHIVIO/{mmm}/{gggg}/{code}"
+            ext = ".SLDASM" if is_assy else ".SLDPRT"
+            desc = f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {i}"
+            docs.append((
+                code, "ASSY" if is_assy else "PART", mmm, gggg, seq, "", rev, state, desc,
+                base + ext, base + ext if state != "WIP" else "", "",
+                base + ".SLDDRW", base + ".SLDDRW" if state != "WIP" else "", "",
+                ts, ts,
+            ))
+            for p in PROP_NAMES[: max(0, spec.props_per_doc)]:
+                val = rnd.choice(MATERIALS) if p == "MATERIALE" else f"{p[:3]}-{rnd.randrange(1000)}"
+                custom.append((code, p, val, ts))
+            n_notes = int(spec.notes_per_doc) + (1 if rnd.random() < (spec.notes_per_doc % 1) else 0)
+            for k in range(n_notes):
+                notes.append((code, ts, "RELEASE", "WIP", "REL", f"Nota sintetica {k}", max(0, rev - 1), rev))
+
+        sessions = [f"bench-session-{k}" for k in range(8)]
+        actions = ("WF_RELEASE", "WF_APPROVE", "CODE_CREATE", "OPEN_MODEL", "CHECKOUT", "CHECKIN")
+        activity = []
+        for i in range(max(0, spec.activity)):
+            ts = (base_time + timedelta(seconds=i * 7)).isoformat(timespec="seconds")
+            code = docs[rnd.randrange(len(docs))][0] if docs else ""
+            row = Store.activity_row(
+                "BENCH", rnd.choice(sessions), "bench", "Bench User", "BENCH-HOST", rnd.choice(actions),
+                code=code, status="OK", message="evento sintetico", details={"i": i},
+            )
+            activity.append((ts,) + tuple(row[1:]))  # created_at sintetico
+
+        with store.transaction():
+            c = store.conn
+            c.executemany(
+                "INSERT OR REPLACE INTO machines(mmm, name, created_at) VALUES(?, ?, ?);",
+                [(m, f"MACCHINA {m}", base_time.isoformat()) for m in machines],
+            )
+            c.executemany("INSERT OR REPLACE INTO groups(mmm, gggg, name, created_at) VALUES(?, ?, ?, ?);", groups)
+            c.executemany(
+                "INSERT OR REPLACE INTO seq_counters(mmm, gggg, vvv, next_part, next_assy) VALUES(?, ?, '', ?, ?);",
+                [(m, g, v[0], v[1]) for (m, g), v in next_seq.items()],
+            )
+            c.executemany(
+                """
+                INSERT INTO documents(code, doc_type, mmm, gggg, seq, vvv, revision, state, description,
+                    file_wip_path, file_rel_path, file_inrev_path, file_wip_drw_path, file_rel_drw_path, file_inrev_drw_path,
+                    created_at, updated_at)
+                VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);
+                """,
+                docs,
+            )
+            c.executemany(
+                "INSERT OR REPLACE INTO doc_custom_values(code, prop_name, value, updated_at) VALUES(?, ?, ?, ?);",
+                custom,
+            )
+            c.executemany(
+                """
+                INSERT INTO document_state_notes(code, created_at, event_type, from_state, to_state, note, rev_before, rev_after)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?);
+                """,
+                notes,
+            )
+            c.executemany(ACTIVITY_INSERT_SQL, activity)
+
+        counts.update(
+            machines=len(machines),
+            groups=len(groups),
+            documents=len(docs),
+            custom_values=len(custom),
+            state_notes=len(notes),
+            activity=len(activity),
+        )
+        return counts
+    finally:
+        store.close()
+
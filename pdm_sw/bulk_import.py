@@ -0,0 +1,378 @@
+"""Import massivo documenti da CSV / JSON Lines.
+
+Ogni riga: MMM, GGGG, DOC_TYPE (PART/ASSY), DESCRIPTION, VVV opzionale; le
+altre colonne diventano valori custom (doc_custom_values) e devono essere
+proprieta custom configurate nel workspace (PDM > Proprieta). Le righe sono
+lette in streaming, validate con le regole segmenti della configurazione e
+scritte a blocchi: per ogni blocco una transazione con riserva progressivi
+(allocate_seq_range), executemany dei documenti e dei valori custom.
+
+Uso:
+    python -m pdm_sw.bulk_import <cartella_workspace> <file.csv|file.jsonl> [--dry-run]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .codegen import build_code
+from .archive import archive_dirs, drw_path, model_path
+from .config import AppConfig, ConfigManager
+from .models import Document
+from .store import Store
+
+# alias colonne (lowercase) -> campo
+_CORE_COLUMNS = {
+    "mmm": "mmm",
+    "gggg": "gggg",
+    "vvv": "vvv",
+    "doc_type": "doc_type",
+    "type": "doc_type",
+    "tipo": "doc_type",
+    "description": "description",
+    "descrizione": "description",
+}
+
+
+@dataclass
+class ImportResult:
+    ok: bool
+    dry_run: bool
+    read: int = 0
+    imported: int = 0
+    rejected: int = 0
+    custom_values: int = 0
+    elapsed_s: float = 0.0
+    rejects_path: str = ""
+    message: str = ""
+    first_codes: List[str] = field(default_factory=list)
+
+    @property
+    def rows_per_s(self) -> float:
+        return (self.read / self.elapsed_s) if self.elapsed_s > 0 else 0.0
+
+
+@dataclass
+class _ImportRow:
+    line: int
+    raw: Dict[str, Any]
+    mmm: str
+    gggg: str
+    vvv: str
+    doc_type: str
+    description: str
+    props: Dict[str, str]
+
+
+def iter_source_rows(path: Path) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Righe (numero riga, dict) da CSV (separatore ; o , rilevato) o JSONL."""
+    p = Path(path)
+    if p.suffix.lower() in (".jsonl", ".ndjson", ".json"):
+        with p.open("r", encoding="utf-8-sig") as f:
+            for n, line in enumerate(f, start=1):
+                s = line.strip()
+                if not s:
+                    continue
+                try:
+                    obj = json.loads(s)
+                except Exception as e:
+                    yield n, {"__error__": f"JSON non valido: {e}", "__raw__": s}
+                    continue
+                yield n, obj if isinstance(obj, dict) else {"__error__": "Riga JSON non e un oggetto", "__raw__": s}
+        return
+    with p.open("r", encoding="utf-8-sig", newline="") as f:
+        head = f.readline()
+        delim = ";" if head.count(";") > head.count(",") else ","
+        f.seek(0)
+        reader = csv.DictReader(f, delimiter=delim)
+        for n, rec in enumerate(reader, start=2):
+            yield n, {str(k or "").strip(): v for k, v in rec.items() if k is not None}
+
+
+def _prop_name(name: str) -> str:
+    n = (name or "").strip().upper().replace(" ", "_")
+    return "".join(ch for ch in n if (ch.isalnum() or ch == "_"))
+
+
+class BulkImporter:
+    def __init__(
+        self,
+        store: Store,
+        cfg: AppConfig,
+        chunk_size: int = 500,
+        create_groups: bool = False,
+        with_drw: bool = False,
+        progress: Optional[Callable[[ImportResult], None]] = None,
+    ):
+        self.store = store
+        self.cfg = cfg
+        self.chunk_size = max(1, int(chunk_size))
+        self.create_groups = bool(create_groups)
+        self.with_drw = bool(with_drw)
+        self.progress = progress
+        self._groups: Set[Tuple[str, str]] = set()
+        self._planned: Dict[Tuple[str, str, str], List[int]] = {}  # dry-run: [next_part, next_assy]
+        pdm = getattr(cfg, "pdm", None)
+        self._custom_names: Set[str] = {
+            n for n in (
+                _prop_name(str(d.get("name", "")))
+                for d in (getattr(pdm, "custom_properties", []) or [])
+                if isinstance(d, dict)
+            ) if n
+        }
+
+    # ---- validazione
+    def _segment(self, key: str, raw: Any) -> Tuple[str, str]:
+        """(valore normalizzato, errore) con la regola segmento `key`."""
+        rule = self.cfg.code.segments[key]
+        v = str(raw or "").strip()
+        if not v:
+            return "", f"{key} mancante"
+        norm = rule.normalize_value(v)
+        expected = v.upper() if rule.case == "UPPER" else v.lower()
+        if norm != expected:
+            return "", f"{key} non valido: '{v}' (atteso {rule.length} car. {rule.charset})"
+        return norm, ""
+
+    def validate(self, line: int, rec: Dict[str, Any]) -> Tuple[Optional[_ImportRow], str]:
+        if "__error__" in rec:
+            return None, str(rec["__error__"])
+        core: Dict[str, str] = {}
+        props: Dict[str, str] = {}
+        for k, v in rec.items():
+            field_name = _CORE_COLUMNS.get(str(k).strip().lower())
+            val = "" if v is None else str(v).strip()
+            if field_name:
+                core[field_name] = val
+            elif val:
+                pn = _prop_name(str(k))
+                if pn not in self._custom_names:
+                    return None, f"Colonna '{k}' non e una proprieta custom configurata"
+                props[pn] = val
+
+        mmm, err = self._segment("MMM", core.get("mmm"))
+        if err:
+            return None, err
+        gggg, err = self._segment("GGGG", core.get("gggg"))
+        if err:
+            return None, err
+        vvv = ""
+        if core.get("vvv"):
+            vvv, err = self._segment("VVV", core.get("vvv"))
+            if err:
+                return None, err
+
+        dt = (core.get("doc_type") or "").upper()
+        if dt in ("PRT", "SLDPRT"):
+            dt = "PART"
+        elif dt in ("ASM", "SLDASM"):
+            dt = "ASSY"
+        if dt not in ("PART", "ASSY"):
+            return None, f"DOC_TYPE non valido: '{core.get('doc_type', '')}' (PART/ASSY)"
+
+        desc = (core.get("description") or "").strip().upper()
+        if not desc:
+            return None, "Descrizione mancante"
+
+        if (mmm, gggg) not in self._groups and not self.create_groups:
+            return None, f"Gruppo inesistente: {mmm}/{gggg}"
+        return _ImportRow(line, rec, mmm, gggg, vvv, dt, desc, props), ""
+
+    def _load_groups(self) -> Set[Tuple[str, str]]:
+        return {
+            (str(r["mmm"]), str(r["gggg"]))
+            for r in self.store.conn.execute("SELECT mmm, gggg FROM groups;").fetchall()
+        }
+
+    def _read_counters(self, mmm: str, gggg: str, vvv: str) -> List[int]:
+        row = self.store.conn.execute(
+            "SELECT next_part, next_assy FROM seq_counters WHERE mmm=? AND gggg=? AND vvv=?;",
+            (mmm, gggg, vvv),
+        ).fetchone()
+        return [int(row["next_part"]), int(row["next_assy"])] if row else [1, 9999]
+
+    # ---- scrittura
+    def _ensure_groups(self, rows: List[_ImportRow]) -> None:
+        missing = sorted({(r.mmm, r.gggg) for r in rows} - self._groups)
+        if not missing:
+            return
+        machines = {m for m, _ in self.store.list_machines()}
+        for mmm, gggg in missing:
+            if mmm not in machines:
+                self.store.add_machine(mmm, mmm)
+                machines.add(mmm)
+            self.store.add_group(mmm, gggg, gggg)
+            self._groups.add((mmm, gggg))
+
+    def _write_chunk(self, rows: List[_ImportRow], reject: Callable[[_ImportRow, str], None], res: ImportResult) -> None:
+        by_key: Dict[Tuple[str, str, str, str], List[_ImportRow]] = {}
+        for r in rows:
+            by_key.setdefault((r.mmm, r.gggg, r.vvv, r.doc_type), []).append(r)
+
+        if res.dry_run:
+            # simulazione: contatori letti una volta e aggiornati in memoria
+            for (mmm, gggg, vvv, dt), group in by_key.items():
+                counters = self._planned.get((mmm, gggg, vvv))
+                if counters is None:
+                    counters = self._read_counters(mmm, gggg, vvv)
+                    self._planned[(mmm, gggg, vvv)] = counters
+                free = max(0, min(counters[1], 9999) - max(counters[0], 1) + 1)
+                k = min(free, len(group))
+                for r in group[k:]:
+                    reject(r, f"Sequenza {dt} insufficiente: richiesti {len(group)}, liberi {free}")
+                if dt == "PART":
+                    counters[0] += k
+                else:
+                    counters[1] -= k
+                res.imported += k
+            return
+
+        wip_root = self.cfg.solidworks.archive_root
+        rejected: Set[int] = set()  # righe gia scartate nel blocco (non ripetute se il blocco fallisce)
+        try:
+            with self.store.transaction():
+                if self.create_groups:
+                    self._ensure_groups(rows)
+                docs: List[Document] = []
+                values: List[Tuple[str, str, str]] = []
+                for (mmm, gggg, vvv, dt), group in by_key.items():
+                    try:
+                        seqs = self.store.allocate_seq_range(mmm, gggg, vvv, dt, len(group))
+                    except ValueError as e:
+                        for r in group:
+                            reject(r, str(e))
+                            rejected.add(r.line)
+                        continue
+                    wip = archive_dirs(wip_root, mmm, gggg)[0] if wip_root else None
+                    for seq, r in zip(seqs, group):
+                        code = build_code(self.cfg, mmm, gggg, seq, vvv=vvv, force_vvv=bool(vvv))
+                        docs.append(Document(
+                            id=0, code=code, doc_type=dt, mmm=mmm, gggg=gggg, seq=seq, vvv=vvv,
+                            revision=0, state="WIP", description=r.description,
+                            file_wip_path=str(model_path(wip, code, dt)) if wip else "",
+                            file_rel_path="", file_inrev_path="",
+                            file_wip_drw_path=str(drw_path(wip, code)) if (wip and self.with_drw) else "",
+                            file_rel_drw_path="", file_inrev_drw_path="",
+                            created_at="", updated_at="",
+                        ))
+                        values.extend((code, pn, pv) for pn, pv in r.props.items())
+                self.store.add_documents(docs)
+                self.store.set_custom_values_bulk(values)
+        except sqlite3.IntegrityError as e:
+            # es. codice gia presente (contatori non allineati): blocco annullato
+            for r in rows:
+                if r.line not in rejected:
+                    reject(r, f"Blocco annullato: {e}")
+            self._groups = self._load_groups()  # gruppi creati nel blocco annullati
+            return
+        res.imported += len(docs)
+        res.custom_values += len(values)
+        if len(res.first_codes) < 5:
+            res.first_codes.extend(d.code for d in docs[: 5 - len(res.first_codes)])
+
+    def run(self, source: Path, dry_run: bool = False, rejects_path: Optional[Path] = None) -> ImportResult:
+        t0 = time.perf_counter()
+        src = Path(source)
+        res = ImportResult(ok=False, dry_run=bool(dry_run))
+        rej_path = Path(rejects_path) if rejects_path else src.with_name(src.stem + "_rejects.csv")
+        self._groups = self._load_groups()
+        self._planned = {}
+
+        rej_file = None
+        rej_writer = None
+
+        def reject(r: Any, reason: str) -> None:
+            nonlocal rej_file, rej_writer
+            if rej_writer is None:
+                rej_file = rej_path.open("w", encoding="utf-8", newline="")
+                rej_writer = csv.writer(rej_file, delimiter=";")
+                rej_writer.writerow(["line", "reason", "row"])
+            line, raw = (r.line, r.raw) if isinstance(r, _ImportRow) else r
+            rej_writer.writerow([line, reason, json.dumps(raw, ensure_ascii=False, default=str)])
+            res.rejected += 1
+
+        try:
+            chunk: List[_ImportRow] = []
+            for line, rec in iter_source_rows(src):
+                res.read += 1
+                row, err = self.validate(line, rec)
+                if row is None:
+                    reject((line, rec), err)
+                    continue
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    self._write_chunk(chunk, reject, res)
+                    chunk = []
+                    self._report(res, t0)
+            if chunk:
+                self._write_chunk(chunk, reject, res)
+            res.ok = True
+            res.message = "Simulazione completata." if dry_run else "Import completato."
+        except Exception as e:
+            res.message = f"Import interrotto: {e}"
+        finally:
+            if rej_file is not None:
+                rej_file.close()
+                res.rejects_path = str(rej_path)
+            self._report(res, t0)
+        return res
+
+    def _report(self, res: ImportResult, t0: float) -> None:
+        res.elapsed_s = time.perf_counter() - t0
+        if self.progress:
+            try:
+                self.progress(res)
+            except Exception:
+                pass
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("workspace_dir", help="cartella workspace (config.json + pdm.db)")
+    ap.add_argument("source", help="file CSV o JSONL")
+    ap.add_argument("--dry-run", action="store_true", help="valida e simula l'allocazione senza scrivere")
+    ap.add_argument("--chunk", type=int, default=500, help="righe per transazione")
+    ap.add_argument("--rejects", default="", help="file scarti (default: <source>_rejects.csv)")
+    ap.add_argument("--create-groups", action="store_true", help="crea MMM/GGGG mancanti")
+    ap.add_argument("--drw", action="store_true", help="imposta anche il percorso DRW WIP")
+    a = ap.parse_args()
+
+    ws_dir = Path(a.workspace_dir)
+    cfg_path = ws_dir / "config.json"
+    if not cfg_path.exists():
+        ap.error(f"config.json non trovato in {ws_dir}")
+    cfg = ConfigManager(cfg_path).load()
+
+    def progress(r: ImportResult) -> None:
+        print(f"  lette {r.read} | importate {r.imported} | scartate {r.rejected} | {r.rows_per_s:.0f} righe/s", flush=True)
+
+    store = Store(ws_dir / "pdm.db")
+    try:
+        imp = BulkImporter(store, cfg, chunk_size=a.chunk, create_groups=a.create_groups, with_drw=a.drw, progress=progress)
+        res = imp.run(Path(a.source), dry_run=a.dry_run, rejects_path=Path(a.rejects) if a.rejects else None)
+        if not a.dry_run and res.imported:
+            store.add_activity(
+                ws_dir.name, "", "", "", "", "BULK_IMPORT", status="OK" if res.ok else "ERROR", message=res.message,
+                details={"source": str(a.source), "imported": res.imported, "rejected": res.rejected},
+            )
+    finally:
+        store.close()
+    print(res.message)
+    print(
+        f"Righe lette {res.read}, {'importabili' if res.dry_run else 'importate'} {res.imported}, "
+        f"scartate {res.rejected}, valori custom {res.custom_values}, {res.elapsed_s:.2f} s ({res.rows_per_s:.0f} righe/s)"
+    )
+    if res.first_codes:
+        print("Primi codici: " + ", ".join(res.first_codes))
+    if res.rejects_path:
+        print(f"Scarti: {res.rejects_path}")
+
+
+if __name__ == "__main__":
+    main()
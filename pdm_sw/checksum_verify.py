@@ -0,0 +1,148 @@
+"""Verifica file REL/REV contro il registro checksum (file_checksums).
+
+Ricalcola in parallelo lo SHA-256 dei file registrati e li confronta con il
+valore salvato al rilascio/approvazione. Le righe REL_* di revisioni
+superate non sono verificate (il file corrente contiene ormai la revisione
+successiva; la copia storica e la riga REV_* corrispondente).
+
+Uso CLI:
+    python -m pdm_sw.checksum_verify <ws_dir> [--code CODICE] [--workers 4]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .archive import file_sha256
+from .store import Store
+
+STATUSES = ("OK", "MISSING", "MISMATCH", "ERROR")
+REPORT_FIELDS = ["status", "code", "revision", "role", "path", "expected_sha256", "actual_sha256", "detail"]
+
+
+@dataclass
+class VerifyResult:
+    checked: int = 0
+    counts: Dict[str, int] = field(default_factory=lambda: {k: 0 for k in STATUSES})
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+    report_path: str = ""
+    elapsed_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.checked == self.counts.get("OK", 0)
+
+
+def _current_entries(store: Store, code: str = "") -> List[Dict[str, Any]]:
+    revs = {
+        str(r["code"]): int(r["revision"])
+        for r in store.conn.execute("SELECT code, revision FROM documents;").fetchall()
+    }
+    out = []
+    for e in store.list_file_checksums(code):
+        if e["role"].startswith("REL_") and revs.get(e["code"]) != e["revision"]:
+            continue
+        out.append(e)
+    return out
+
+
+def _check(entry: Dict[str, Any]) -> Dict[str, Any]:
+    p = Path(entry["path"])
+    row = dict(entry, status="OK", actual_sha256="", detail="")
+    try:
+        if not p.is_file():
+            row["status"] = "MISSING"
+            return row
+        if p.stat().st_size != entry["size"]:
+            row["status"] = "MISMATCH"
+            row["detail"] = f"size {p.stat().st_size} != {entry['size']}"
+            return row
+        row["actual_sha256"] = file_sha256(p)[0]
+        if row["actual_sha256"] != entry["sha256"]:
+            row["status"] = "MISMATCH"
+    except Exception as e:
+        row["status"] = "ERROR"
+        row["detail"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def verify_checksums(
+    store: Store,
+    code: str = "",
+    workers: int = 4,
+    report_dir: str | Path | None = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> VerifyResult:
+    """Verifica parallela; aggiorna verified_at sulle righe OK e, se richiesto,
+    scrive le anomalie in <report_dir>/checksum_verify_<ts>.csv."""
+    t0 = time.perf_counter()
+    res = VerifyResult()
+    entries = _current_entries(store, code)
+    ok_keys = []
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        for i, row in enumerate(pool.map(_check, entries), start=1):
+            res.checked += 1
+            res.counts[row["status"]] = res.counts.get(row["status"], 0) + 1
+            if row["status"] == "OK":
+                ok_keys.append((row["code"], row["revision"], row["role"]))
+            else:
+                res.failures.append(row)
+            if progress:
+                try:
+                    progress(i, len(entries))
+                except Exception:
+                    pass
+    store.mark_file_checksums_verified(ok_keys)
+
+    if report_dir is not None:
+        out_dir = Path(report_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"checksum_verify_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        with path.open("w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=REPORT_FIELDS, delimiter=";")
+            w.writeheader()
+            for r in res.failures:
+                w.writerow({
+                    "status": r["status"], "code": r["code"], "revision": r["revision"], "role": r["role"],
+                    "path": r["path"], "expected_sha256": r["sha256"], "actual_sha256": r["actual_sha256"],
+                    "detail": r["detail"],
+                })
+        res.report_path = str(path)
+    res.elapsed_s = round(time.perf_counter() - t0, 3)
+    return res
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Verifica file REL/REV contro il registro checksum.")
+    ap.add_argument("ws_dir", help="cartella workspace (contiene pdm.db)")
+    ap.add_argument("--code", default="", help="verifica un solo codice")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--report-dir", default="", help="default: <ws_dir>/REPORTS")
+    a = ap.parse_args(list(argv) if argv is not None else None)
+
+    ws_dir = Path(a.ws_dir)
+    store = Store(ws_dir / "pdm.db")
+    try:
+        res = verify_checksums(
+            store, code=a.code, workers=a.workers,
+            report_dir=Path(a.report_dir) if a.report_dir else ws_dir / "REPORTS",
+        )
+    finally:
+        store.close()
+    print(f"File verificati: {res.checked} | {res.elapsed_s} s")
+    for k in STATUSES:
+        print(f"  {k:<10}{res.counts.get(k, 0):>8}")
+    for r in res.failures[:20]:
+        print(f"{r['status']}: {r['code']} R{r['revision']:02d} {r['role']} | {r['path']}")
+    print(f"Report: {res.report_path}")
+    return 0 if res.ok else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import TYPE_CHECKING, List, Optional, Sequence
+from .archive import archive_dirs, drw_path, model_path
 from .config import AppConfig
-from .models import DocType
+from .models import Document, DocType
+
+if TYPE_CHECKING:
+    from .store import Store
 
 
 def format_seq(seq: int, length: int = 4) -> str:
@@ -40,3 +44,51 @@ def build_group_code(cfg: AppConfig, mmm: str, gggg: str, ver_seq: int) -> str:
     gggg_v = segs["GGGG"].normalize_value(gggg)
     vnum_v = str(ver_seq).zfill(segs.get("VNUM", segs["0000"]).length)
     return f"{mmm_v}{cfg.code.sep1}{gggg_v}{cfg.code.sep2}V{vnum_v}"
+
+
+def create_codes_batch(
+    store: "Store",
+    cfg: AppConfig,
+    mmm: str,
+    gggg: str,
+    doc_type: DocType,
+    descriptions: Sequence[str],
+    vvv: str = "",
+    force_vvv: Optional[bool] = None,
+    with_drw: bool = False,
+) -> List[Document]:
+    """Crea in blocco un codice PART/ASSY per ogni descrizione (es. distinta di un gruppo).
+
+    Riserva i progressivi con allocate_seq_range e inserisce tutti i documenti
+    (WIP) nella stessa transazione: una sola scrittura verso gli altri utenti.
+    Ritorna i documenti come salvati, nell'ordine delle descrizioni.
+    """
+    dt = str(doc_type).upper()
+    if dt not in ("PART", "ASSY"):
+        raise ValueError(f"create_codes_batch valido solo per PART/ASSY, ricevuto: {dt}")
+    descs = [str(d or "").strip().upper() for d in descriptions]
+    if not descs:
+        return []
+    vvv_key = cfg.code.segments["VVV"].normalize_value(vvv) if vvv else ""
+    wip = None
+    if cfg.solidworks.archive_root:
+        wip = archive_dirs(cfg.solidworks.archive_root, mmm, gggg)[0]
+
+    docs: List[Document] = []
+    with store.transaction():
+        seqs = store.allocate_seq_range(mmm, gggg, vvv_key, dt, len(descs))
+        for seq, desc in zip(seqs, descs):
+            code = build_code(cfg, mmm, gggg, seq, vvv=vvv_key, force_vvv=force_vvv)
+            docs.append(Document(
+                id=0, code=code, doc_type=dt, mmm=mmm, gggg=gggg, seq=seq, vvv=vvv_key,
+                revision=0, state="WIP", description=desc,
+                file_wip_path=str(model_path(wip, code, dt)) if wip else "",
+                file_rel_path="", file_inrev_path="",
+                file_wip_drw_path=str(drw_path(wip, code)) if (wip and with_drw) else "",
+                file_rel_drw_path="", file_inrev_drw_path="",
+                created_at="", updated_at="",
+            ))
+        store.add_documents(docs)
+        # righe salvate (id, created_at, updated_at assegnati dallo Store)
+        saved = store.get_documents([d.code for d in docs])
+    return [saved.get(d.code, d) for d in docs]
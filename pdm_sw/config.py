@@ -97,6 +97,12 @@ class BackupConfig:
     enabled: bool = True
     retention_total: int = 30
     daily_enabled: bool = True
+    # backup DB a blocchi deduplicati (manifest) invece dello zip completo
+    incremental: bool = True
+    chunk_kb: int = 256
+    # snapshot archivio CAD (vuoto = <workspace>/backups/archive)
+    archive_snapshot_dir: str = ""
+    archive_snapshot_retention: int = 10
 
 
 @dataclass
@@ -171,6 +177,10 @@ class AppConfig:
             enabled=bool(b_d.get("enabled", True)),
             retention_total=int(b_d.get("retention_total", 30)),
             daily_enabled=bool(b_d.get("daily_enabled", True)),
+            incremental=bool(b_d.get("incremental", True)),
+            chunk_kb=int(b_d.get("chunk_kb", 256)),
+            archive_snapshot_dir=str(b_d.get("archive_snapshot_dir", "")),
+            archive_snapshot_retention=int(b_d.get("archive_snapshot_retention", 10)),
         )
         return AppConfig(code=code, solidworks=sw, pdm=pdm, backup=backup)
 
@@ -12,11 +12,16 @@ from pathlib import Path
 from collections import defaultdict
 import customtkinter as ctk
 from .base_tab import BaseTab
+from pdm_sw.ui.table import export_tree_nodes, import_tree_nodes
 
 if TYPE_CHECKING:
     from pdm_sw.models import Document
 
 
+# Nodi massimi conservati per una workspace lasciata con uno switch (oltre: ricarica)
+TREE_POOL_MAX_NODES = 50000
+
+
 class TabGerarchia(BaseTab):
     """Tab con treeview gerarchica MMM -> GGGG -> codici."""
 
@@ -25,6 +30,7 @@ class TabGerarchia(BaseTab):
         self.root = parent_frame
         self.hierarchy_tree = None
         self.hierarchy_include_obs_var = None
+        self._tree_state = None  # (store, versione doc_changes, include_obs) dell'ultimo refresh
         self._build_ui()
 
     def _build_ui(self):
@@ -104,18 +110,28 @@ class TabGerarchia(BaseTab):
 
         self.hierarchy_tree.bind("<Double-1>", self._on_double_click)
 
-    def refresh_tree(self):
-        """Aggiorna il contenuto del treeview."""
+    def refresh_tree(self, only_if_changed: bool = False):
+        """Aggiorna il contenuto del treeview.
+
+        only_if_changed: salta il ricaricamento se il DB non e cambiato
+        (versione doc_changes) dall'ultimo refresh.
+        """
         if not self.hierarchy_tree:
             return
 
+        include_obs = bool(self.hierarchy_include_obs_var.get()) if self.hierarchy_include_obs_var else False
+        state = (self.store, self.store.change_version(), include_obs)
+        if only_if_changed and self._tree_state is not None:
+            prev_store, prev_version, prev_obs = self._tree_state
+            if prev_store is state[0] and prev_version == state[1] and prev_obs == include_obs:
+                return
+        self._tree_state = state
+
         tree = self.hierarchy_tree
         current_nodes = tree.get_children()
         if current_nodes:
             tree.delete(*current_nodes)
 
-        include_obs = bool(self.hierarchy_include_obs_var.get()) if self.hierarchy_include_obs_var else False
-
         machines_raw = self.store.list_machines()
         machine_names: dict[str, str] = {mmm: name for mmm, name in machines_raw}
 
@@ -235,6 +251,32 @@ class TabGerarchia(BaseTab):
                         text=f"DRW ({d.state}): {drw_path if drw_path else 'NON ASSOCIATO'}"
                     )
 
+    def export_view_state(self) -> dict:
+        """Albero corrente da conservare nel pool workspace ({} se da ricaricare)."""
+        if not self.hierarchy_tree or self._tree_state is None or self._tree_state[0] is not self.store:
+            return {}
+        nodes = export_tree_nodes(self.hierarchy_tree, TREE_POOL_MAX_NODES)
+        if nodes is None:
+            return {}
+        _store, version, include_obs = self._tree_state
+        return {"nodes": nodes, "version": version, "include_obs": include_obs}
+
+    def import_view_state(self, state: dict) -> bool:
+        """Ripristina l'albero salvato se il DB non e cambiato nel frattempo."""
+        if not state or not self.hierarchy_tree:
+            return False
+        if state["version"] != self.store.change_version():
+            return False
+        if self.hierarchy_include_obs_var is not None:
+            self.hierarchy_include_obs_var.set(state["include_obs"])
+        tree = self.hierarchy_tree
+        current_nodes = tree.get_children()
+        if current_nodes:
+            tree.delete(*current_nodes)
+        import_tree_nodes(tree, state["nodes"])
+        self._tree_state = (self.store, state["version"], state["include_obs"])
+        return True
+
     def _on_double_click(self, _evt=None):
         """Gestisce doppio click su nodo tree: apre codice in tab Operativo."""
         if not self.hierarchy_tree:
@@ -20,6 +20,13 @@ from pdm_sw.ui.table import Table
 if TYPE_CHECKING:
     from pdm_sw.models import Document
 
+# Righe per pagina della tabella ricerca (le successive arrivano con lo scroll)
+RC_PAGE_SIZE = 500
+# Intervallo controllo modifiche di altri utenti (journal doc_changes)
+RC_POLL_MS = 5000
+# Righe massime conservate per una workspace lasciata con uno switch (oltre: ricarica)
+RC_POOL_MAX_ROWS = 4 * RC_PAGE_SIZE
+
 # Limiti ratio workflow width (0.2 = 20% minimo, 0.6 = 60% massimo)
 WORKFLOW_WIDTH_RATIO_MIN = 0.2
 WORKFLOW_WIDTH_RATIO_MAX = 0.6
@@ -63,6 +70,11 @@ class TabOperativo(BaseTab):
         self.search_vvv_var = None
         self.include_obs_var = None
         self.rc_table = None
+        self._rc_query = None  # (filtri, proprietà SW) dell'ultima ricerca
+        self._rc_cursor = None  # cursore keyset pagina successiva
+        self._rc_version = 0  # versione doc_changes gia mostrata
+        self._rc_store = None  # store della tabella (cambia con il workspace)
+        self._rc_poll_after_id = None
         
         # Workflow (right panel)
         self.tab_wf = None
@@ -78,6 +90,7 @@ class TabOperativo(BaseTab):
         self.wf_btn_restore_obs = None
         self.wf_btn_checkout = None
         self.wf_btn_checkin = None
+        self.wf_btn_batch = None
         self.wf_info = None
         
         self._build_ui()
@@ -263,6 +276,8 @@ class TabOperativo(BaseTab):
         
         # Bind selection per abilitare pulsante "INVIA A WORKFLOW"
         self.rc_table.tree.bind("<<TreeviewSelect>>", self._on_rc_select)
+        self.rc_table.on_scroll_end = self._load_more_rc_rows
+        self._rc_poll_after_id = self.app.after(RC_POLL_MS, self._poll_rc_changes)
         
         # Prima ricerca automatica
         self.refresh_table()
@@ -405,6 +420,11 @@ class TabOperativo(BaseTab):
                 text="CHECK-IN",
                 command=lambda: self.app._checkin_selected_document()
             )
+            self.wf_btn_batch = ctk.CTkButton(
+                row3,
+                text="MULTIPLA...",
+                command=lambda: self.app._wf_batch_dialog()
+            )
         else:
             self.wf_btn_release = ctk.CTkButton(
                 row1,
@@ -446,6 +466,11 @@ class TabOperativo(BaseTab):
                 text="CHECK-IN",
                 command=lambda: self.app._checkin_selected_document()
             )
+            self.wf_btn_batch = ctk.CTkButton(
+                row3,
+                text="Transizione multipla...",
+                command=lambda: self.app._wf_batch_dialog()
+            )
         
         # Layout pulsanti
         if compact:
@@ -465,12 +490,13 @@ class TabOperativo(BaseTab):
             self.wf_btn_restore_obs.grid(row=1, column=1, sticky="ew", padx=4, pady=3)
             self.wf_btn_checkout.grid(row=0, column=0, sticky="ew", padx=4, pady=3)
             self.wf_btn_checkin.grid(row=0, column=1, sticky="ew", padx=4, pady=3)
+            self.wf_btn_batch.grid(row=1, column=0, columnspan=2, sticky="ew", padx=4, pady=3)
         else:
             for b in (self.wf_btn_release, self.wf_btn_create_rev, self.wf_btn_approve):
                 b.pack(side="left", padx=4, pady=4)
             for b in (self.wf_btn_cancel, self.wf_btn_obsolete, self.wf_btn_restore_obs):
                 b.pack(side="left", padx=4, pady=4)
-            for b in (self.wf_btn_checkout, self.wf_btn_checkin):
+            for b in (self.wf_btn_checkout, self.wf_btn_checkin, self.wf_btn_batch):
                 b.pack(side="left", padx=4, pady=4)
         
         # Info textbox
@@ -550,6 +576,18 @@ class TabOperativo(BaseTab):
         except Exception:
             return ""
     
+    def _get_selected_rc_codes(self) -> list:
+        """Codici selezionati nella tabella ricerca (selezione multipla)."""
+        out = []
+        try:
+            for iid in self.rc_table.tree.selection():
+                values = self.rc_table.tree.item(iid, "values")
+                if len(values) > 2 and str(values[2]).strip():
+                    out.append(str(values[2]).strip())
+        except Exception:
+            pass
+        return out
+
     def _send_rc_to_workflow(self):
         """Invia codice selezionato dalla ricerca al pannello workflow."""
         code = self._get_selected_rc_code()
@@ -579,7 +617,7 @@ class TabOperativo(BaseTab):
         """Esegue ricerca con filtri correnti."""
         self.refresh_table()
     
-    def refresh_table(self):
+    def refresh_table(self, incremental: bool = False):
         """
         Aggiorna tabella ricerca/consultazione con filtri correnti.
         
@@ -587,13 +625,27 @@ class TabOperativo(BaseTab):
         - Pulsante AGGIORNA
         - CERCA / RESET filtri
         - _switch_workspace
-        - _refresh_all
+        - _refresh_all (incremental=True: aggiorna solo le righe modificate)
         """
         # Schema dinamico con proprietà SW
         columns, headings, props, key_index = self.app._build_table_schema_with_sw_props()
+        filters = self._read_rc_filters()
+        if incremental and self._apply_rc_changes(filters, columns, props):
+            return
         self.rc_table.set_schema(columns=columns, headings=headings, key_index=key_index)
         
-        # Leggi filtri
+        # Query store: solo la prima pagina, le altre su scroll
+        # (versione letta prima della query: nessuna modifica persa)
+        self._rc_version = self.store.change_version()
+        self._rc_store = self.store
+        docs, self._rc_cursor = self.store.search_documents_page(limit=RC_PAGE_SIZE, **filters)
+        self._rc_query = (filters, props)
+        
+        self.rc_table.set_rows(self._build_rc_rows(docs, props))
+        self._on_rc_select(None)
+    
+    def _read_rc_filters(self) -> dict:
+        """Filtri ricerca correnti (kwargs di store.search_documents_page)."""
         txt = (self.search_text_var.get() or "").strip()
         st = (self.search_state_var.get() or "").strip()
         tp = (self.search_type_var.get() or "").strip()
@@ -602,8 +654,7 @@ class TabOperativo(BaseTab):
         vvv = (self.search_vvv_var.get() or "").strip().upper()
         include_obs = bool(self.include_obs_var.get())
         
-        # Query store
-        docs = self.store.search_documents(
+        filters = dict(
             text=txt,
             state=st if st else None,
             doc_type=tp if tp else None,
@@ -612,11 +663,131 @@ class TabOperativo(BaseTab):
             vvv=vvv if vvv else None,
             include_obs=include_obs,
         )
+        return filters
+    
+    def _apply_rc_changes(self, filters: dict, columns, props) -> bool:
+        """Applica alla tabella le modifiche dal journal doc_changes.
+        
+        False se serve un ricaricamento completo (filtri/colonne/workspace
+        cambiati o journal non piu disponibile).
+        """
+        if not self._rc_query or self._rc_store is not self.store:
+            return False
+        if self._rc_query != (filters, props) or list(columns) != list(self.rc_table.columns):
+            return False
+        feed = self.store.changes_since(self._rc_version)
+        if feed["reset"]:
+            return False
+        self._rc_version = feed["version"]
+        codes = set()
+        moved = set()  # documenti modificati: updated_at nuovo -> in cima
+        for ch in feed["changes"]:
+            if ch["entity"] == "documents":
+                codes.add(ch["key"])
+                moved.add(ch["key"])
+            elif ch["entity"] == "doc_custom_values":
+                codes.add(ch["key"])
+        if codes:
+            self._patch_rc_rows(codes, moved)
+        return True
+    
+    def _patch_rc_rows(self, codes: set, moved: set) -> None:
+        filters, props = self._rc_query
+        docs = self.store.search_documents(codes=sorted(codes), **filters)
+        rows = self._build_rc_rows(docs, props)
+        items = self.rc_table.items_by_key()
+        found = {d.code for d in docs}
+        self.rc_table.delete_items([items[c] for c in codes if c in items and c not in found])
+        # docs in ordine updated_at DESC: inserendo in cima si parte dal piu vecchio
+        for d, row in reversed(list(zip(docs, rows))):
+            item_id = items.get(d.code)
+            top = 0 if d.code in moved else None
+            if item_id:
+                self.rc_table.update_row(item_id, row, index=top)
+            elif top is not None:
+                # le pagine successive (cursore keyset) non lo ripresenteranno
+                self.rc_table.insert_row(row, index=0)
+    
+    def _poll_rc_changes(self):
+        """Controllo periodico modifiche di altri utenti (una query su sqlite_sequence)."""
+        self._rc_poll_after_id = None
+        try:
+            if self._rc_query and self._rc_store is self.store and self.store.change_version() != self._rc_version:
+                # filtri dell'ultima ricerca (non quelli digitati e non ancora cercati)
+                filters, props = self._rc_query
+                self._apply_rc_changes(filters, self.rc_table.columns, props)
+        except Exception:
+            pass
+        try:
+            self._rc_poll_after_id = self.app.after(RC_POLL_MS, self._poll_rc_changes)
+        except Exception:
+            pass
+    
+    def stop_auto_refresh(self):
+        """Ferma il controllo periodico modifiche (chiusura app)."""
+        if self._rc_poll_after_id:
+            try:
+                self.app.after_cancel(self._rc_poll_after_id)
+            except Exception:
+                pass
+            self._rc_poll_after_id = None
+    
+    def export_view_state(self) -> dict:
+        """Stato tabella ricerca da conservare nel pool workspace ({} se da ricaricare)."""
+        if not self._rc_query or self._rc_store is not self.store:
+            return {}
+        rows = self.rc_table.export_rows(RC_POOL_MAX_ROWS)
+        if rows is None:
+            return {}
+        return {
+            "columns": list(self.rc_table.columns),
+            "headings": self.rc_table.headings(),
+            "key_index": self.rc_table.key_index,
+            "rows": rows,
+            "query": self._rc_query,
+            "cursor": self._rc_cursor,
+            "version": self._rc_version,
+        }
+    
+    def import_view_state(self, state: dict) -> bool:
+        """Ripristina tabella e filtri salvati da export_view_state (store gia ricollegato).
         
+        Il successivo refresh_table(incremental=True) applica solo le modifiche
+        del journal avvenute nel frattempo.
+        """
+        if not state:
+            return False
+        filters, _props = state["query"]
+        self.search_text_var.set(filters.get("text") or "")
+        self.search_state_var.set(filters.get("state") or "")
+        self.search_type_var.set(filters.get("doc_type") or "")
+        self.search_mmm_var.set(filters.get("mmm") or "")
+        self.search_gggg_var.set(filters.get("gggg") or "")
+        self.search_vvv_var.set(filters.get("vvv") or "")
+        self.include_obs_var.set(bool(filters.get("include_obs")))
+        self.rc_table.set_schema(columns=state["columns"], headings=state["headings"], key_index=state["key_index"])
+        self.rc_table.set_rows(state["rows"])
+        self._rc_query = state["query"]
+        self._rc_cursor = state["cursor"]
+        self._rc_version = state["version"]
+        self._rc_store = self.store
+        self._on_rc_select(None)
+        return True
+    
+    def _load_more_rc_rows(self):
+        """Carica la pagina successiva della ricerca corrente (scroll in fondo)."""
+        if not self._rc_cursor or not self._rc_query:
+            return
+        filters, props = self._rc_query
+        docs, self._rc_cursor = self.store.search_documents_page(limit=RC_PAGE_SIZE, cursor=self._rc_cursor, **filters)
+        self.rc_table.append_rows(self._build_rc_rows(docs, props))
+    
+    def _build_rc_rows(self, docs, props):
+        """Righe tabella (indicatori M/D, dati documento, proprietà SW)."""
         # Bulk load SW properties
         sw_values = self.store.get_custom_values_bulk([d.code for d in docs], props) if props else {}
+        self.app._prefetch_file_flags(docs)
         
-        # Build rows
         rows = []
         for d in docs:
             m_ok, d_ok = self.app._model_and_drawing_flags(d)
@@ -626,9 +797,7 @@ class TabOperativo(BaseTab):
             row_tag = self.app._state_row_tag(d.state)
             
             rows.append({"values": (base + extra), "tags": (row_tag,) if row_tag else ()})
-        
-        self.rc_table.set_rows(rows)
-        self._on_rc_select(None)
+        return rows
     
     # ========== WORKFLOW PANEL (RIGHT PANEL) ==========
     
@@ -643,6 +812,21 @@ class TabOperativo(BaseTab):
             return None
         return self.store.get_document(code)
     
+    def set_workflow_busy(self, busy: bool) -> None:
+        """Pulsanti workflow disabilitati durante un'operazione file (poi ricalcolati)."""
+        if self.wf_btn_batch is not None:
+            self.wf_btn_batch.configure(state="disabled" if busy else "normal")
+        if not busy:
+            self._update_workflow_buttons(self._load_selected_doc())
+            return
+        for name in (
+            "wf_btn_release", "wf_btn_create_rev", "wf_btn_approve", "wf_btn_cancel",
+            "wf_btn_obsolete", "wf_btn_restore_obs", "wf_btn_checkout", "wf_btn_checkin",
+        ):
+            btn = getattr(self, name, None)
+            if btn is not None:
+                btn.configure(state="disabled")
+    
     def _update_workflow_buttons(self, doc: "Document | None") -> None:
         """Abilita/disabilita pulsanti workflow in base allo stato documento."""
         def _set(btn_name: str, enabled: bool) -> None:
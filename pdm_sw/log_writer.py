@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# rotazione: oltre questa dimensione o al cambio di giorno il file diventa .1 (.1 -> .2, ...)
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 30
+
+
+class LogWriter:
+    """Scrittura asincrona dei log testuali (workflow.log, log macro).
+
+    Le righe vanno in una coda (submit non blocca il chiamante); un thread
+    dedicato le raggruppa per file e le scrive con una sola apertura ogni
+    `flush_interval_ms` o appena ci sono `batch_size` righe. Prima di scrivere
+    ruota il file se supera `max_bytes` o se e stato scritto l'ultima volta in
+    un giorno precedente. Con la coda piena la riga e scritta in modo sincrono.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = 500,
+        batch_size: int = 500,
+        max_queue: int = 20000,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+        rotate_daily: bool = True,
+    ):
+        self.flush_interval_s = max(0.01, int(flush_interval_ms) / 1000.0)
+        self.batch_size = max(1, int(batch_size))
+        self.max_bytes = max(0, int(max_bytes))
+        self.backups = max(1, int(backups))
+        self.rotate_daily = bool(rotate_daily)
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max(self.batch_size, int(max_queue)))
+        self._stop = threading.Event()
+        self._io_lock = threading.Lock()
+        self.written = 0
+        self.writes = 0
+        self.rotations = 0
+        self.last_error = ""
+        self._thread = threading.Thread(target=self._run, name="pdm-log-writer", daemon=True)
+        self._thread.start()
+
+    # ---- API thread chiamante
+    def submit(self, path: str | Path, line: str) -> bool:
+        """Accoda una riga gia formattata; False se scritta in modo sincrono."""
+        item = (str(path), line.rstrip("\n") + "\n")
+        if not self._stop.is_set():
+            try:
+                self._q.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+        self._write_file(item[0], [item[1]])
+        return False
+
+    def flush(self, timeout_s: float = 5.0) -> bool:
+        """Attende la scrittura delle righe accodate finora (max timeout_s)."""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._q.put(done, timeout=timeout_s)
+        except queue.Full:
+            return False
+        return done.wait(timeout_s)
+
+    def close(self, timeout_s: float = 5.0) -> bool:
+        """Svuota la coda e ferma il thread; True se tutto e stato scritto."""
+        self._stop.set()
+        try:
+            self._q.put_nowait(None)  # sveglia il worker
+        except queue.Full:
+            pass
+        self._thread.join(timeout_s)
+        return (not self._thread.is_alive()) and self._q.empty()
+
+    # ---- worker
+    def _run(self) -> None:
+        pending: Dict[str, List[str]] = {}
+        count = 0
+        waiters: List[threading.Event] = []
+        deadline = 0.0
+        try:
+            while not self._stop.is_set():
+                timeout = self.flush_interval_s if not count else max(0.0, deadline - time.monotonic())
+                try:
+                    count += self._take(self._q.get(timeout=timeout), pending, waiters)
+                except queue.Empty:
+                    pass
+                while count < self.batch_size:
+                    try:
+                        count += self._take(self._q.get_nowait(), pending, waiters)
+                    except queue.Empty:
+                        break
+                if count and not deadline:
+                    deadline = time.monotonic() + self.flush_interval_s
+                if count and (count >= self.batch_size or time.monotonic() >= deadline or waiters):
+                    self._write_pending(pending)
+                    count = 0
+                    deadline = 0.0
+                for w in waiters:
+                    w.set()
+                waiters.clear()
+
+            # chiusura: scrive tutto quello che resta
+            while True:
+                try:
+                    self._take(self._q.get_nowait(), pending, waiters)
+                except queue.Empty:
+                    break
+            self._write_pending(pending)
+        finally:
+            for w in waiters:
+                w.set()
+
+    @staticmethod
+    def _take(item: Any, pending: Dict[str, List[str]], waiters: List[threading.Event]) -> int:
+        if item is None:
+            return 0
+        if isinstance(item, threading.Event):
+            waiters.append(item)
+            return 0
+        pending.setdefault(item[0], []).append(item[1])
+        return 1
+
+    def _write_pending(self, pending: Dict[str, List[str]]) -> None:
+        for path, lines in pending.items():
+            self._write_file(path, lines)
+        pending.clear()
+
+    def _write_file(self, path: str, lines: List[str]) -> None:
+        if not lines:
+            return
+        with self._io_lock:
+            try:
+                p = Path(path)
+                p.parent.mkdir(parents=True, exist_ok=True)
+                self._maybe_rotate(p)
+                with p.open("a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+                self.written += len(lines)
+                self.writes += 1
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    def _maybe_rotate(self, p: Path) -> None:
+        try:
+            st = p.stat()
+        except OSError:
+            return
+        too_big = self.max_bytes > 0 and st.st_size >= self.max_bytes
+        old_day = self.rotate_daily and st.st_size > 0 and date.fromtimestamp(st.st_mtime) < date.today()
+        if not (too_big or old_day):
+            return
+        try:
+            for i in range(self.backups - 1, 0, -1):
+                src = p.with_name(f"{p.name}.{i}")
+                if src.exists():
+                    os.replace(src, p.with_name(f"{p.name}.{i + 1}"))
+            os.replace(p, p.with_name(f"{p.name}.1"))
+            self.rotations += 1
+        except OSError as e:
+            # file aperto da un altro processo/PC: si continua ad appendere
+            self.last_error = f"rotate {p}: {e}"
+
+
+_WRITER: Optional[LogWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_log_writer() -> LogWriter:
+    """Writer condiviso del processo (creato al primo uso, svuotato all'uscita)."""
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = LogWriter()
+        return _WRITER
+
+
+def append_line(path: str | Path | None, message: str, timestamp: bool = True) -> None:
+    """Accoda `message` al log `path` (timestamp preso ora, non alla scrittura)."""
+    if not path:
+        return
+    try:
+        line = message.rstrip()
+        if timestamp:
+            line = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {line}"
+        get_log_writer().submit(path, line)
+    except Exception:
+        pass
+
+
+def flush_logs(timeout_s: float = 5.0) -> bool:
+    w = _WRITER
+    return w.flush(timeout_s) if w is not None else True
+
+
+def close_logs(timeout_s: float = 5.0) -> bool:
+    """Scrive le righe in coda e ferma il writer (il prossimo append ne crea uno nuovo)."""
+    global _WRITER
+    with _WRITER_LOCK:
+        w, _WRITER = _WRITER, None
+    return w.close(timeout_s) if w is not None else True
+
+
+atexit.register(close_logs)
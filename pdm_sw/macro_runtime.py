@@ -4,11 +4,8 @@ def _log_line(path: str, msg: str) -> None:
     if not path:
         return
     try:
-        from pathlib import Path
-        p = Path(path)
-        p.parent.mkdir(parents=True, exist_ok=True)
-        with p.open("a", encoding="utf-8") as f:
-            f.write(msg.rstrip() + "\n")
+        from .log_writer import append_line
+        append_line(path, msg, timestamp=False)
     except Exception:
         pass
 
@@ -31,6 +28,7 @@ except Exception as e:
 from .workspace import WorkspaceManager
 from .config import ConfigManager, AppConfig
 from .store import Store
+from .log_writer import close_logs
 from .models import Document, DocType, State
 from .session_context import resolve_session_context
 from .codegen import build_code
@@ -265,7 +263,7 @@ if ctk is not None:
             self.cfg_mgr = ConfigManager(self.ws_mgr.config_path(self.ws_id))
             self.cfg = self.cfg_mgr.load()
 
-            self.store = Store(self.ws_mgr.db_path(self.ws_id))
+            self.store = Store(self.ws_mgr.db_path(self.ws_id), recover_intents=True)
             pdm_user_hint = str(self.sw_context.get("pdm_user") or self.sw_context.get("pdm_username") or "").strip()
             self.session = resolve_session_context(pdm_user_hint=pdm_user_hint)
             self.lock_ttl_seconds = DOC_LOCK_TTL_SECONDS
@@ -297,7 +295,12 @@ if ctk is not None:
                 _handler = self.destroy
             self.protocol("WM_DELETE_WINDOW", _handler)
             self.after(50, self._refresh_from_active_doc)
-            self._log_activity("MACRO_START", message=f"Macro avviata | source={self.session.get('source','UNKNOWN')}")
+            self._log_activity(
+                "MACRO_START",
+                message=f"Macro avviata | source={self.session.get('source','UNKNOWN')}",
+                details={"db_open": self.store.open_stats},
+            )
+            _log_line(self.log_file, self.store.open_report())
 
         # ---------------- UI base ----------------
         def _build_ui(self):
@@ -1346,6 +1349,8 @@ if ctk is not None:
                 return
             if not self._acquire_doc_lock(doc.code, action=f"WF_{action}"):
                 return
+            journal = None  # intent write-ahead (solo approvazione)
+            committed = False
 
             # Chiudi documenti SolidWorks se sono tra i file che stiamo per muovere/copiare (evita WinError 32)
             try:
@@ -1397,7 +1402,20 @@ if ctk is not None:
                 elif action == "REL_INREV":
                     doc, res = create_inrev(doc, archive_root, log_file=self.workflow_log_file)
                 elif action == "INREV_APPROVE":
-                    doc, res = approve_inrev(doc, archive_root, log_file=self.workflow_log_file)
+                    try:
+                        journal = self.store.begin_workflow_intent(
+                            doc.code, event_type,
+                            session_id=str(self.session.get("session_id", "")),
+                            host=str(self.session.get("host", "")),
+                            payload={
+                                "event_type": event_type, "from_state": from_state, "rev_before": rev_before,
+                                "note": note, "clear_checkout": True,
+                                "user": str(self.session.get("display_name", "")),
+                            },
+                        )
+                    except Exception:
+                        journal = None
+                    doc, res = approve_inrev(doc, archive_root, log_file=self.workflow_log_file, journal=journal)
                 elif action == "INREV_CANCEL":
                     doc, res = cancel_inrev(doc, log_file=self.workflow_log_file)
                 elif action == "TO_OBS":
@@ -1411,29 +1429,49 @@ if ctk is not None:
                     raise ValueError("Azione non riconosciuta")
                 if not res.ok:
                     raise RuntimeError(res.message)
-                self._update_doc_record(doc)
-                try:
-                    self.store.add_state_note(
+                # documento, nota, checkout e activity in un unico commit
+                note_error = None
+                with self.store.transaction():
+                    self._update_doc_record(doc)
+                    if journal is not None:
+                        self.store.complete_workflow_intent(journal.intent_id)
+                    if res.checksums:
+                        self.store.record_file_checksums(
+                            doc.code, [(x.role, x.revision, x.path, x.sha256, x.size) for x in res.checksums]
+                        )
+                    try:
+                        with self.store.transaction():
+                            self.store.add_state_note(
+                                code=doc.code,
+                                event_type=event_type,
+                                from_state=from_state,
+                                to_state=str(doc.state),
+                                note=note,
+                                rev_before=rev_before,
+                                rev_after=int(doc.revision),
+                            )
+                    except Exception as ne:
+                        note_error = ne
+                    if action in ("WIP_REL", "INREV_APPROVE", "INREV_CANCEL", "TO_OBS", "RESTORE_OBS"):
+                        try:
+                            with self.store.transaction():
+                                self.store.clear_document_checkout(doc.code)
+                            doc.checked_out = False
+                            doc.checkout_owner_user = ""
+                            doc.checkout_owner_host = ""
+                            doc.checkout_at = ""
+                        except Exception:
+                            pass
+                    self._log_activity(
+                        action=f"WF_{action}",
                         code=doc.code,
-                        event_type=event_type,
-                        from_state=from_state,
-                        to_state=str(doc.state),
-                        note=note,
-                        rev_before=rev_before,
-                        rev_after=int(doc.revision),
+                        status="OK",
+                        message=f"{from_state}->{doc.state}",
+                        details={"copies": [c.to_details() for c in res.copies]} if res.copies else None,
                     )
-                except Exception as ne:
-                    messagebox.showwarning("PDM (Macro SolidWorks)", f"Cambio stato eseguito, ma salvataggio nota fallito: {ne}")
-                if action in ("WIP_REL", "INREV_APPROVE", "INREV_CANCEL", "TO_OBS", "RESTORE_OBS"):
-                    try:
-                        self.store.clear_document_checkout(doc.code)
-                        doc.checked_out = False
-                        doc.checkout_owner_user = ""
-                        doc.checkout_owner_host = ""
-                        doc.checkout_at = ""
-                    except Exception:
-                        pass
-                self._log_activity(action=f"WF_{action}", code=doc.code, status="OK", message=f"{from_state}->{doc.state}")
+                committed = True
+                if note_error is not None:
+                    messagebox.showwarning("PDM (Macro SolidWorks)", f"Cambio stato eseguito, ma salvataggio nota fallito: {note_error}")
             except FileExistsError as e:
                 self._log_activity(action=f"WF_{action}", code=doc.code, status="ERROR", message=f"File exists: {e}")
                 messagebox.showwarning(
@@ -1460,6 +1498,13 @@ if ctk is not None:
                 self._refresh_wf_state()
                 return
             finally:
+                if journal is not None:
+                    if not committed:
+                        try:
+                            journal.discard("transizione non eseguita")  # solo se nessun passo file
+                        except Exception:
+                            pass
+                    journal.close()
                 self._release_doc_lock(doc.code)
 
             # Riapri documento risultante (best effort)
@@ -1488,6 +1533,7 @@ if ctk is not None:
             except Exception:
                 pass
             self._log_activity("MACRO_EXIT", status="OK", message="Macro chiusa.")
+            close_logs()
             try:
                 self.store.close()
             except Exception:
@@ -0,0 +1,545 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# Registro migrazioni schema DB, ordinate per versione (PRAGMA user_version).
+# Ogni migrazione gira nella propria transazione: un DB aggiornato apre con
+# una sola lettura di user_version, senza CREATE/PRAGMA table_info ripetuti.
+Migration = Tuple[int, str, Callable[[sqlite3.Cursor], None]]
+
+
+def _table_columns(c: sqlite3.Cursor, table: str) -> List[str]:
+    return [str(r[1]) for r in c.execute(f"PRAGMA table_info({table});").fetchall()]
+
+
+def _m001_base_schema(c: sqlite3.Cursor) -> None:
+    """Schema base (idempotente: i DB pre-versionamento hanno gia le tabelle)."""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS machines(
+        mmm TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS groups(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mmm TEXT NOT NULL,
+        gggg TEXT NOT NULL,
+        name TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        UNIQUE(mmm, gggg),
+        FOREIGN KEY(mmm) REFERENCES machines(mmm) ON DELETE CASCADE
+    );
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS seq_counters(
+        mmm TEXT NOT NULL,
+        gggg TEXT NOT NULL,
+        vvv TEXT NOT NULL DEFAULT '',
+        next_part INTEGER NOT NULL,
+        next_assy INTEGER NOT NULL,
+        PRIMARY KEY(mmm, gggg, vvv)
+    );
+    """)
+    # Legacy seq_counters: da PK(mmm, gggg) a PK(mmm, gggg, vvv)
+    if "vvv" not in _table_columns(c, "seq_counters"):
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS seq_counters_new(
+            mmm TEXT NOT NULL,
+            gggg TEXT NOT NULL,
+            vvv TEXT NOT NULL DEFAULT '',
+            next_part INTEGER NOT NULL,
+            next_assy INTEGER NOT NULL,
+            PRIMARY KEY(mmm, gggg, vvv)
+        );
+        """)
+        c.execute("INSERT INTO seq_counters_new(mmm, gggg, vvv, next_part, next_assy) SELECT mmm, gggg, '' as vvv, next_part, next_assy FROM seq_counters;")
+        c.execute("DROP TABLE seq_counters;")
+        c.execute("ALTER TABLE seq_counters_new RENAME TO seq_counters;")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS ver_counters(
+        mmm TEXT NOT NULL,
+        gggg TEXT NOT NULL DEFAULT '',
+        doc_type TEXT NOT NULL,
+        next_ver INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY(mmm, gggg, doc_type)
+    );
+    """)
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS documents(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT NOT NULL UNIQUE,
+        doc_type TEXT NOT NULL,
+        mmm TEXT NOT NULL,
+        gggg TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        vvv TEXT NOT NULL DEFAULT '',
+        revision INTEGER NOT NULL DEFAULT 0,
+        state TEXT NOT NULL DEFAULT 'WIP',
+        obs_prev_state TEXT NOT NULL DEFAULT '',
+        description TEXT NOT NULL DEFAULT '',
+        checked_out INTEGER NOT NULL DEFAULT 0,
+        checkout_owner_user TEXT NOT NULL DEFAULT '',
+        checkout_owner_host TEXT NOT NULL DEFAULT '',
+        checkout_at TEXT NOT NULL DEFAULT '',
+
+        file_wip_path TEXT NOT NULL DEFAULT '',
+        file_rel_path TEXT NOT NULL DEFAULT '',
+        file_inrev_path TEXT NOT NULL DEFAULT '',
+
+        file_wip_drw_path TEXT NOT NULL DEFAULT '',
+        file_rel_drw_path TEXT NOT NULL DEFAULT '',
+        file_inrev_drw_path TEXT NOT NULL DEFAULT '',
+
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    """)
+    # Legacy documents: colonne aggiunte nel tempo
+    cols = _table_columns(c, "documents")
+    for col, ddl in (
+        ("obs_prev_state", "TEXT NOT NULL DEFAULT ''"),
+        ("checked_out", "INTEGER NOT NULL DEFAULT 0"),
+        ("checkout_owner_user", "TEXT NOT NULL DEFAULT ''"),
+        ("checkout_owner_host", "TEXT NOT NULL DEFAULT ''"),
+        ("checkout_at", "TEXT NOT NULL DEFAULT ''"),
+    ):
+        if col not in cols:
+            c.execute(f"ALTER TABLE documents ADD COLUMN {col} {ddl};")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS doc_custom_values(
+        code TEXT NOT NULL,
+        prop_name TEXT NOT NULL,
+        value TEXT NOT NULL DEFAULT '',
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY(code, prop_name)
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_doc_custom_values_prop ON doc_custom_values(prop_name);")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS document_state_notes(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        from_state TEXT NOT NULL,
+        to_state TEXT NOT NULL,
+        note TEXT NOT NULL,
+        rev_before INTEGER NOT NULL DEFAULT 0,
+        rev_after INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_document_state_notes_code_time ON document_state_notes(code, created_at DESC);")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS document_locks(
+        code TEXT PRIMARY KEY,
+        owner_session TEXT NOT NULL,
+        owner_user TEXT NOT NULL DEFAULT '',
+        owner_host TEXT NOT NULL DEFAULT '',
+        acquired_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        expires_at TEXT NOT NULL
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_document_locks_expires ON document_locks(expires_at);")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS activity_log(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        workspace_id TEXT NOT NULL DEFAULT '',
+        session_id TEXT NOT NULL DEFAULT '',
+        user_id TEXT NOT NULL DEFAULT '',
+        user_display TEXT NOT NULL DEFAULT '',
+        host TEXT NOT NULL DEFAULT '',
+        action TEXT NOT NULL,
+        code TEXT NOT NULL DEFAULT '',
+        status TEXT NOT NULL DEFAULT 'OK',
+        message TEXT NOT NULL DEFAULT '',
+        details_json TEXT NOT NULL DEFAULT ''
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_log_time ON activity_log(created_at DESC, id DESC);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_log_action ON activity_log(action);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_log_code ON activity_log(code);")
+
+
+_FTS_PROPS_SQL = "COALESCE((SELECT group_concat(v.value, ' ') FROM doc_custom_values v WHERE v.code={ref}), '')"
+
+# trigger FTS delle versioni 2-8: rimossi da _m008/_m009 (vedi _m009_documents_fts_sync)
+_FTS_TRIGGERS = (
+    "trg_documents_fts_ai", "trg_documents_fts_au", "trg_documents_fts_ad",
+    "trg_doc_custom_values_fts_insert", "trg_doc_custom_values_fts_update", "trg_doc_custom_values_fts_delete",
+)
+
+
+def rebuild_fts(c: sqlite3.Cursor) -> None:
+    c.execute("DELETE FROM documents_fts;")
+    c.execute(f"""
+    INSERT INTO documents_fts(rowid, code, description, props)
+    SELECT d.id, d.code, d.description, {_FTS_PROPS_SQL.format(ref="d.code")}
+    FROM documents d;
+    """)
+    mark_fts_synced(c)
+
+
+def reindex_fts(c: sqlite3.Cursor, codes: List[str], purge_deleted: bool = False) -> None:
+    """Reindicizza i documenti `codes`; purge_deleted rimuove le righe di documenti eliminati."""
+    for i in range(0, len(codes), 400):
+        ch = codes[i:i + 400]
+        marks = ",".join("?" * len(ch))
+        c.execute(f"DELETE FROM documents_fts WHERE rowid IN (SELECT id FROM documents WHERE code IN ({marks}));", tuple(ch))
+        c.execute(f"""
+        INSERT INTO documents_fts(rowid, code, description, props)
+        SELECT d.id, d.code, d.description, {_FTS_PROPS_SQL.format(ref="d.code")}
+        FROM documents d WHERE d.code IN ({marks});
+        """, tuple(ch))
+    if purge_deleted:
+        c.execute("DELETE FROM documents_fts WHERE rowid NOT IN (SELECT id FROM documents);")
+
+
+def fts_synced_version(c: sqlite3.Cursor) -> int:
+    row = c.execute("SELECT version FROM fts_sync_state WHERE name='documents_fts';").fetchone()
+    return int(row[0]) if row else 0
+
+
+def mark_fts_synced(c: sqlite3.Cursor, version: Optional[int] = None) -> None:
+    """Registra fino a quale versione di doc_changes l'indice FTS e allineato."""
+    if version is None:
+        row = c.execute("SELECT seq FROM sqlite_sequence WHERE name='doc_changes';").fetchone()
+        version = int(row[0]) if row else 0
+    c.execute("INSERT OR REPLACE INTO fts_sync_state(name, version) VALUES('documents_fts', ?);", (int(version),))
+
+
+def _drop_fts_triggers(c: sqlite3.Cursor) -> None:
+    for name in _FTS_TRIGGERS:
+        c.execute(f"DROP TRIGGER IF EXISTS {name};")
+
+
+def _m002_documents_fts(c: sqlite3.Cursor) -> None:
+    """Indice full-text (FTS5) su codice, descrizione e valori custom.
+
+    Non crea piu nulla: l'indice (trigram) viene costruito una sola volta da
+    ensure_documents_fts al primo uso, se la build SQLite lo supporta, e
+    allineato dal journal doc_changes (vedi _m009_documents_fts_sync).
+    """
+
+
+def _create_documents_fts(c: sqlite3.Cursor, tokenize: str) -> None:
+    """Tabella documents_fts popolata con i documenti attuali (nessun trigger)."""
+    c.execute(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        code, description, props, tokenize='{tokenize}'
+    );
+    """)
+    rebuild_fts(c)
+
+
+def fts_tokenizer_available(c: sqlite3.Cursor, tokenize: str) -> bool:
+    """True se la build SQLite ha FTS5 con il tokenizer indicato (prova su tabella temp)."""
+    try:
+        c.execute(f"CREATE VIRTUAL TABLE temp.pdm_fts_probe USING fts5(x, tokenize='{tokenize}');")
+        c.execute("DROP TABLE temp.pdm_fts_probe;")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _m003_documents_keyset_index(c: sqlite3.Cursor) -> None:
+    """Indice per la paginazione keyset (updated_at DESC, id DESC)."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_updated_id ON documents(updated_at DESC, id DESC);")
+
+
+# (tabella, chiave journal per new/old) delle tabelle tracciate in doc_changes
+_CHANGE_FEED_TABLES = (
+    ("documents", "{ref}.code"),
+    ("doc_custom_values", "{ref}.code"),
+    ("document_locks", "{ref}.code"),
+    ("groups", "{ref}.mmm || '/' || {ref}.gggg"),
+    ("machines", "{ref}.mmm"),
+)
+
+
+def _m004_doc_changes(c: sqlite3.Cursor) -> None:
+    """Journal modifiche (change feed) per refresh incrementali della UI.
+
+    Ogni INSERT/UPDATE/DELETE sulle tabelle tracciate aggiunge una riga con
+    versione crescente (AUTOINCREMENT: mai riusata, anche dopo pulizia).
+    """
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS doc_changes(
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        key TEXT NOT NULL,
+        op TEXT NOT NULL,
+        changed_at TEXT NOT NULL
+    );
+    """)
+    now_sql = "strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')"
+    for table, key in _CHANGE_FEED_TABLES:
+        for ev, ref, op in (("INSERT", "new", "I"), ("UPDATE", "new", "U"), ("DELETE", "old", "D")):
+            c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_{ev.lower()} AFTER {ev} ON {table} BEGIN
+                INSERT INTO doc_changes(entity, key, op, changed_at)
+                VALUES('{table}', {key.format(ref=ref)}, '{op}', {now_sql});
+            END;
+            """)
+        # cambio chiave (es. rinomina codice): la vecchia chiave sparisce
+        old_key, new_key = key.format(ref="old"), key.format(ref="new")
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_rekey AFTER UPDATE ON {table}
+        WHEN {old_key} IS NOT {new_key} BEGIN
+            INSERT INTO doc_changes(entity, key, op, changed_at)
+            VALUES('{table}', {old_key}, 'D', {now_sql});
+        END;
+        """)
+
+
+def _m005_file_checksums(c: sqlite3.Cursor) -> None:
+    """Registro SHA-256 dei file REL/REV, calcolato durante la copia.
+
+    role: REL_MODEL, REL_DRW (file corrente alla revisione) e REV_MODEL,
+    REV_DRW (copia storica in REV).
+    """
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS file_checksums(
+        code TEXT NOT NULL,
+        revision INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        path TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        recorded_at TEXT NOT NULL,
+        verified_at TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY(code, revision, role)
+    );
+    """)
+
+
+def _m006_workflow_intents(c: sqlite3.Cursor) -> None:
+    """Giornale write-ahead delle transizioni workflow.
+
+    wf_intents.status: PENDING (operazioni file in corso), FILES_DONE (file
+    completati, documento da salvare), DONE, ROLLED_BACK, FAILED, ABANDONED
+    (DB ripristinato da backup: mai ripreso).
+    wf_intent_steps.op: COPY (nuovo file), REPLACE (sovrascrive; restore_from
+    per annullare), MOVE, DELETE (pulizia dopo FILES_DONE, non annullabile).
+    """
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS wf_intents(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT NOT NULL,
+        action TEXT NOT NULL,
+        status TEXT NOT NULL,
+        session_id TEXT NOT NULL DEFAULT '',
+        host TEXT NOT NULL DEFAULT '',
+        payload_json TEXT NOT NULL DEFAULT '{}',
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_wf_intents_status ON wf_intents(status);")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS wf_intent_steps(
+        intent_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        src TEXT NOT NULL DEFAULT '',
+        dst TEXT NOT NULL DEFAULT '',
+        restore_from TEXT NOT NULL DEFAULT '',
+        status TEXT NOT NULL DEFAULT 'PLANNED',
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY(intent_id, seq)
+    );
+    """)
+
+
+def _m007_archive_migration_jobs(c: sqlite3.Cursor) -> None:
+    """Piano persistente della migrazione layout archivio (ripresa dopo interruzione).
+
+    jobs.status: RUNNING, INCOMPLETE, DONE, ABANDONED (sostituito da un piano nuovo).
+    moves.status: PLANNED, DONE, MISSING, CONFLICT, ERROR.
+    updates: campi percorso da scrivere su documents a spostamenti completati
+    (status PLANNED, DONE, SKIPPED se il documento e cambiato dopo il piano).
+    """
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS archive_migration_jobs(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        archive_root TEXT NOT NULL,
+        status TEXT NOT NULL,
+        conflicts_json TEXT NOT NULL DEFAULT '[]',
+        docs_scanned INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS archive_migration_moves(
+        job_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        code TEXT NOT NULL,
+        reason TEXT NOT NULL,
+        src TEXT NOT NULL,
+        dst TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'PLANNED',
+        error TEXT NOT NULL DEFAULT '',
+        updated_at TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY(job_id, seq)
+    );
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS archive_migration_updates(
+        job_id INTEGER NOT NULL,
+        code TEXT NOT NULL,
+        fields_json TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'PLANNED',
+        PRIMARY KEY(job_id, code)
+    );
+    """)
+
+
+def _m008_documents_fts_trigram(c: sqlite3.Cursor) -> None:
+    """Indice FTS5 con tokenizer trigram: MATCH trova sottostringhe come LIKE.
+
+    Con unicode61 MATCH trovava solo prefissi di token ('RPA' non trovava
+    ABC_GRPA-0001). L'indice unicode61 e i suoi trigger vengono rimossi;
+    quello trigram lo crea ensure_documents_fts al primo uso.
+    """
+    _drop_fts_triggers(c)
+    row = c.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='documents_fts';").fetchone()
+    if row is not None and "trigram" not in str(row[0] or "").lower():
+        c.execute("DROP TABLE documents_fts;")
+
+
+def _m009_documents_fts_sync(c: sqlite3.Cursor) -> None:
+    """Indice FTS allineato dal journal doc_changes invece che da trigger.
+
+    I trigger sulle tabelle condivise facevano fallire ogni scrittura dei
+    client senza fts5/trigram ("no such module"). Ora chi cerca con FTS
+    reindicizza i codici cambiati dopo fts_sync_state.version (Store).
+    """
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS fts_sync_state(
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    );
+    """)
+    _drop_fts_triggers(c)
+    row = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='documents_fts';").fetchone()
+    if row is not None:
+        mark_fts_synced(c)  # fin qui l'indice era tenuto allineato dai trigger
+
+
+def ensure_documents_fts(conn: sqlite3.Connection) -> bool:
+    """True se c'e l'indice FTS trigram; se manca e la build lo supporta lo crea.
+
+    Copre i DB nuovi e quelli migrati quando SQLite non aveva FTS5/trigram:
+    l'indice si costruisce una volta sola, qui.
+    """
+    cur = conn.cursor()
+
+    def _has_trigram() -> bool:
+        row = cur.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='documents_fts';").fetchone()
+        return row is not None and "trigram" in str(row[0] or "").lower()
+
+    if _has_trigram():
+        return True
+    if not fts_tokenizer_available(cur, "trigram"):
+        return False
+    try:
+        cur.execute("BEGIN IMMEDIATE;")
+        if not _has_trigram():  # un altro client potrebbe averlo creato nel frattempo
+            cur.execute("DROP TABLE IF EXISTS documents_fts;")
+            _create_documents_fts(cur, "trigram")
+        conn.commit()
+        return True
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return False
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "base_schema", _m001_base_schema),
+    (2, "documents_fts", _m002_documents_fts),
+    (3, "documents_keyset_index", _m003_documents_keyset_index),
+    (4, "doc_changes", _m004_doc_changes),
+    (5, "file_checksums", _m005_file_checksums),
+    (6, "workflow_intents", _m006_workflow_intents),
+    (7, "archive_migration_jobs", _m007_archive_migration_jobs),
+    (8, "documents_fts_trigram", _m008_documents_fts_trigram),
+    (9, "documents_fts_sync", _m009_documents_fts_sync),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_user_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version;").fetchone()[0] or 0)
+
+
+def apply_migrations(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Porta il DB a SCHEMA_VERSION applicando le migrazioni mancanti in ordine.
+
+    Ritorna un report con tempi e migrazioni applicate.
+    """
+    t0 = time.perf_counter()
+    from_version = get_user_version(conn)
+    report: Dict[str, Any] = {
+        "from_version": from_version,
+        "to_version": from_version,
+        "applied": [],
+        "check_ms": 0.0,
+        "migrate_ms": 0.0,
+    }
+    report["check_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    if from_version >= SCHEMA_VERSION:
+        return report
+
+    # journal_mode e persistente nel file DB: basta impostarlo quando si migra
+    # (e va fatto fuori transazione).
+    try:
+        conn.execute("PRAGMA journal_mode=WAL;")
+    except Exception:
+        pass
+
+    t1 = time.perf_counter()
+    for version, name, fn in MIGRATIONS:
+        if version <= report["to_version"]:
+            continue
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE;")
+            # un altro client potrebbe aver migrato nel frattempo
+            current = get_user_version(conn)
+            if current >= version:
+                conn.commit()
+                report["to_version"] = current
+                continue
+            ms0 = time.perf_counter()
+            fn(cur)
+            cur.execute(f"PRAGMA user_version={int(version)};")
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        report["to_version"] = version
+        report["applied"].append(
+            {"version": version, "name": name, "ms": round((time.perf_counter() - ms0) * 1000.0, 3)}
+        )
+    report["migrate_ms"] = round((time.perf_counter() - t1) * 1000.0, 3)
+    return report
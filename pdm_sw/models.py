@@ -1,15 +1,42 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Literal
+from dataclasses import dataclass, fields
+from typing import Literal, Tuple
 
 
 DocType = Literal["PART", "ASSY", "MACHINE", "GROUP"]
 State = Literal["WIP", "REL", "IN_REV", "OBS"]
 
 
+class _DocumentPaths:
+    """Helper percorsi comuni a Document e DocumentRow."""
+
+    __slots__ = ()
+
+    def best_path_for_state(self) -> str:
+        if self.state == "WIP":
+            return self.file_wip_path
+        if self.state == "IN_REV":
+            return self.file_inrev_path or self.file_rel_path
+        return self.file_rel_path or self.file_wip_path
+
+    def best_drw_path_for_state(self) -> str:
+        if self.state == "WIP":
+            return self.file_wip_drw_path
+        if self.state == "IN_REV":
+            return self.file_inrev_drw_path or self.file_rel_drw_path
+        return self.file_rel_drw_path or self.file_wip_drw_path
+
+    # Compat alias (vecchie chiamate)
+    def best_model_path_for_state(self) -> str:
+        return self.best_path_for_state()
+
+    def best_drawing_path_for_state(self) -> str:
+        return self.best_drw_path_for_state()
+
+
 @dataclass
-class Document:
+class Document(_DocumentPaths):
     id: int
     code: str
     doc_type: DocType
@@ -36,23 +63,61 @@ class Document:
     checkout_owner_host: str = ""
     checkout_at: str = ""
 
-    def best_path_for_state(self) -> str:
-        if self.state == "WIP":
-            return self.file_wip_path
-        if self.state == "IN_REV":
-            return self.file_inrev_path or self.file_rel_path
-        return self.file_rel_path or self.file_wip_path
 
-    def best_drw_path_for_state(self) -> str:
-        if self.state == "WIP":
-            return self.file_wip_drw_path
-        if self.state == "IN_REV":
-            return self.file_inrev_drw_path or self.file_rel_drw_path
-        return self.file_rel_drw_path or self.file_wip_drw_path
+# Ordine campi di Document (e dei valori posizionali di DocumentRow)
+DOCUMENT_FIELDS: Tuple[str, ...] = tuple(f.name for f in fields(Document))
 
-    # Compat alias (vecchie chiamate)
-    def best_model_path_for_state(self) -> str:
-        return self.best_path_for_state()
 
-    def best_drawing_path_for_state(self) -> str:
-        return self.best_drw_path_for_state()
+class DocumentRow(_DocumentPaths):
+    """Documento letto da query di elenco/ricerca.
+
+    Stessi attributi e helper di Document ma con __slots__: niente dict per
+    riga e nessuna conversione, i valori arrivano gia tipizzati da SQLite
+    (vedi Store._doc_row_factory). Gli attributi restano modificabili.
+    """
+
+    __slots__ = DOCUMENT_FIELDS
+
+    def __init__(
+        self, id, code, doc_type, mmm, gggg, seq, vvv, revision, state, description,
+        file_wip_path, file_rel_path, file_inrev_path,
+        file_wip_drw_path, file_rel_drw_path, file_inrev_drw_path,
+        created_at, updated_at,
+        obs_prev_state="", checked_out=False, checkout_owner_user="", checkout_owner_host="", checkout_at="",
+    ):
+        self.id = id
+        self.code = code
+        self.doc_type = doc_type
+        self.mmm = mmm
+        self.gggg = gggg
+        self.seq = seq
+        self.vvv = vvv or ""
+        self.revision = revision
+        self.state = state
+        self.description = description
+        self.file_wip_path = file_wip_path
+        self.file_rel_path = file_rel_path
+        self.file_inrev_path = file_inrev_path
+        self.file_wip_drw_path = file_wip_drw_path
+        self.file_rel_drw_path = file_rel_drw_path
+        self.file_inrev_drw_path = file_inrev_drw_path
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.obs_prev_state = obs_prev_state
+        self.checked_out = bool(checked_out)
+        self.checkout_owner_user = checkout_owner_user
+        self.checkout_owner_host = checkout_owner_host
+        self.checkout_at = checkout_at
+
+    def __repr__(self) -> str:
+        return f"DocumentRow(id={self.id!r}, code={self.code!r}, state={self.state!r}, revision={self.revision!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (Document, DocumentRow)):
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in DOCUMENT_FIELDS)
+
+    __hash__ = None  # come Document (dataclass mutabile)
+
+    def to_document(self) -> Document:
+        return Document(**{n: getattr(self, n) for n in DOCUMENT_FIELDS})
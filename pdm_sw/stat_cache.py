@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+# TTL elenco cartella: oltre, la cartella viene riletta al primo accesso
+DEFAULT_TTL_S = 15.0
+
+
+def _norm(p: str) -> str:
+    return os.path.normcase(os.path.normpath(p))
+
+
+class DirListingCache:
+    """Cache esistenza file basata sull'elenco delle cartelle.
+
+    Invece di uno stat per percorso (2 per riga nelle tabelle documenti, su
+    share SMB), legge ogni cartella con un solo os.scandir e tiene l'elenco
+    dei file per `ttl_s` secondi. Le funzioni safe_* dell'archivio
+    invalidano le cartelle che toccano.
+    """
+
+    def __init__(self, ttl_s: float = DEFAULT_TTL_S):
+        self.ttl_s = float(ttl_s)
+        self._dirs: Dict[str, Tuple[float, Optional[Set[str]]]] = {}
+        self._lock = threading.Lock()
+        self.scans = 0
+
+    def _listing(self, folder: str) -> Optional[Set[str]]:
+        """Nomi file (normcase) della cartella; None se non leggibile."""
+        now = time.monotonic()
+        with self._lock:
+            hit = self._dirs.get(folder)
+        if hit is not None and (now - hit[0]) < self.ttl_s:
+            return hit[1]
+        names: Optional[Set[str]]
+        try:
+            with os.scandir(folder) as it:
+                names = {os.path.normcase(e.name) for e in it if e.is_file()}
+        except (FileNotFoundError, NotADirectoryError):
+            names = set()
+        except OSError:
+            names = None  # es. accesso negato: si ripiega su stat diretto
+        self.scans += 1
+        with self._lock:
+            self._dirs[folder] = (now, names)
+        return names
+
+    def prefetch(self, paths: Iterable[str]) -> None:
+        """Legge in anticipo le cartelle dei percorsi dati (una scansione per cartella)."""
+        folders = {os.path.dirname(_norm(str(p))) for p in paths if p}
+        for folder in folders:
+            if folder:
+                self._listing(folder)
+
+    def is_file(self, path: str) -> bool:
+        if not path:
+            return False
+        p = _norm(str(path))
+        folder, name = os.path.split(p)
+        names = self._listing(folder) if folder else None
+        if names is None:
+            return Path(path).is_file()
+        return name in names
+
+    def invalidate(self, path: str | Path) -> None:
+        """Scarta la cartella che contiene `path` (e la cartella stessa se e una directory)."""
+        p = _norm(str(path))
+        with self._lock:
+            self._dirs.pop(os.path.dirname(p), None)
+            self._dirs.pop(p, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dirs.clear()
+
+
+STAT_CACHE = DirListingCache()
+
+
+def invalidate_path(path: str | Path) -> None:
+    STAT_CACHE.invalidate(path)
@@ -2,11 +2,24 @@ from __future__ import annotations
 
 import sqlite3
 import json
+import operator
+import time
 from pathlib import Path
-from typing import List, Optional, Tuple, Dict, Any
+from typing import List, Optional, Tuple, Dict, Any, Iterator, Callable, Sequence
+from contextlib import contextmanager
+from dataclasses import MISSING, fields
 from datetime import datetime, timedelta
 
-from .models import Document, DocType, State
+from .models import Document, DocumentRow, DOCUMENT_FIELDS, DocType, State
+from .migrations import (
+    apply_migrations,
+    ensure_documents_fts,
+    fts_synced_version,
+    mark_fts_synced,
+    rebuild_fts,
+    reindex_fts,
+)
+from .wf_journal import WorkflowJournal, recover_intents
 
 
 def _now() -> str:
@@ -18,14 +31,53 @@ def _now_plus(seconds: int) -> str:
     return (datetime.now() + timedelta(seconds=s)).isoformat(timespec="seconds")
 
 
+# modifiche oltre le quali l'indice FTS si ricostruisce invece di reindicizzare per codice
+FTS_SYNC_MAX_CHANGES = 5000
+
+DOCUMENT_INSERT_SQL = """
+INSERT INTO documents(
+    code, doc_type, mmm, gggg, seq, vvv, revision, state, description,
+    checked_out, checkout_owner_user, checkout_owner_host, checkout_at,
+    file_wip_path, file_rel_path, file_inrev_path,
+    file_wip_drw_path, file_rel_drw_path, file_inrev_drw_path,
+    created_at, updated_at
+) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+
+ACTIVITY_INSERT_SQL = """
+INSERT INTO activity_log(
+    created_at, workspace_id, session_id, user_id, user_display, host, action, code, status, message, details_json
+) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+
 class Store:
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, recover_intents: bool = False):
+        """recover_intents: completa/annulla le transizioni workflow interrotte.
+
+        Il ripristino sposta e sovrascrive file CAD in archivio: lo chiedono
+        solo app desktop e macro, non i tool CLI o i benchmark.
+        """
+        t0 = time.perf_counter()
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self.conn = sqlite3.connect(str(self.db_path), timeout=30.0)
         self.conn.row_factory = sqlite3.Row
         self.dirty = False
+        self._fts_enabled: Optional[bool] = None
+        self._tx_depth = 0
+        self.open_stats: Dict[str, Any] = {}
         self._init_db()
+        self.open_stats["open_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+        # transizioni workflow interrotte (crash/rete): completate o annullate
+        if recover_intents:
+            try:
+                recovered = self.recover_workflow_intents()
+                if recovered:
+                    self.open_stats["recovered_intents"] = recovered
+            except Exception:
+                pass
 
     def close(self) -> None:
         try:
@@ -34,177 +86,137 @@ class Store:
             pass
 
     def _init_db(self) -> None:
-        c = self.conn.cursor()
-        c.execute("PRAGMA busy_timeout=30000;")
-        try:
-            c.execute("PRAGMA journal_mode=WAL;")
-        except Exception:
-            pass
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS machines(
-            mmm TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        );
-        """)
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS groups(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mmm TEXT NOT NULL,
-            gggg TEXT NOT NULL,
-            name TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            UNIQUE(mmm, gggg),
-            FOREIGN KEY(mmm) REFERENCES machines(mmm) ON DELETE CASCADE
-        );
-        """)
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS seq_counters(
-            mmm TEXT NOT NULL,
-            gggg TEXT NOT NULL,
-            vvv TEXT NOT NULL DEFAULT '',
-            next_part INTEGER NOT NULL,
-            next_assy INTEGER NOT NULL,
-            PRIMARY KEY(mmm, gggg, vvv)
-        );
-        """)
-        # Migrazione seq_counters: da PK(mmm, gggg) a PK(mmm, gggg, vvv)
+        # busy timeout gia impostato da connect(timeout=30); lo schema e gestito
+        # dalle migrazioni versionate (PRAGMA user_version).
+        self.open_stats = apply_migrations(self.conn)
+
+    @property
+    def fts_enabled(self) -> bool:
+        """Indice FTS usabile per la ricerca: solo con tokenizer trigram (sottostringhe come LIKE).
+
+        Se manca ma la build SQLite ha FTS5/trigram viene creato al primo uso.
+        """
+        if self._fts_enabled is None:
+            try:
+                if self.in_transaction:
+                    row = self.conn.execute(
+                        "SELECT sql FROM sqlite_master WHERE type='table' AND name='documents_fts';"
+                    ).fetchone()
+                    return row is not None and "trigram" in str(row[0] or "").lower()
+                self._fts_enabled = ensure_documents_fts(self.conn)
+            except Exception:
+                self._fts_enabled = False
+        return bool(self._fts_enabled)
+
+    def sync_fts(self) -> bool:
+        """Allinea l'indice FTS alle modifiche del journal doc_changes (anche di altri client).
+
+        Reindicizza solo i codici cambiati; oltre FTS_SYNC_MAX_CHANGES o con
+        journal potato ricostruisce. False (ricerca su LIKE) dentro una
+        transazione aperta o se l'allineamento fallisce.
+        """
+        if self.in_transaction:
+            return False
         try:
-            cols = [r["name"] for r in self.conn.execute("PRAGMA table_info(seq_counters);").fetchall()]
-            if "vvv" not in cols:
-                c.execute("""
-                CREATE TABLE IF NOT EXISTS seq_counters_new(
-                    mmm TEXT NOT NULL,
-                    gggg TEXT NOT NULL,
-                    vvv TEXT NOT NULL DEFAULT '',
-                    next_part INTEGER NOT NULL,
-                    next_assy INTEGER NOT NULL,
-                    PRIMARY KEY(mmm, gggg, vvv)
-                );
-                """)
-                c.execute("INSERT INTO seq_counters_new(mmm, gggg, vvv, next_part, next_assy) SELECT mmm, gggg, '' as vvv, next_part, next_assy FROM seq_counters;")
-                c.execute("DROP TABLE seq_counters;")
-                c.execute("ALTER TABLE seq_counters_new RENAME TO seq_counters;")
+            if fts_synced_version(self.conn.cursor()) >= self.change_version():
+                return True
+            with self.transaction():
+                cur = self.conn.cursor()
+                changes = self.changes_since(fts_synced_version(cur), limit=FTS_SYNC_MAX_CHANGES)
+                if changes["reset"]:
+                    rebuild_fts(cur)
+                else:
+                    rows = [x for x in changes["changes"] if x["entity"] in ("documents", "doc_custom_values")]
+                    reindex_fts(
+                        cur,
+                        list(dict.fromkeys(x["key"] for x in rows)),
+                        purge_deleted=any(x["entity"] == "documents" and x["op"] == "D" for x in rows),
+                    )
+                    mark_fts_synced(cur, changes["version"])
+            return True
         except Exception:
-            pass
+            return False
+
+    def open_report(self) -> str:
+        """Riepilogo leggibile dei tempi di apertura/migrazione DB."""
+        st = self.open_stats or {}
+        applied = ", ".join(f"{m['version']}:{m['name']} ({m['ms']} ms)" for m in st.get("applied", [])) or "nessuna"
+        return (
+            f"DB {self.db_path.name} | schema v{st.get('from_version', '?')} -> v{st.get('to_version', '?')} | "
+            f"open {st.get('open_ms', 0)} ms | check {st.get('check_ms', 0)} ms | "
+            f"migrate {st.get('migrate_ms', 0)} ms | migrazioni: {applied}"
+            + (f" | transizioni ripristinate: {len(st['recovered_intents'])}" if st.get("recovered_intents") else "")
+        )
+
+    @staticmethod
+    def _fts_match_expr(query: str) -> str:
+        """Converte il testo libero in espressione MATCH FTS5 (tokenizer trigram).
 
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS ver_counters(
-            mmm TEXT NOT NULL,
-            gggg TEXT NOT NULL DEFAULT '',
-            doc_type TEXT NOT NULL,
-            next_ver INTEGER NOT NULL DEFAULT 1,
-            PRIMARY KEY(mmm, gggg, doc_type)
-        );
-        """)
-
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS documents(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            code TEXT NOT NULL UNIQUE,
-            doc_type TEXT NOT NULL,
-            mmm TEXT NOT NULL,
-            gggg TEXT NOT NULL,
-            seq INTEGER NOT NULL,
-            vvv TEXT NOT NULL DEFAULT '',
-            revision INTEGER NOT NULL DEFAULT 0,
-            state TEXT NOT NULL DEFAULT 'WIP',
-            obs_prev_state TEXT NOT NULL DEFAULT '',
-            description TEXT NOT NULL DEFAULT '',
-            checked_out INTEGER NOT NULL DEFAULT 0,
-            checkout_owner_user TEXT NOT NULL DEFAULT '',
-            checkout_owner_host TEXT NOT NULL DEFAULT '',
-            checkout_at TEXT NOT NULL DEFAULT '',
-
-            file_wip_path TEXT NOT NULL DEFAULT '',
-            file_rel_path TEXT NOT NULL DEFAULT '',
-            file_inrev_path TEXT NOT NULL DEFAULT '',
-
-            file_wip_drw_path TEXT NOT NULL DEFAULT '',
-            file_rel_drw_path TEXT NOT NULL DEFAULT '',
-            file_inrev_drw_path TEXT NOT NULL DEFAULT '',
-
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL
-        );
-        """)
-
-        # Migrazione documents: aggiunta obs_prev_state
+        Ogni parola diventa una frase, cioe una sottostringa (es. 'RPA' trova
+        ABC_GRPA-0001), parole in AND. "" (ricerca LIKE) se una parola ha meno
+        di 3 caratteri: il trigram non la troverebbe.
+        """
+        terms = []
+        for t in (query or "").split():
+            if not any(ch.isalnum() for ch in t):
+                continue
+            if len(t) < 3:
+                return ""
+            terms.append('"' + t.replace('"', '""') + '"')
+        return " ".join(terms)
+
+    # --- transazioni
+    @contextmanager
+    def transaction(self) -> Iterator["Store"]:
+        """Unit of work: raggruppa piu scritture in un solo commit.
+
+        Il livello esterno apre BEGIN IMMEDIATE, i livelli annidati usano
+        SAVEPOINT (rollback parziale se il blocco interno fallisce). Dentro una
+        transazione i metodi dello Store non fanno commit propri; quelli che
+        intercettano l'errore (checkout, lock, contatori) girano in un blocco
+        annidato, cosi un fallimento annulla solo le loro scritture.
+        """
+        cur = self.conn.cursor()
+        sp = ""
+        if self._tx_depth == 0:
+            cur.execute("BEGIN IMMEDIATE;")
+        else:
+            sp = f"pdm_sp_{self._tx_depth}"
+            cur.execute(f"SAVEPOINT {sp};")
+        self._tx_depth += 1
         try:
-            cols = [r["name"] for r in self.conn.execute("PRAGMA table_info(documents);").fetchall()]
-            if "obs_prev_state" not in cols:
-                c.execute("ALTER TABLE documents ADD COLUMN obs_prev_state TEXT NOT NULL DEFAULT '';")
-            if "checked_out" not in cols:
-                c.execute("ALTER TABLE documents ADD COLUMN checked_out INTEGER NOT NULL DEFAULT 0;")
-            if "checkout_owner_user" not in cols:
-                c.execute("ALTER TABLE documents ADD COLUMN checkout_owner_user TEXT NOT NULL DEFAULT '';")
-            if "checkout_owner_host" not in cols:
-                c.execute("ALTER TABLE documents ADD COLUMN checkout_owner_host TEXT NOT NULL DEFAULT '';")
-            if "checkout_at" not in cols:
-                c.execute("ALTER TABLE documents ADD COLUMN checkout_at TEXT NOT NULL DEFAULT '';")
+            yield self
+        except BaseException:
+            self._tx_depth -= 1
+            try:
+                if sp:
+                    cur.execute(f"ROLLBACK TO {sp};")
+                    cur.execute(f"RELEASE {sp};")
+                else:
+                    self.conn.rollback()
+            except Exception:
+                pass
+            raise
+        self._tx_depth -= 1
+        if sp:
+            cur.execute(f"RELEASE {sp};")
+            return
+        try:
+            self.conn.commit()
         except Exception:
-            pass
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+            raise
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._tx_depth > 0
 
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS doc_custom_values(
-            code TEXT NOT NULL,
-            prop_name TEXT NOT NULL,
-            value TEXT NOT NULL DEFAULT '',
-            updated_at TEXT NOT NULL,
-            PRIMARY KEY(code, prop_name)
-        );
-        """)
-        c.execute("CREATE INDEX IF NOT EXISTS idx_doc_custom_values_prop ON doc_custom_values(prop_name);")
-
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS document_state_notes(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            code TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            event_type TEXT NOT NULL,
-            from_state TEXT NOT NULL,
-            to_state TEXT NOT NULL,
-            note TEXT NOT NULL,
-            rev_before INTEGER NOT NULL DEFAULT 0,
-            rev_after INTEGER NOT NULL DEFAULT 0
-        );
-        """)
-        c.execute("CREATE INDEX IF NOT EXISTS idx_document_state_notes_code_time ON document_state_notes(code, created_at DESC);")
-
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS document_locks(
-            code TEXT PRIMARY KEY,
-            owner_session TEXT NOT NULL,
-            owner_user TEXT NOT NULL DEFAULT '',
-            owner_host TEXT NOT NULL DEFAULT '',
-            acquired_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            expires_at TEXT NOT NULL
-        );
-        """)
-        c.execute("CREATE INDEX IF NOT EXISTS idx_document_locks_expires ON document_locks(expires_at);")
-
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS activity_log(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            created_at TEXT NOT NULL,
-            workspace_id TEXT NOT NULL DEFAULT '',
-            session_id TEXT NOT NULL DEFAULT '',
-            user_id TEXT NOT NULL DEFAULT '',
-            user_display TEXT NOT NULL DEFAULT '',
-            host TEXT NOT NULL DEFAULT '',
-            action TEXT NOT NULL,
-            code TEXT NOT NULL DEFAULT '',
-            status TEXT NOT NULL DEFAULT 'OK',
-            message TEXT NOT NULL DEFAULT '',
-            details_json TEXT NOT NULL DEFAULT ''
-        );
-        """)
-        c.execute("CREATE INDEX IF NOT EXISTS idx_activity_log_time ON activity_log(created_at DESC, id DESC);")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_activity_log_action ON activity_log(action);")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_activity_log_code ON activity_log(code);")
-
-        self.conn.commit()
+    def _commit(self) -> None:
+        if self._tx_depth == 0:
+            self.conn.commit()
 
     def _mark_dirty(self) -> None:
         self.dirty = True
@@ -221,7 +233,7 @@ class Store:
             self.conn.execute("PRAGMA wal_checkpoint(FULL);")
         except Exception:
             pass
-        self.conn.commit()
+        self._commit()
         with sqlite3.connect(str(dest_db_path)) as dest:
             self.conn.backup(dest)
 
@@ -235,12 +247,12 @@ class Store:
             "INSERT OR REPLACE INTO machines(mmm, name, created_at) VALUES(?, ?, ?);",
             (mmm, name, _now()),
         )
-        self.conn.commit()
+        self._commit()
         self._mark_dirty()
 
     def delete_machine(self, mmm: str) -> None:
         self.conn.execute("DELETE FROM machines WHERE mmm=?;", (mmm,))
-        self.conn.commit()
+        self._commit()
         self._mark_dirty()
 
     def list_groups(self, mmm: str) -> List[Tuple[str, str]]:
@@ -252,12 +264,12 @@ class Store:
             "INSERT OR REPLACE INTO groups(mmm, gggg, name, created_at) VALUES(?, ?, ?, ?);",
             (mmm, gggg, name, _now()),
         )
-        self.conn.commit()
+        self._commit()
         self._mark_dirty()
 
     def delete_group(self, mmm: str, gggg: str) -> None:
         self.conn.execute("DELETE FROM groups WHERE mmm=? AND gggg=?;", (mmm, gggg))
-        self.conn.commit()
+        self._commit()
         self._mark_dirty()
 
     # --- sequence allocation
@@ -268,9 +280,8 @@ class Store:
         elif dt in ("ASM", "ASSY", "SLDASM"):
             dt = "ASSY"
         doc_type = dt
-        cur = self.conn.cursor()
-        try:
-            cur.execute("BEGIN IMMEDIATE;")
+        with self.transaction():
+            cur = self.conn.cursor()
             row = cur.execute(
                 "SELECT next_part, next_assy FROM seq_counters WHERE mmm=? AND gggg=? AND vvv=?;",
                 (mmm, gggg, vvv),
@@ -299,17 +310,57 @@ class Store:
                 "UPDATE seq_counters SET next_part=?, next_assy=? WHERE mmm=? AND gggg=? AND vvv=?;",
                 (next_part, next_assy, mmm, gggg, vvv),
             )
-            self.conn.commit()
-        except Exception:
-            try:
-                self.conn.rollback()
-            except Exception:
-                pass
-            raise
         self._mark_dirty()
         return seq
 
 
+    def allocate_seq_range(self, mmm: str, gggg: str, vvv: str, doc_type: DocType, count: int) -> List[int]:
+        """Riserva in un'unica transazione un blocco contiguo di `count` progressivi.
+
+        PART crescenti da next_part, ASSY decrescenti da next_assy: il blocco
+        deve stare nello spazio libero fra i due contatori (nessuna collisione).
+        """
+        n = int(count or 0)
+        if n <= 0:
+            return []
+        dt = str(doc_type).upper()
+        if dt in ("PRT", "PART", "SLDPRT"):
+            dt = "PART"
+        elif dt in ("ASM", "ASSY", "SLDASM"):
+            dt = "ASSY"
+        doc_type = dt
+        with self.transaction():
+            cur = self.conn.cursor()
+            row = cur.execute(
+                "SELECT next_part, next_assy FROM seq_counters WHERE mmm=? AND gggg=? AND vvv=?;",
+                (mmm, gggg, vvv),
+            ).fetchone()
+            if row is None:
+                next_part, next_assy = 1, 9999
+                cur.execute(
+                    "INSERT INTO seq_counters(mmm, gggg, vvv, next_part, next_assy) VALUES(?, ?, ?, ?, ?);",
+                    (mmm, gggg, vvv, next_part, next_assy),
+                )
+            else:
+                next_part, next_assy = int(row["next_part"]), int(row["next_assy"])
+
+            free = max(0, min(next_assy, 9999) - max(next_part, 1) + 1)
+            if n > free:
+                raise ValueError(f"Sequenza {doc_type} insufficiente: richiesti {n}, liberi {free}")
+            if doc_type == "PART":
+                seqs = list(range(next_part, next_part + n))
+                next_part += n
+            else:
+                seqs = list(range(next_assy, next_assy - n, -1))
+                next_assy -= n
+
+            cur.execute(
+                "UPDATE seq_counters SET next_part=?, next_assy=? WHERE mmm=? AND gggg=? AND vvv=?;",
+                (next_part, next_assy, mmm, gggg, vvv),
+            )
+        self._mark_dirty()
+        return seqs
+
     def peek_seq(self, mmm: str, gggg: str, vvv: str, doc_type: DocType) -> int:
         dt = str(doc_type).upper()
         if dt in ("PRT", "PART", "SLDPRT"):
@@ -345,9 +396,8 @@ class Store:
         # MACHINE: gggg vuoto, GROUP: gggg valorizzato
         gggg_key = "" if dt == "MACHINE" else gggg
         
-        cur = self.conn.cursor()
-        try:
-            cur.execute("BEGIN IMMEDIATE;")
+        with self.transaction():
+            cur = self.conn.cursor()
             row = cur.execute(
                 "SELECT next_ver FROM ver_counters WHERE mmm=? AND gggg=? AND doc_type=?;",
                 (mmm, gggg_key, dt),
@@ -364,48 +414,57 @@ class Store:
                     "UPDATE ver_counters SET next_ver=? WHERE mmm=? AND gggg=? AND doc_type=?;",
                     (next_ver + 1, mmm, gggg_key, dt),
                 )
-            self.conn.commit()
-        except Exception:
-            try:
-                self.conn.rollback()
-            except Exception:
-                pass
-            raise
         self._mark_dirty()
         return next_ver
 
     # --- documents
     def add_document(self, doc: Document) -> int:
-        now = _now()
-        cur = self.conn.execute(
-            """
-            INSERT INTO documents(
-                code, doc_type, mmm, gggg, seq, vvv, revision, state, description,
-                checked_out, checkout_owner_user, checkout_owner_host, checkout_at,
-                file_wip_path, file_rel_path, file_inrev_path,
-                file_wip_drw_path, file_rel_drw_path, file_inrev_drw_path,
-                created_at, updated_at
-            ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-            """,
-            (
-                doc.code, doc.doc_type, doc.mmm, doc.gggg, doc.seq, doc.vvv, doc.revision, doc.state, doc.description,
-                (1 if bool(getattr(doc, "checked_out", False)) else 0),
-                str(getattr(doc, "checkout_owner_user", "") or ""),
-                str(getattr(doc, "checkout_owner_host", "") or ""),
-                str(getattr(doc, "checkout_at", "") or ""),
-                doc.file_wip_path, doc.file_rel_path, doc.file_inrev_path,
-                doc.file_wip_drw_path, doc.file_rel_drw_path, doc.file_inrev_drw_path,
-                now, now
-            )
-        )
-        self.conn.commit()
+        cur = self.conn.execute(DOCUMENT_INSERT_SQL, self._document_params(doc, _now()))
+        self._commit()
         self._mark_dirty()
         return int(cur.lastrowid)
 
+    def add_documents(self, docs: List[Document]) -> int:
+        """Inserisce piu documenti con executemany in un'unica transazione."""
+        if not docs:
+            return 0
+        now = _now()
+        with self.transaction():
+            self.conn.executemany(DOCUMENT_INSERT_SQL, [self._document_params(d, now) for d in docs])
+        self._mark_dirty()
+        return len(docs)
+
+    @staticmethod
+    def _document_params(doc: Document, now: str) -> Tuple[Any, ...]:
+        return (
+            doc.code, doc.doc_type, doc.mmm, doc.gggg, doc.seq, doc.vvv, doc.revision, doc.state, doc.description,
+            (1 if bool(getattr(doc, "checked_out", False)) else 0),
+            str(getattr(doc, "checkout_owner_user", "") or ""),
+            str(getattr(doc, "checkout_owner_host", "") or ""),
+            str(getattr(doc, "checkout_at", "") or ""),
+            doc.file_wip_path, doc.file_rel_path, doc.file_inrev_path,
+            doc.file_wip_drw_path, doc.file_rel_drw_path, doc.file_inrev_drw_path,
+            now, now
+        )
+
     def get_document(self, code: str) -> Optional[Document]:
         r = self.conn.execute("SELECT * FROM documents WHERE code=?;", (code,)).fetchone()
         return self._row_to_doc(r) if r else None
 
+    def get_documents(self, codes: Sequence[str]) -> Dict[str, Document]:
+        """Documenti per codice (query IN a blocchi); i codici assenti sono omessi."""
+        codes_u = list(dict.fromkeys(str(c).strip() for c in (codes or []) if str(c).strip()))
+        out: Dict[str, Document] = {}
+        for i in range(0, len(codes_u), 400):
+            ch = codes_u[i:i + 400]
+            rows = self.conn.execute(
+                f"SELECT * FROM documents WHERE code IN ({','.join(['?'] * len(ch))});", tuple(ch)
+            ).fetchall()
+            for r in rows:
+                d = self._row_to_doc(r)
+                out[d.code] = d
+        return out
+
     def update_document(self, code: str, **fields) -> None:
         if not fields:
             return
@@ -414,7 +473,7 @@ class Store:
         sql = "UPDATE documents SET " + ", ".join([f"{k}=?" for k in keys]) + " WHERE code=?;"
         vals = [fields[k] for k in keys] + [code]
         self.conn.execute(sql, vals)
-        self.conn.commit()
+        self._commit()
         self._mark_dirty()
 
     def checkout_document(self, code: str, owner_user: str, owner_host: str) -> Tuple[bool, str, Dict[str, str]]:
@@ -425,66 +484,57 @@ class Store:
             return False, "Codice mancante.", {}
 
         now = _now()
-        cur = self.conn.cursor()
         try:
-            cur.execute("BEGIN IMMEDIATE;")
-            row = cur.execute(
-                """
-                SELECT code, state, checked_out, checkout_owner_user, checkout_owner_host, checkout_at
-                FROM documents
-                WHERE code=?;
-                """,
-                (code_u,),
-            ).fetchone()
-            if row is None:
-                self.conn.commit()
-                return False, "Documento non trovato.", {}
-
-            state = str(row["state"] or "").strip().upper()
-            if state in ("REL", "OBS"):
-                self.conn.commit()
-                return False, f"Checkout non consentito su stato {state}.", {}
-
-            already = int(row["checked_out"] or 0) != 0
-            holder = {
-                "code": str(row["code"] or ""),
-                "checkout_owner_user": str(row["checkout_owner_user"] or ""),
-                "checkout_owner_host": str(row["checkout_owner_host"] or ""),
-                "checkout_at": str(row["checkout_at"] or ""),
-            }
-            if already:
-                holder_user = holder["checkout_owner_user"]
-                if holder_user and usr and holder_user == usr:
-                    cur.execute(
-                        """
-                        UPDATE documents
-                        SET checked_out=1, checkout_owner_user=?, checkout_owner_host=?, checkout_at=?, updated_at=?
-                        WHERE code=?;
-                        """,
-                        (usr, host, now, now, code_u),
-                    )
-                    self.conn.commit()
-                    self._mark_dirty()
-                    return True, "CHECKOUT_REFRESHED", holder
-                self.conn.commit()
-                return False, "CHECKOUT_BY_OTHER", holder
+            with self.transaction():
+                cur = self.conn.cursor()
+                row = cur.execute(
+                    """
+                    SELECT code, state, checked_out, checkout_owner_user, checkout_owner_host, checkout_at
+                    FROM documents
+                    WHERE code=?;
+                    """,
+                    (code_u,),
+                ).fetchone()
+                if row is None:
+                    return False, "Documento non trovato.", {}
+
+                state = str(row["state"] or "").strip().upper()
+                if state in ("REL", "OBS"):
+                    return False, f"Checkout non consentito su stato {state}.", {}
+
+                already = int(row["checked_out"] or 0) != 0
+                holder = {
+                    "code": str(row["code"] or ""),
+                    "checkout_owner_user": str(row["checkout_owner_user"] or ""),
+                    "checkout_owner_host": str(row["checkout_owner_host"] or ""),
+                    "checkout_at": str(row["checkout_at"] or ""),
+                }
+                if already:
+                    holder_user = holder["checkout_owner_user"]
+                    if holder_user and usr and holder_user == usr:
+                        cur.execute(
+                            """
+                            UPDATE documents
+                            SET checked_out=1, checkout_owner_user=?, checkout_owner_host=?, checkout_at=?, updated_at=?
+                            WHERE code=?;
+                            """,
+                            (usr, host, now, now, code_u),
+                        )
+                        self._mark_dirty()
+                        return True, "CHECKOUT_REFRESHED", holder
+                    return False, "CHECKOUT_BY_OTHER", holder
 
-            cur.execute(
-                """
-                UPDATE documents
-                SET checked_out=1, checkout_owner_user=?, checkout_owner_host=?, checkout_at=?, updated_at=?
-                WHERE code=?;
-                """,
-                (usr, host, now, now, code_u),
-            )
-            self.conn.commit()
-            self._mark_dirty()
-            return True, "CHECKOUT_OK", {}
+                cur.execute(
+                    """
+                    UPDATE documents
+                    SET checked_out=1, checkout_owner_user=?, checkout_owner_host=?, checkout_at=?, updated_at=?
+                    WHERE code=?;
+                    """,
+                    (usr, host, now, now, code_u),
+                )
+                self._mark_dirty()
+                return True, "CHECKOUT_OK", {}
         except Exception as e:
-            try:
-                self.conn.rollback()
-            except Exception:
-                pass
             return False, f"CHECKOUT_ERROR: {e}", {}
 
     def checkin_document(self, code: str, owner_user: str, force: bool = False) -> Tuple[bool, str, Dict[str, str]]:
@@ -494,56 +544,47 @@ class Store:
             return False, "Codice mancante.", {}
 
         now = _now()
-        cur = self.conn.cursor()
         try:
-            cur.execute("BEGIN IMMEDIATE;")
-            row = cur.execute(
-                """
-                SELECT code, checked_out, checkout_owner_user, checkout_owner_host, checkout_at
-                FROM documents
-                WHERE code=?;
-                """,
-                (code_u,),
-            ).fetchone()
-            if row is None:
-                self.conn.commit()
-                return False, "Documento non trovato.", {}
-
-            already = int(row["checked_out"] or 0) != 0
-            if not already:
-                self.conn.commit()
-                return True, "CHECKIN_ALREADY", {}
-
-            holder = {
-                "code": str(row["code"] or ""),
-                "checkout_owner_user": str(row["checkout_owner_user"] or ""),
-                "checkout_owner_host": str(row["checkout_owner_host"] or ""),
-                "checkout_at": str(row["checkout_at"] or ""),
-            }
-            holder_user = holder["checkout_owner_user"]
-            if (not force) and holder_user and usr and holder_user != usr:
-                self.conn.commit()
-                return False, "CHECKOUT_BY_OTHER", holder
-            if (not force) and holder_user and (not usr):
-                self.conn.commit()
-                return False, "CHECKIN_OWNER_REQUIRED", holder
+            with self.transaction():
+                cur = self.conn.cursor()
+                row = cur.execute(
+                    """
+                    SELECT code, checked_out, checkout_owner_user, checkout_owner_host, checkout_at
+                    FROM documents
+                    WHERE code=?;
+                    """,
+                    (code_u,),
+                ).fetchone()
+                if row is None:
+                    return False, "Documento non trovato.", {}
+
+                already = int(row["checked_out"] or 0) != 0
+                if not already:
+                    return True, "CHECKIN_ALREADY", {}
+
+                holder = {
+                    "code": str(row["code"] or ""),
+                    "checkout_owner_user": str(row["checkout_owner_user"] or ""),
+                    "checkout_owner_host": str(row["checkout_owner_host"] or ""),
+                    "checkout_at": str(row["checkout_at"] or ""),
+                }
+                holder_user = holder["checkout_owner_user"]
+                if (not force) and holder_user and usr and holder_user != usr:
+                    return False, "CHECKOUT_BY_OTHER", holder
+                if (not force) and holder_user and (not usr):
+                    return False, "CHECKIN_OWNER_REQUIRED", holder
 
-            cur.execute(
-                """
-                UPDATE documents
-                SET checked_out=0, checkout_owner_user='', checkout_owner_host='', checkout_at='', updated_at=?
-                WHERE code=?;
-                """,
-                (now, code_u),
-            )
-            self.conn.commit()
-            self._mark_dirty()
-            return True, "CHECKIN_OK", holder
+                cur.execute(
+                    """
+                    UPDATE documents
+                    SET checked_out=0, checkout_owner_user='', checkout_owner_host='', checkout_at='', updated_at=?
+                    WHERE code=?;
+                    """,
+                    (now, code_u),
+                )
+                self._mark_dirty()
+                return True, "CHECKIN_OK", holder
         except Exception as e:
-            try:
-                self.conn.rollback()
-            except Exception:
-                pass
             return False, f"CHECKIN_ERROR: {e}", {}
 
     def clear_document_checkout(self, code: str) -> bool:
@@ -559,17 +600,96 @@ class Store:
             """,
             (_now(), code_u),
         )
-        self.conn.commit()
+        self._commit()
         if cur.rowcount:
             self._mark_dirty()
         return bool(cur.rowcount)
 
-    def list_documents(self, include_obs: bool = False) -> List[Document]:
+    def list_documents(self, include_obs: bool = False) -> List[DocumentRow]:
         if include_obs:
-            cur = self.conn.execute("SELECT * FROM documents ORDER BY updated_at DESC;")
-        else:
-            cur = self.conn.execute("SELECT * FROM documents WHERE state != 'OBS' ORDER BY updated_at DESC;")
-        return [self._row_to_doc(r) for r in cur.fetchall()]
+            return self._fetch_doc_rows("SELECT * FROM documents ORDER BY updated_at DESC, id DESC;")
+        return self._fetch_doc_rows("SELECT * FROM documents WHERE state != 'OBS' ORDER BY updated_at DESC, id DESC;")
+
+    def list_documents_page(
+        self,
+        include_obs: bool = False,
+        limit: int = 500,
+        cursor: Optional[Tuple[str, int]] = None,
+    ) -> Tuple[List[DocumentRow], Optional[Tuple[str, int]]]:
+        return self.search_documents_page(include_obs=include_obs, limit=limit, cursor=cursor)
+
+    def _search_where(
+        self,
+        query: str,
+        mmm: str,
+        gggg: str,
+        vvv: str,
+        state: str,
+        doc_type: str,
+        include_obs: bool,
+        codes: Optional[List[str]] = None,
+        use_fts: bool = True,
+    ) -> Tuple[List[str], List[Any]]:
+        where: List[str] = []
+        params: List[Any] = []
+        if codes is not None:
+            where.append("code IN (" + ",".join("?" * len(codes)) + ")" if codes else "0")
+            params.extend(codes)
+        match_expr = self._fts_match_expr(query) if (query and use_fts and self.fts_enabled) else ""
+        if match_expr and self.sync_fts():
+            where.append("id IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)")
+            params.append(match_expr)
+        elif query:
+            # stesse colonne dell'indice FTS: codice, descrizione, valori custom
+            where.append("(code LIKE ? OR description LIKE ? OR code IN (SELECT code FROM doc_custom_values WHERE value LIKE ?))")
+            params.extend([f"%{query}%"] * 3)
+        if mmm:
+            where.append("mmm=?"); params.append(mmm)
+        if gggg:
+            where.append("gggg=?"); params.append(gggg)
+        if vvv:
+            where.append("vvv=?"); params.append(vvv)
+        if state:
+            where.append("state=?"); params.append(state)
+        if doc_type:
+            where.append("doc_type=?"); params.append(doc_type)
+        if not include_obs:
+            where.append("state!='OBS'")
+        return where, params
+
+    def _query_documents(self, filters: Dict[str, Any], extra_where: List[str], extra_params: List[Any], tail: str) -> List[DocumentRow]:
+        """Esegue la ricerca; se l'espressione MATCH FTS5 non e valida ripiega su LIKE."""
+        for use_fts in (True, False):
+            where, params = self._search_where(use_fts=use_fts, **filters)
+            where += extra_where
+            sql = "SELECT * FROM documents"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY updated_at DESC, id DESC" + tail + ";"
+            try:
+                return self._fetch_doc_rows(sql, params + extra_params)
+            except sqlite3.OperationalError:
+                if not use_fts or not (filters.get("query") and self.fts_enabled):
+                    raise
+        return []
+
+    @staticmethod
+    def _search_filters(query, mmm, gggg, vvv, state, doc_type, include_obs, kwargs) -> Dict[str, Any]:
+        if not query and "text" in kwargs:
+            try:
+                query = str(kwargs.get("text") or "")
+            except Exception:
+                query = ""
+        return {
+            "query": query or "",
+            "mmm": mmm or "",
+            "gggg": gggg or "",
+            "vvv": vvv or "",
+            "state": state or "",
+            "doc_type": doc_type or "",
+            "include_obs": bool(include_obs),
+            "codes": [str(c) for c in kwargs["codes"]] if kwargs.get("codes") is not None else None,
+        }
 
     def search_documents(
         self,
@@ -581,45 +701,77 @@ class Store:
         doc_type: str = "",
         include_obs: bool = False,
         **kwargs,
-    ) -> List[Document]:
+    ) -> List[DocumentRow]:
         """Ricerca documenti.
 
         Backward compatible:
         - accetta alias 'text' in kwargs come sinonimo di query.
+        - 'codes' in kwargs limita la ricerca a quei codici (patch righe UI).
         - parametri extra ignorati.
         """
-        if not query and "text" in kwargs:
-            try:
-                query = str(kwargs.get("text") or "")
-            except Exception:
-                query = ""
+        filters = self._search_filters(query, mmm, gggg, vvv, state, doc_type, include_obs, kwargs)
+        return self._query_documents(filters, [], [], "")
 
-        where = []
-        params: List[Any] = []
-        if query:
-            where.append("(code LIKE ? OR description LIKE ?)")
-            params.extend([f"%{query}%", f"%{query}%"])
-        if mmm:
-            where.append("mmm=?"); params.append(mmm)
-        if gggg:
-            where.append("gggg=?"); params.append(gggg)
-        if vvv:
-            where.append("vvv=?"); params.append(vvv)
-        if state:
-            where.append("state=?"); params.append(state)
-        if doc_type:
-            where.append("doc_type=?"); params.append(doc_type)
-        if not include_obs:
-            where.append("state!='OBS'")
-        sql = "SELECT * FROM documents"
-        if where:
-            sql += " WHERE " + " AND ".join(where)
-        sql += " ORDER BY updated_at DESC;"
-        cur = self.conn.execute(sql, params)
-        return [self._row_to_doc(r) for r in cur.fetchall()]
+    def search_documents_page(
+        self,
+        query: str = "",
+        mmm: str = "",
+        gggg: str = "",
+        vvv: str = "",
+        state: str = "",
+        doc_type: str = "",
+        include_obs: bool = False,
+        limit: int = 500,
+        cursor: Optional[Tuple[str, int]] = None,
+        **kwargs,
+    ) -> Tuple[List[DocumentRow], Optional[Tuple[str, int]]]:
+        """Come search_documents, ma a pagine (keyset su updated_at DESC, id DESC).
 
+        Ritorna (documenti, cursore_successivo); il cursore e (updated_at, id)
+        dell'ultima riga, None quando non ci sono altre pagine.
+        """
+        filters = self._search_filters(query, mmm, gggg, vvv, state, doc_type, include_obs, kwargs)
+        lim = max(1, int(limit or 500))
+        extra_where: List[str] = []
+        extra_params: List[Any] = []
+        if cursor:
+            extra_where.append("(updated_at, id) < (?, ?)")
+            extra_params.extend([str(cursor[0]), int(cursor[1])])
+        rows = self._query_documents(filters, extra_where, extra_params + [lim + 1], " LIMIT ?")
+        has_more = len(rows) > lim
+        docs = rows[:lim]
+        next_cursor = (docs[-1].updated_at, docs[-1].id) if (has_more and docs) else None
+        return docs, next_cursor
+
+    def _fetch_doc_rows(self, sql: str, params: Sequence[Any] = ()) -> List[DocumentRow]:
+        """SELECT su documents -> DocumentRow (tuple grezze, niente sqlite3.Row)."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        try:
+            cur.execute(sql, params)
+            make = self._doc_row_factory(cur.description)
+            return list(map(make, cur.fetchall()))
+        finally:
+            cur.close()
+
+    @staticmethod
+    def _doc_row_factory(description: Sequence[Sequence[Any]]) -> Callable[[Sequence[Any]], DocumentRow]:
+        """Costruttore DocumentRow per le colonne di un cursore.
+
+        La mappa nome colonna -> indice si calcola una volta per query; le
+        colonne assenti (DB legacy o SELECT parziali) prendono il default di Document.
+        """
+        index = {str(d[0]): i for i, d in enumerate(description or ())}
+        idx = [index.get(n, -1) for n in DOCUMENT_FIELDS]
+        if all(i >= 0 for i in idx):
+            get = operator.itemgetter(*idx)
+            return lambda r: DocumentRow(*get(r))
+        defaults = {f.name: ("" if f.default is MISSING else f.default) for f in fields(Document)}
+        fill = [defaults[n] for n in DOCUMENT_FIELDS]
+        return lambda r: DocumentRow(*[r[i] if i >= 0 else fill[k] for k, i in enumerate(idx)])
 
     def _row_to_doc(self, r: sqlite3.Row) -> Document:
+        keys = set(r.keys())
         return Document(
             id=int(r["id"]),
             code=str(r["code"]),
@@ -630,12 +782,12 @@ class Store:
             vvv=str(r["vvv"] or ""),
             revision=int(r["revision"]),
             state=str(r["state"]),
-            obs_prev_state=str(r["obs_prev_state"] if "obs_prev_state" in r.keys() else ""),
+            obs_prev_state=str(r["obs_prev_state"] if "obs_prev_state" in keys else ""),
             description=str(r["description"] or ""),
-            checked_out=(int(r["checked_out"] or 0) != 0) if "checked_out" in r.keys() else False,
-            checkout_owner_user=str(r["checkout_owner_user"] if "checkout_owner_user" in r.keys() else ""),
-            checkout_owner_host=str(r["checkout_owner_host"] if "checkout_owner_host" in r.keys() else ""),
-            checkout_at=str(r["checkout_at"] if "checkout_at" in r.keys() else ""),
+            checked_out=(int(r["checked_out"] or 0) != 0) if "checked_out" in keys else False,
+            checkout_owner_user=str(r["checkout_owner_user"] if "checkout_owner_user" in keys else ""),
+            checkout_owner_host=str(r["checkout_owner_host"] if "checkout_owner_host" in keys else ""),
+            checkout_at=str(r["checkout_at"] if "checkout_at" in keys else ""),
 
             file_wip_path=str(r["file_wip_path"] or ""),
             file_rel_path=str(r["file_rel_path"] or ""),
@@ -663,9 +815,151 @@ class Store:
             "ON CONFLICT(code, prop_name) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at;",
             (code, prop, v, _now()),
         )
-        self.conn.commit()
+        self._commit()
         self._mark_dirty()
 
+    def set_custom_values_bulk(self, values: List[Tuple[str, str, str]]) -> int:
+        """Upsert (code, prop_name, value) con executemany in un'unica transazione."""
+        now = _now()
+        rows = []
+        for code, prop_name, value in values:
+            code = (code or "").strip()
+            prop = (prop_name or "").strip().upper()
+            if code and prop:
+                rows.append((code, prop, "" if value is None else str(value), now))
+        if not rows:
+            return 0
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT INTO doc_custom_values(code, prop_name, value, updated_at) VALUES(?,?,?,?) "
+                "ON CONFLICT(code, prop_name) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at;",
+                rows,
+            )
+        self._mark_dirty()
+        return len(rows)
+
+    # ---- Registro checksum file (file_checksums) ----
+    def record_file_checksums(self, code: str, items: Sequence[Tuple[str, int, str, str, int]]) -> int:
+        """Upsert (role, revision, path, sha256, size) per code."""
+        code_u = (code or "").strip()
+        if not code_u:
+            return 0
+        now = _now()
+        rows = [
+            (code_u, int(rev), str(role).strip().upper(), str(path), str(sha).lower(), int(size), now)
+            for role, rev, path, sha, size in items
+            if str(role or "").strip() and sha
+        ]
+        if not rows:
+            return 0
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT INTO file_checksums(code, revision, role, path, sha256, size, recorded_at) VALUES(?,?,?,?,?,?,?) "
+                "ON CONFLICT(code, revision, role) DO UPDATE SET path=excluded.path, sha256=excluded.sha256, "
+                "size=excluded.size, recorded_at=excluded.recorded_at, verified_at='';",
+                rows,
+            )
+        return len(rows)
+
+    def list_file_checksums(self, code: str = "") -> List[Dict[str, Any]]:
+        code_u = (code or "").strip()
+        sql = "SELECT code, revision, role, path, sha256, size, recorded_at, verified_at FROM file_checksums"
+        params: Tuple[Any, ...] = ()
+        if code_u:
+            sql += " WHERE code=?"
+            params = (code_u,)
+        rows = self.conn.execute(sql + " ORDER BY code, revision, role;", params).fetchall()
+        return [
+            {
+                "code": str(r["code"]),
+                "revision": int(r["revision"]),
+                "role": str(r["role"]),
+                "path": str(r["path"]),
+                "sha256": str(r["sha256"]),
+                "size": int(r["size"]),
+                "recorded_at": str(r["recorded_at"]),
+                "verified_at": str(r["verified_at"] or ""),
+            }
+            for r in rows
+        ]
+
+    def get_file_checksum(self, code: str, revision: int, role: str) -> Optional[Dict[str, Any]]:
+        r = self.conn.execute(
+            "SELECT sha256, size, path FROM file_checksums WHERE code=? AND revision=? AND role=?;",
+            ((code or "").strip(), int(revision), str(role or "").strip().upper()),
+        ).fetchone()
+        if not r:
+            return None
+        return {"sha256": str(r["sha256"]), "size": int(r["size"]), "path": str(r["path"])}
+
+    def mark_file_checksums_verified(self, keys: Sequence[Tuple[str, int, str]]) -> int:
+        """Aggiorna verified_at per le chiavi (code, revision, role) verificate OK."""
+        if not keys:
+            return 0
+        now = _now()
+        with self.transaction():
+            self.conn.executemany(
+                "UPDATE file_checksums SET verified_at=? WHERE code=? AND revision=? AND role=?;",
+                [(now, c, int(rv), ro) for c, rv, ro in keys],
+            )
+        return len(keys)
+
+    # ---- Giornale transizioni workflow (wf_intents) ----
+    def begin_workflow_intent(
+        self,
+        code: str,
+        action: str,
+        session_id: str = "",
+        host: str = "",
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> WorkflowJournal:
+        """Apre un intent PENDING e ritorna il giornale per i passi file.
+
+        payload: event_type, from_state, rev_before, note, clear_checkout, user
+        (servono alla recovery per completare la transizione).
+        """
+        now = _now()
+        cur = self.conn.execute(
+            "INSERT INTO wf_intents(code, action, status, session_id, host, payload_json, created_at, updated_at) "
+            "VALUES(?, ?, 'PENDING', ?, ?, ?, ?, ?);",
+            (
+                (code or "").strip(), (action or "").strip().upper(), (session_id or "").strip(), (host or "").strip(),
+                json.dumps(payload or {}, ensure_ascii=False), now, now,
+            ),
+        )
+        self._commit()
+        return WorkflowJournal(self.db_path, int(cur.lastrowid))
+
+    def complete_workflow_intent(self, intent_id: int) -> bool:
+        """Chiude l'intent (DONE); da chiamare nella transazione che salva il documento."""
+        cur = self.conn.execute(
+            "UPDATE wf_intents SET status='DONE', updated_at=? WHERE id=? AND status IN ('PENDING', 'FILES_DONE');",
+            (_now(), int(intent_id)),
+        )
+        self._commit()
+        return cur.rowcount > 0
+
+    def list_workflow_intents(self, status: str = "", limit: int = 200) -> List[Dict[str, Any]]:
+        sql = "SELECT id, code, action, status, session_id, host, payload_json, created_at, updated_at FROM wf_intents"
+        params: Tuple[Any, ...] = ()
+        if status:
+            sql += " WHERE status=?"
+            params = (status.strip().upper(),)
+        rows = self.conn.execute(sql + " ORDER BY id DESC LIMIT ?;", params + (max(1, int(limit)),)).fetchall()
+        out = []
+        for r in rows:
+            try:
+                payload = json.loads(r["payload_json"] or "{}")
+            except Exception:
+                payload = {}
+            out.append({k: r[k] for k in ("id", "code", "action", "status", "session_id", "host", "created_at", "updated_at")})
+            out[-1]["payload"] = payload
+        return out
+
+    def recover_workflow_intents(self, log_file: str | Path | None = None) -> List[Dict[str, Any]]:
+        """Completa o annulla le transizioni rimaste aperte (vedi wf_journal.recover_intents)."""
+        return recover_intents(self, log_file=log_file)
+
     def get_custom_value(self, code: str, prop_name: str) -> str:
         code = (code or "").strip()
         prop = (prop_name or "").strip().upper()
@@ -726,7 +1020,7 @@ class Store:
             return
         c = self.conn.cursor()
         c.execute("DELETE FROM doc_custom_values WHERE prop_name=?;", (prop,))
-        self.conn.commit()
+        self._commit()
         self._mark_dirty()
 
     # ---- Workflow state notes ----
@@ -768,7 +1062,7 @@ class Store:
                 int(rev_after),
             ),
         )
-        self.conn.commit()
+        self._commit()
         self._mark_dirty()
         return int(cur.lastrowid)
 
@@ -824,57 +1118,116 @@ class Store:
 
         now = _now()
         expires = _now_plus(ttl_seconds)
-        cur = self.conn.cursor()
         try:
-            cur.execute("BEGIN IMMEDIATE;")
-            cur.execute("DELETE FROM document_locks WHERE expires_at <= ?;", (now,))
-            row = cur.execute(
-                """
-                SELECT code, owner_session, owner_user, owner_host, acquired_at, updated_at, expires_at
-                FROM document_locks
-                WHERE code=?;
-                """,
-                (code_u,),
-            ).fetchone()
-
-            if row is None:
-                cur.execute(
+            with self.transaction():
+                cur = self.conn.cursor()
+                cur.execute("DELETE FROM document_locks WHERE expires_at <= ?;", (now,))
+                row = cur.execute(
                     """
-                    INSERT INTO document_locks(code, owner_session, owner_user, owner_host, acquired_at, updated_at, expires_at)
-                    VALUES(?, ?, ?, ?, ?, ?, ?);
+                    SELECT code, owner_session, owner_user, owner_host, acquired_at, updated_at, expires_at
+                    FROM document_locks
+                    WHERE code=?;
                     """,
-                    (code_u, sess, usr, host, now, now, expires),
-                )
-                self.conn.commit()
-                return True, "LOCK_ACQUIRED", {}
-
-            holder = {
-                "code": str(row["code"]),
-                "owner_session": str(row["owner_session"]),
-                "owner_user": str(row["owner_user"]),
-                "owner_host": str(row["owner_host"]),
-                "acquired_at": str(row["acquired_at"]),
-                "updated_at": str(row["updated_at"]),
-                "expires_at": str(row["expires_at"]),
-            }
+                    (code_u,),
+                ).fetchone()
 
-            if holder["owner_session"] == sess:
-                cur.execute(
-                    "UPDATE document_locks SET owner_user=?, owner_host=?, updated_at=?, expires_at=? WHERE code=?;",
-                    (usr, host, now, expires, code_u),
-                )
-                self.conn.commit()
-                return True, "LOCK_REFRESHED", holder
+                if row is None:
+                    cur.execute(
+                        """
+                        INSERT INTO document_locks(code, owner_session, owner_user, owner_host, acquired_at, updated_at, expires_at)
+                        VALUES(?, ?, ?, ?, ?, ?, ?);
+                        """,
+                        (code_u, sess, usr, host, now, now, expires),
+                    )
+                    return True, "LOCK_ACQUIRED", {}
+
+                holder = {
+                    "code": str(row["code"]),
+                    "owner_session": str(row["owner_session"]),
+                    "owner_user": str(row["owner_user"]),
+                    "owner_host": str(row["owner_host"]),
+                    "acquired_at": str(row["acquired_at"]),
+                    "updated_at": str(row["updated_at"]),
+                    "expires_at": str(row["expires_at"]),
+                }
 
-            self.conn.commit()
-            return False, "LOCKED_BY_OTHER", holder
+                if holder["owner_session"] == sess:
+                    cur.execute(
+                        "UPDATE document_locks SET owner_user=?, owner_host=?, updated_at=?, expires_at=? WHERE code=?;",
+                        (usr, host, now, expires, code_u),
+                    )
+                    return True, "LOCK_REFRESHED", holder
+
+                return False, "LOCKED_BY_OTHER", holder
         except Exception as e:
-            try:
-                self.conn.rollback()
-            except Exception:
-                pass
             return False, f"LOCK_ERROR: {e}", {}
 
+    def acquire_document_locks(
+        self,
+        codes: Sequence[str],
+        owner_session: str,
+        owner_user: str,
+        owner_host: str,
+        ttl_seconds: int = 1200,
+    ) -> Tuple[List[str], Dict[str, Dict[str, str]]]:
+        """Lock di piu documenti in un'unica transazione.
+
+        Ritorna (codici acquisiti/rinnovati, {codice: holder} per quelli
+        bloccati da altre sessioni). Nessun lock parziale in caso di errore.
+        """
+        codes_u = list(dict.fromkeys(str(c).strip() for c in (codes or []) if str(c).strip()))
+        sess = (owner_session or "").strip()
+        usr = (owner_user or "").strip()
+        host = (owner_host or "").strip()
+        if not codes_u or not sess:
+            return [], {}
+
+        now = _now()
+        expires = _now_plus(ttl_seconds)
+        held: Dict[str, Dict[str, str]] = {}
+        with self.transaction():
+            self.conn.execute("DELETE FROM document_locks WHERE expires_at <= ?;", (now,))
+            for i in range(0, len(codes_u), 400):
+                ch = codes_u[i:i + 400]
+                rows = self.conn.execute(
+                    f"""
+                    SELECT code, owner_session, owner_user, owner_host, acquired_at, updated_at, expires_at
+                    FROM document_locks
+                    WHERE code IN ({','.join(['?'] * len(ch))});
+                    """,
+                    tuple(ch),
+                ).fetchall()
+                for r in rows:
+                    held[str(r["code"])] = {k: str(r[k]) for k in r.keys()}
+            mine = [c for c in codes_u if c in held and held[c]["owner_session"] == sess]
+            free = [c for c in codes_u if c not in held]
+            self.conn.executemany(
+                """
+                INSERT INTO document_locks(code, owner_session, owner_user, owner_host, acquired_at, updated_at, expires_at)
+                VALUES(?, ?, ?, ?, ?, ?, ?);
+                """,
+                [(c, sess, usr, host, now, now, expires) for c in free],
+            )
+            self.conn.executemany(
+                "UPDATE document_locks SET owner_user=?, owner_host=?, updated_at=?, expires_at=? WHERE code=?;",
+                [(usr, host, now, expires, c) for c in mine],
+            )
+        acquired = [c for c in codes_u if c not in held or c in mine]
+        refused = {c: h for c, h in held.items() if h["owner_session"] != sess}
+        return acquired, refused
+
+    def release_document_locks(self, codes: Sequence[str], owner_session: str) -> int:
+        sess = (owner_session or "").strip()
+        codes_u = [str(c).strip() for c in (codes or []) if str(c).strip()]
+        if not codes_u or not sess:
+            return 0
+        with self.transaction():
+            cur = self.conn.executemany(
+                "DELETE FROM document_locks WHERE code=? AND owner_session=?;",
+                [(c, sess) for c in codes_u],
+            )
+        return int(cur.rowcount or 0)
+
     def release_document_lock(self, code: str, owner_session: str) -> bool:
         code_u = (code or "").strip()
         sess = (owner_session or "").strip()
@@ -882,7 +1235,7 @@ class Store:
             return False
         cur = self.conn.cursor()
         cur.execute("DELETE FROM document_locks WHERE code=? AND owner_session=?;", (code_u, sess))
-        self.conn.commit()
+        self._commit()
         return cur.rowcount > 0
 
     def release_session_locks(self, owner_session: str) -> int:
@@ -891,7 +1244,7 @@ class Store:
             return 0
         cur = self.conn.cursor()
         cur.execute("DELETE FROM document_locks WHERE owner_session=?;", (sess,))
-        self.conn.commit()
+        self._commit()
         return int(cur.rowcount or 0)
 
     def list_active_locks(self, limit: int = 500) -> List[Dict[str, str]]:
@@ -899,7 +1252,7 @@ class Store:
         now = _now()
         try:
             self.conn.execute("DELETE FROM document_locks WHERE expires_at <= ?;", (now,))
-            self.conn.commit()
+            self._commit()
         except Exception:
             pass
         rows = self.conn.execute(
@@ -927,8 +1280,8 @@ class Store:
         return out
 
     # ---- Activity log (audit operazioni) ----
-    def add_activity(
-        self,
+    @staticmethod
+    def activity_row(
         workspace_id: str,
         session_id: str,
         user_id: str,
@@ -939,7 +1292,8 @@ class Store:
         status: str = "OK",
         message: str = "",
         details: Optional[Dict[str, Any]] = None,
-    ) -> int:
+    ) -> Tuple[str, ...]:
+        """Normalizza una riga activity_log (ordine colonne di ACTIVITY_INSERT_SQL)."""
         act = (action or "").strip().upper()
         if not act:
             raise ValueError("Azione activity mancante.")
@@ -949,27 +1303,39 @@ class Store:
                 details_json = json.dumps(details, ensure_ascii=False, separators=(",", ":"))
             except Exception:
                 details_json = ""
-        cur = self.conn.execute(
-            """
-            INSERT INTO activity_log(
-                created_at, workspace_id, session_id, user_id, user_display, host, action, code, status, message, details_json
-            ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-            """,
-            (
-                _now(),
-                str(workspace_id or ""),
-                str(session_id or ""),
-                str(user_id or ""),
-                str(user_display or ""),
-                str(host or ""),
-                act,
-                str(code or ""),
-                str(status or "OK"),
-                str(message or ""),
-                details_json,
-            ),
+        return (
+            _now(),
+            str(workspace_id or ""),
+            str(session_id or ""),
+            str(user_id or ""),
+            str(user_display or ""),
+            str(host or ""),
+            act,
+            str(code or ""),
+            str(status or "OK"),
+            str(message or ""),
+            details_json,
         )
-        self.conn.commit()
+
+    def add_activity(
+        self,
+        workspace_id: str,
+        session_id: str,
+        user_id: str,
+        user_display: str,
+        host: str,
+        action: str,
+        code: str = "",
+        status: str = "OK",
+        message: str = "",
+        details: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        row = self.activity_row(
+            workspace_id, session_id, user_id, user_display, host, action,
+            code=code, status=status, message=message, details=details,
+        )
+        cur = self.conn.execute(ACTIVITY_INSERT_SQL, row)
+        self._commit()
         return int(cur.lastrowid)
 
     def list_recent_activity(self, limit: int = 200) -> List[Dict[str, Any]]:
@@ -1009,3 +1375,66 @@ class Store:
                 }
             )
         return out
+
+    # ---- Change feed (doc_changes, popolata da trigger) ----
+    def change_version(self) -> int:
+        """Ultima versione del journal modifiche (0 se vuoto)."""
+        try:
+            r = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name='doc_changes';").fetchone()
+        except sqlite3.OperationalError:
+            return 0
+        return int(r[0]) if r else 0
+
+    def changes_since(self, version: int, limit: int = 1000) -> Dict[str, Any]:
+        """Modifiche con versione > version (documents, doc_custom_values,
+        document_locks, groups, machines), in ordine di versione.
+
+        Ritorna {"version", "changes", "reset"}: changes e una lista di
+        {version, entity, key, op(I/U/D), changed_at}; reset=True se il journal
+        non copre piu `version` o le modifiche superano `limit`, quindi serve
+        un ricaricamento completo. In ogni caso il chiamante riparte da "version".
+        """
+        since = max(0, int(version or 0))
+        lim = max(1, int(limit or 1000))
+        current = self.change_version()
+        out: Dict[str, Any] = {"version": current, "changes": [], "reset": False}
+        if current <= since:
+            return out
+        r = self.conn.execute("SELECT MIN(version) FROM doc_changes;").fetchone()
+        oldest = int(r[0]) if (r and r[0] is not None) else current + 1
+        if since < oldest - 1:
+            out["reset"] = True
+            return out
+        rows = self.conn.execute(
+            """
+            SELECT version, entity, key, op, changed_at
+            FROM doc_changes
+            WHERE version > ? AND version <= ?
+            ORDER BY version
+            LIMIT ?;
+            """,
+            (since, current, lim + 1),
+        ).fetchall()
+        if len(rows) > lim:
+            out["reset"] = True
+            return out
+        out["changes"] = [
+            {
+                "version": int(r["version"]),
+                "entity": str(r["entity"]),
+                "key": str(r["key"]),
+                "op": str(r["op"]),
+                "changed_at": str(r["changed_at"]),
+            }
+            for r in rows
+        ]
+        return out
+
+    def prune_changes(self, keep_last: int = 50000) -> int:
+        """Elimina le righe piu vecchie del journal modifiche (tiene le ultime keep_last)."""
+        limit_version = self.change_version() - max(0, int(keep_last))
+        if limit_version <= 0:
+            return 0
+        cur = self.conn.execute("DELETE FROM doc_changes WHERE version <= ?;", (limit_version,))
+        self._commit()
+        return int(cur.rowcount or 0)
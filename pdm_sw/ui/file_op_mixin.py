@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import threading
+import time
+import tkinter as tk
+
+import customtkinter as ctk
+
+from pdm_sw.archive import RetryMonitor, use_retry_monitor
+
+# intervallo di aggiornamento UI (after) e ritardo prima di mostrare la finestra di attesa
+FILE_OP_POLL_MS = 100
+FILE_OP_DIALOG_DELAY_S = 0.4
+
+
+class FileOpMixin:
+    def _run_file_op(self, label: str, fn, *args, **kwargs):
+        """Esegue `fn` (operazioni file del workflow) in un thread di lavoro.
+
+        Il thread Tk resta nel proprio event loop (wait_variable): con after()
+        aggiorna il progresso copia e lo stato dei tentativi su file bloccati.
+        Se l'operazione dura, una finestra modale offre Annulla, che
+        interrompe l'attesa tra un tentativo e l'altro (RetryCancelled).
+        Ritorna il risultato di `fn` o ne rilancia l'eccezione.
+        progress_fmt(*prog), se dato, sostituisce la riga "Copia file" nella
+        finestra (progresso non in byte, es. codici di una transizione multipla).
+
+        Finche la finestra non compare l'input resta attivo: da subito
+        _on_file_op_busy(True) disabilita i comandi e una seconda operazione
+        viene rifiutata (RuntimeError).
+        """
+        if getattr(self, "_file_op_active", False):
+            raise RuntimeError("Operazione file gia in corso.")
+        monitor = RetryMonitor()
+        lock = threading.Lock()
+        state: dict = {"done": False, "out": None, "exc": None, "progress": None}
+        progress_fmt = kwargs.pop("progress_fmt", None)
+        ui_progress = kwargs.get("progress")
+        if ui_progress is not None:
+            def _progress(*prog) -> None:
+                with lock:
+                    state["progress"] = prog
+            kwargs["progress"] = _progress
+
+        def _work() -> None:
+            try:
+                with use_retry_monitor(monitor):
+                    state["out"] = fn(*args, **kwargs)
+            except BaseException as e:
+                state["exc"] = e
+            finally:
+                state["done"] = True
+
+        finished = tk.BooleanVar(master=self, value=False)
+        ui: dict = {"top": None, "lbl": None, "btn": None}
+        t0 = time.monotonic()
+
+        def _cancel() -> None:
+            monitor.cancel()
+            if ui["btn"] is not None:
+                ui["btn"].configure(state="disabled", text="Annullamento...")
+
+        def _dialog() -> None:
+            top = ctk.CTkToplevel(self)
+            top.title("Operazione in corso")
+            top.geometry("520x150")
+            top.transient(self)
+            top.protocol("WM_DELETE_WINDOW", _cancel)
+            ctk.CTkLabel(top, text=label, font=ctk.CTkFont(weight="bold")).pack(padx=12, pady=(12, 4), anchor="w")
+            ui["lbl"] = ctk.CTkLabel(top, text="", justify="left", wraplength=490)
+            ui["lbl"].pack(padx=12, pady=4, anchor="w")
+            ui["btn"] = ctk.CTkButton(top, text="Annulla", width=120, command=_cancel)
+            ui["btn"].pack(padx=12, pady=(4, 12), anchor="e")
+            ui["top"] = top
+            try:
+                top.grab_set()
+            except Exception:
+                pass
+
+        def _poll() -> None:
+            if state["done"]:
+                finished.set(True)
+                return
+            with lock:
+                prog = state["progress"]
+            wait = monitor.snapshot()
+            if ui["top"] is None and (wait is not None or time.monotonic() - t0 >= FILE_OP_DIALOG_DELAY_S):
+                try:
+                    _dialog()
+                except Exception:
+                    ui["top"] = False  # niente finestra: si attende comunque
+            if prog is not None and ui_progress is not None:
+                ui_progress(*prog)
+            if ui["lbl"] is not None:
+                lines = []
+                if prog is not None and progress_fmt is not None:
+                    lines.append(progress_fmt(*prog))
+                elif prog is not None and prog[1] > 0:
+                    lines.append(f"Copia file {int(prog[0] * 100 / prog[1])}% ({prog[0] / 1e6:.1f}/{prog[1] / 1e6:.1f} MB)")
+                if wait is not None:
+                    lines.append(
+                        f"File bloccato: {wait['what']}\n"
+                        f"tentativo {wait['attempt']}/{wait['attempts']}, nuovo tentativo tra {wait['delay_s']:.1f} s"
+                    )
+                elif monitor.cancelled:
+                    lines.append("Annullamento richiesto...")
+                ui["lbl"].configure(text="\n".join(lines) or "Attendere...")
+            self.after(FILE_OP_POLL_MS, _poll)
+
+        self._file_op_active = True
+        self._set_file_op_busy(True)
+        threading.Thread(target=_work, name="pdm-file-op", daemon=True).start()
+        self.after(FILE_OP_POLL_MS, _poll)
+        try:
+            self.wait_variable(finished)
+        finally:
+            self._file_op_active = False
+            self._set_file_op_busy(False)
+            if ui["top"]:
+                try:
+                    ui["top"].grab_release()
+                    ui["top"].destroy()
+                except Exception:
+                    pass
+        if state["exc"] is not None:
+            raise state["exc"]
+        return state["out"]
+
+    def _set_file_op_busy(self, busy: bool) -> None:
+        try:
+            self.configure(cursor="watch" if busy else "")
+        except Exception:
+            pass
+        hook = getattr(self, "_on_file_op_busy", None)
+        if callable(hook):
+            try:
+                hook(busy)
+            except Exception:
+                pass
+
+    def _run_in_background(self, work, on_done, tick=None) -> None:
+        """Esegue work() in un thread senza bloccare la UI.
+
+        tick() (avanzamento) e on_done(result, exc) girano nel thread Tk, via after().
+        """
+        out: dict = {}
+
+        def _run() -> None:
+            try:
+                out["res"] = work()
+            except Exception as e:
+                out["exc"] = e
+            finally:
+                out["done"] = True
+
+        def _poll() -> None:
+            if not out.get("done"):
+                if tick is not None:
+                    try:
+                        tick()
+                    except Exception:
+                        pass
+                self.after(FILE_OP_POLL_MS, _poll)
+                return
+            on_done(out.get("res"), out.get("exc"))
+
+        threading.Thread(target=_run, name="pdm-background", daemon=True).start()
+        self.after(FILE_OP_POLL_MS, _poll)
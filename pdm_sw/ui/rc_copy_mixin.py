@@ -8,6 +8,7 @@ import customtkinter as ctk
 
 from pdm_sw.models import Document
 from pdm_sw.codegen import build_code, build_machine_code, build_group_code
+from pdm_sw.stat_cache import invalidate_path
 from pdm_sw.archive import (
     archive_dirs,
     archive_dirs_for_machine,
@@ -513,6 +514,7 @@ class RCCopyMixin:
                 try:
                     if p.exists():
                         p.unlink()
+                    invalidate_path(p)
                 except Exception:
                     pass
             warn(f"Copia fallita: {e}")
@@ -6,6 +6,7 @@ from datetime import datetime
 from pathlib import Path
 from tkinter import messagebox
 
+from pdm_sw.log_writer import append_line
 from pdm_sw.models import Document
 
 
@@ -30,10 +31,7 @@ class ReportMixin:
 
     def _workflow_log_line(self, msg: str) -> None:
         try:
-            p = self._workflow_log_path()
-            ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            with p.open("a", encoding="utf-8") as f:
-                f.write(f"{ts} | {msg.rstrip()}\n")
+            append_line(self._workflow_log_path(), msg)
         except Exception:
             pass
 
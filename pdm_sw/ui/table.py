@@ -3,7 +3,48 @@ from __future__ import annotations
 import tkinter as tk
 import tkinter.font as tkfont
 from tkinter import ttk
-from typing import Callable, List, Sequence, Optional, Any
+from typing import Callable, Dict, List, Sequence, Optional, Any
+
+
+def _item_option(tree: ttk.Treeview, item_id: str, option: str):
+    # valore Tcl grezzo: tree.item() converte le stringhe numeriche ("001" -> 1)
+    return tree.tk.call(str(tree), "item", item_id, f"-{option}")
+
+
+def export_tree_nodes(tree: ttk.Treeview, limit: int, parent: str = "") -> Optional[List[tuple]]:
+    """Nodi del Treeview come (testo, valori, tag, aperto, figli), per ricostruirlo senza query.
+
+    None se i nodi sono piu di `limit` (memoria limitata).
+    """
+    budget = [int(limit)]
+
+    def _walk(item: str) -> Optional[List[tuple]]:
+        out = []
+        for i in tree.get_children(item):
+            budget[0] -= 1
+            if budget[0] < 0:
+                return None
+            children = _walk(i)
+            if children is None:
+                return None
+            out.append((
+                str(_item_option(tree, i, "text")),
+                tuple(str(v) for v in tree.tk.splitlist(_item_option(tree, i, "values"))),
+                tuple(str(t) for t in tree.tk.splitlist(_item_option(tree, i, "tags"))),
+                bool(tree.tk.getboolean(_item_option(tree, i, "open") or 0)),
+                children,
+            ))
+        return out
+
+    return _walk(parent)
+
+
+def import_tree_nodes(tree: ttk.Treeview, nodes: List[tuple], parent: str = "") -> None:
+    """Reinserisce nodi prodotti da export_tree_nodes sotto `parent`."""
+    for text, values, tags, is_open, children in nodes:
+        item = tree.insert(parent, "end", text=text, values=values, tags=tags, open=is_open)
+        if children:
+            import_tree_nodes(tree, children, item)
 
 
 class SimpleTable(ttk.Frame):
@@ -12,6 +53,9 @@ class SimpleTable(ttk.Frame):
         self.columns = columns
         self.on_double_click = on_double_click
         self.key_index = key_index
+        # Callback quando lo scroll arriva in fondo (caricamento pagine successive)
+        self.on_scroll_end: Optional[Callable[[], None]] = None
+        self._scroll_end_pending = False
 
         # Stile: aumenta testo righe (~ +50%)
         style = ttk.Style()
@@ -44,7 +88,8 @@ class SimpleTable(ttk.Frame):
 
         vsb = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
         hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self._vsb = vsb
+        self.tree.configure(yscrollcommand=self._on_yscroll, xscrollcommand=hsb.set)
 
         self.tree.grid(row=0, column=0, sticky="nsew")
         vsb.grid(row=0, column=1, sticky="ns")
@@ -56,6 +101,25 @@ class SimpleTable(ttk.Frame):
         if on_double_click:
             self.tree.bind("<Double-1>", self._dbl)
 
+    def _on_yscroll(self, first, last):
+        self._vsb.set(first, last)
+        if self.on_scroll_end is None or self._scroll_end_pending:
+            return
+        try:
+            at_end = float(last) >= 0.98 and float(first) > 0.0
+        except Exception:
+            return
+        if at_end:
+            self._scroll_end_pending = True
+            self.after_idle(self._fire_scroll_end)
+
+    def _fire_scroll_end(self):
+        try:
+            if self.on_scroll_end:
+                self.on_scroll_end()
+        finally:
+            self._scroll_end_pending = False
+
     def _dbl(self, _evt):
         if not self.on_double_click:
             return
@@ -132,17 +196,60 @@ class SimpleTable(ttk.Frame):
 
     def set_rows(self, rows: List[Any]):
         self.clear()
+        self.append_rows(rows)
+
+    def append_rows(self, rows: List[Any]):
+        """Aggiunge righe in coda senza svuotare la tabella."""
         for r in rows:
-            values = r
-            tags = ()
-            if isinstance(r, dict):
-                values = r.get("values", [])
-                raw_tags = r.get("tags", ())
-                if isinstance(raw_tags, str):
-                    tags = (raw_tags,)
-                else:
-                    tags = tuple(raw_tags or ())
-            self.tree.insert("", "end", values=list(values), tags=tags)
+            values, tags = self._row_values_tags(r)
+            self.tree.insert("", "end", values=values, tags=tags)
+
+    @staticmethod
+    def _row_values_tags(r: Any):
+        values = r
+        tags = ()
+        if isinstance(r, dict):
+            values = r.get("values", [])
+            raw_tags = r.get("tags", ())
+            if isinstance(raw_tags, str):
+                tags = (raw_tags,)
+            else:
+                tags = tuple(raw_tags or ())
+        return list(values), tags
+
+    def _item_key(self, item_id: str) -> str:
+        vals = self.tree.item(item_id).get("values", [])
+        k = vals[self.key_index] if len(vals) > self.key_index else (vals[0] if vals else "")
+        return str(k)
+
+    def items_by_key(self) -> Dict[str, str]:
+        """Mappa chiave riga (colonna key_index) -> item id."""
+        return {self._item_key(i): i for i in self.tree.get_children("")}
+
+    def update_row(self, item_id: str, row: Any, index: Optional[int] = None):
+        """Aggiorna valori/tag di una riga esistente (e la sposta se index e dato)."""
+        values, tags = self._row_values_tags(row)
+        self.tree.item(item_id, values=values, tags=tags)
+        if index is not None:
+            self.tree.move(item_id, "", index)
+
+    def insert_row(self, row: Any, index: Any = "end") -> str:
+        values, tags = self._row_values_tags(row)
+        return self.tree.insert("", index, values=values, tags=tags)
+
+    def delete_items(self, item_ids: Sequence[str]):
+        if item_ids:
+            self.tree.delete(*item_ids)
+
+    def headings(self) -> List[str]:
+        return [str(self.tree.heading(c, "text")) for c in self.columns]
+
+    def export_rows(self, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Righe correnti nel formato di set_rows; None se sono piu di `limit`."""
+        nodes = export_tree_nodes(self.tree, limit)
+        if nodes is None:
+            return None
+        return [{"values": list(values), "tags": tags} for _text, values, tags, _open, _children in nodes]
 
 
 # Alias per compatibilità (in alcune release la tabella era chiamata Table)
@@ -0,0 +1,270 @@
+"""Giornale write-ahead delle transizioni workflow (wf_intents / wf_intent_steps).
+
+Ogni passo file (copia, sovrascrittura, spostamento, eliminazione) viene
+registrato e committato PRIMA di eseguirlo e marcato DONE subito dopo. Il
+punto di commit e FILES_DONE: da li in poi la transizione si completa
+(pulizia + aggiornamento documento), prima si annulla.
+
+recover_intents() gira all'apertura dello Store: le transizioni rimaste
+aperte (crash, rete caduta) senza lock documento attivo vengono completate
+o annullate.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .archive import safe_copy_replace, safe_delete, safe_move, set_readonly
+from .models import Document
+
+if TYPE_CHECKING:
+    from .store import Store
+
+# intent lasciati aperti da meno di cosi possono appartenere a una transizione in corso
+RECOVERY_GRACE_S = 120
+
+OPEN_STATUSES = ("PENDING", "FILES_DONE")
+
+# campi documento salvati al punto di commit (roll-forward in recovery)
+DOC_AFTER_FIELDS = (
+    "state", "revision", "obs_prev_state",
+    "file_wip_path", "file_rel_path", "file_inrev_path",
+    "file_wip_drw_path", "file_rel_drw_path", "file_inrev_drw_path",
+)
+
+
+def _ts(delta_s: int = 0) -> str:
+    return (datetime.now() + timedelta(seconds=delta_s)).isoformat(timespec="seconds")
+
+
+class WorkflowJournal:
+    """Giornale di una singola transizione.
+
+    Usa una connessione SQLite propria (le pipeline file girano su thread
+    worker); ogni scrittura e committata subito.
+    """
+
+    def __init__(self, db_path: str | Path, intent_id: int):
+        self.db_path = Path(db_path)
+        self.intent_id = int(intent_id)
+        self._conn: Optional[sqlite3.Connection] = sqlite3.connect(
+            str(self.db_path), timeout=30.0, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.completed_steps = 0
+
+    def _write(self, sql: str, params: tuple) -> None:
+        with self._lock:
+            if self._conn is None:
+                raise RuntimeError("Giornale workflow chiuso.")
+            self._conn.execute(sql, params)
+            # ultima attivita: il periodo di grazia della recovery parte da qui, non dall'apertura
+            self._conn.execute("UPDATE wf_intents SET updated_at=? WHERE id=?;", (_ts(), self.intent_id))
+            self._conn.commit()
+
+    def step(self, op: str, src: str | Path = "", dst: str | Path = "", restore_from: str | Path = "") -> int:
+        """Registra un passo PLANNED; ritorna il numero di sequenza."""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        self._write(
+            "INSERT INTO wf_intent_steps(intent_id, seq, op, src, dst, restore_from, status, updated_at) "
+            "VALUES(?, ?, ?, ?, ?, ?, 'PLANNED', ?);",
+            (self.intent_id, seq, op, str(src or ""), str(dst or ""), str(restore_from or ""), _ts()),
+        )
+        return seq
+
+    def done(self, seq: int) -> None:
+        self._write(
+            "UPDATE wf_intent_steps SET status='DONE', updated_at=? WHERE intent_id=? AND seq=?;",
+            (_ts(), self.intent_id, int(seq)),
+        )
+        with self._lock:
+            self.completed_steps += 1
+
+    def _set_status(self, status: str, extra: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            row = self._conn.execute("SELECT payload_json FROM wf_intents WHERE id=?;", (self.intent_id,)).fetchone()
+            payload = json.loads(row[0] or "{}") if row else {}
+            payload.update(extra or {})
+            self._conn.execute(
+                "UPDATE wf_intents SET status=?, payload_json=?, updated_at=? WHERE id=? AND status IN ('PENDING', 'FILES_DONE');",
+                (status, json.dumps(payload, ensure_ascii=False), _ts(), self.intent_id),
+            )
+            self._conn.commit()
+
+    def files_done(self, doc: Document, result: Any = None) -> None:
+        """Punto di commit: file al nuovo stato, salva il documento atteso."""
+        checksums = [
+            [x.role, int(x.revision), x.path, x.sha256, int(x.size)]
+            for x in (getattr(result, "checksums", None) or [])
+        ]
+        self._set_status("FILES_DONE", {
+            "doc_after": {k: getattr(doc, k, "") for k in DOC_AFTER_FIELDS},
+            "checksums": checksums,
+        })
+
+    def rolled_back(self, message: str = "") -> None:
+        self._set_status("ROLLED_BACK", {"error": message} if message else None)
+
+    def discard(self, message: str = "") -> bool:
+        """Chiude come ROLLED_BACK l'intent ancora PENDING senza passi file.
+
+        Per le transizioni rifiutate, annullate o fallite prima di toccare i
+        file: non resta nulla da ripristinare all'avvio. False se ci sono passi.
+        """
+        with self._lock:
+            if self._seq or self._conn is None:
+                return False
+            row = self._conn.execute("SELECT status FROM wf_intents WHERE id=?;", (self.intent_id,)).fetchone()
+        if row is None or row[0] != "PENDING":
+            return False
+        self.rolled_back(message)
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _undo_step(step: sqlite3.Row, log_file: str | Path | None) -> None:
+    op = str(step["op"])
+    src = Path(step["src"]) if step["src"] else None
+    dst = Path(step["dst"]) if step["dst"] else None
+    if op == "COPY" and dst is not None:
+        safe_delete(dst, strict=True, log_file=log_file)
+    elif op == "REPLACE" and dst is not None:
+        restore = Path(step["restore_from"]) if step["restore_from"] else None
+        if restore is None or not restore.is_file():
+            # il file sovrascritto non e ripristinabile: l'intent va in FAILED, mai ROLLED_BACK
+            raise FileNotFoundError(f"copia per ripristinare {dst} non disponibile: {restore or 'nessuna'}")
+        safe_copy_replace(restore, dst, log_file=log_file)
+        set_readonly(dst, True)
+    elif op == "MOVE" and src is not None and dst is not None:
+        if dst.exists() and not src.exists():
+            safe_move(dst, src, overwrite=False, log_file=log_file)
+            set_readonly(src, True)
+
+
+def _rollback_intent(store: "Store", intent: sqlite3.Row, steps: List[sqlite3.Row], log_file: str | Path | None) -> None:
+    # passi PLANNED inclusi: possono essere stati interrotti a meta
+    for st in reversed(steps):
+        if st["op"] == "DELETE" or st["status"] == "UNDONE":
+            continue
+        _undo_step(st, log_file)
+        with store.transaction():
+            store.conn.execute(
+                "UPDATE wf_intent_steps SET status='UNDONE', updated_at=? WHERE intent_id=? AND seq=?;",
+                (_ts(), intent["id"], st["seq"]),
+            )
+
+
+def _roll_forward(store: "Store", intent: sqlite3.Row, steps: List[sqlite3.Row], payload: Dict[str, Any], log_file: str | Path | None) -> str:
+    """Completa pulizia e salvataggio documento; ritorna '' o il motivo del fallimento."""
+    for st in steps:
+        if st["op"] == "DELETE" and st["status"] != "DONE" and st["src"]:
+            safe_delete(Path(st["src"]), strict=False, log_file=log_file)
+
+    after = dict(payload.get("doc_after") or {})
+    doc = store.get_document(str(intent["code"]))
+    if doc is None or not after:
+        return "documento o stato finale non disponibile"
+    if doc.state == after.get("state") and int(doc.revision) == int(after.get("revision", -1)):
+        return ""  # documento gia salvato (intent non chiuso per crash dopo il commit)
+    if doc.state != payload.get("from_state") or int(doc.revision) != int(payload.get("rev_before", -1)):
+        return f"documento modificato nel frattempo ({doc.state} rev {int(doc.revision):02d})"
+
+    with store.transaction():
+        store.update_document(doc.code, **after)
+        sums = payload.get("checksums") or []
+        if sums:
+            store.record_file_checksums(doc.code, [tuple(x) for x in sums])
+        store.add_state_note(
+            code=doc.code,
+            event_type=str(payload.get("event_type") or intent["action"]),
+            from_state=str(payload.get("from_state", "")),
+            to_state=str(after.get("state", "")),
+            note=str(payload.get("note") or "") or "Completata dal ripristino automatico.",
+            rev_before=int(payload.get("rev_before", 0)),
+            rev_after=int(after.get("revision", 0)),
+        )
+        if payload.get("clear_checkout"):
+            store.clear_document_checkout(doc.code)
+    return ""
+
+
+def recover_intents(
+    store: "Store",
+    grace_seconds: int = RECOVERY_GRACE_S,
+    log_file: str | Path | None = None,
+) -> List[Dict[str, Any]]:
+    """Completa (FILES_DONE) o annulla (PENDING) le transizioni interrotte.
+
+    Salta gli intent recenti o con lock documento ancora valido (transizione
+    di un'altra sessione in corso). Ritorna un riepilogo per intent.
+    """
+    placeholders = ",".join("?" * len(OPEN_STATUSES))
+    intents = store.conn.execute(
+        f"SELECT id, code, action, status, session_id, host, payload_json, updated_at FROM wf_intents "
+        f"WHERE status IN ({placeholders}) AND updated_at <= ? ORDER BY id;",
+        (*OPEN_STATUSES, _ts(-int(grace_seconds))),
+    ).fetchall()
+    out: List[Dict[str, Any]] = []
+    now = _ts()
+    for it in intents:
+        locked = store.conn.execute(
+            "SELECT 1 FROM document_locks WHERE code=? AND expires_at > ?;", (it["code"], now)
+        ).fetchone()
+        if locked:
+            continue
+        steps = store.conn.execute(
+            "SELECT seq, op, src, dst, restore_from, status FROM wf_intent_steps WHERE intent_id=? ORDER BY seq;",
+            (it["id"],),
+        ).fetchall()
+        try:
+            payload = json.loads(it["payload_json"] or "{}")
+        except Exception:
+            payload = {}
+        entry = {"id": int(it["id"]), "code": str(it["code"]), "action": str(it["action"]), "result": "", "message": ""}
+        try:
+            if it["status"] == "FILES_DONE":
+                err = _roll_forward(store, it, steps, payload, log_file)
+                entry["result"], entry["message"] = ("FAILED", err) if err else ("COMPLETED", "")
+            else:
+                _rollback_intent(store, it, steps, log_file)
+                entry["result"] = "ROLLED_BACK"
+        except Exception as e:
+            entry["result"], entry["message"] = "FAILED", f"{type(e).__name__}: {e}"
+        status = {"COMPLETED": "DONE", "ROLLED_BACK": "ROLLED_BACK"}.get(entry["result"], "FAILED")
+        payload["recovery"] = {"result": entry["result"], "message": entry["message"], "at": _ts()}
+        with store.transaction():
+            store.conn.execute(
+                "UPDATE wf_intents SET status=?, payload_json=?, updated_at=? WHERE id=?;",
+                (status, json.dumps(payload, ensure_ascii=False), _ts(), it["id"]),
+            )
+            store.add_activity(
+                workspace_id="",
+                session_id=str(it["session_id"] or ""),
+                user_id="",
+                user_display=str(payload.get("user", "") or ""),
+                host=str(it["host"] or ""),
+                action="WF_RECOVERY",
+                code=str(it["code"]),
+                status="OK" if status != "FAILED" else "ERROR",
+                message=f"{it['action']} {entry['result']}" + (f": {entry['message']}" if entry["message"] else ""),
+                details={"intent": int(it["id"]), "steps": len(steps)},
+            )
+        out.append(entry)
+    return out
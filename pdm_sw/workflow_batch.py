@@ -0,0 +1,319 @@
+"""Transizioni workflow su piu codici (release, crea revisione, approva, OBS).
+
+Una nota condivisa, lock in blocco, operazioni file su pool di worker e
+tutte le modifiche DB (documenti, checksum, note, checkout, activity) in
+un'unica transazione. Se il commit fallisce le operazioni file di release
+e crea revisione vengono annullate; l'approvazione resta nel suo intent
+(FILES_DONE) e viene completata dal ripristino all'avvio. Il risultato
+riporta l'esito per codice.
+"""
+from __future__ import annotations
+
+import time
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .archive import WorkflowResult, approve_inrev, create_inrev, release_wip, set_obsolete
+from .models import Document
+from .store import ACTIVITY_INSERT_SQL, Store
+from .wf_journal import WorkflowJournal
+
+DEFAULT_BATCH_WORKERS = 4
+
+
+@dataclass(frozen=True)
+class BatchAction:
+    key: str
+    label: str
+    from_states: Tuple[str, ...]
+    to_state: str
+    event_type: str
+    clear_checkout: bool
+
+
+BATCH_ACTIONS: Dict[str, BatchAction] = {
+    "release": BatchAction("release", "Release", ("WIP",), "REL", "RELEASE", True),
+    "create_rev": BatchAction("create_rev", "Crea revisione", ("REL",), "IN_REV", "CREATE_REV", False),
+    "approve": BatchAction("approve", "Approva revisione", ("IN_REV",), "REL", "APPROVE_REV", True),
+    "obsolete": BatchAction("obsolete", "Imposta OBS", ("WIP", "REL", "IN_REV"), "OBS", "SET_OBSOLETE", True),
+}
+
+
+@dataclass
+class BatchItemResult:
+    code: str
+    ok: bool
+    message: str
+    from_state: str = ""
+    to_state: str = ""
+    rev_before: int = 0
+    rev_after: int = 0
+    result: Optional[WorkflowResult] = None
+
+
+@dataclass
+class BatchResult:
+    action: str
+    items: List[BatchItemResult] = field(default_factory=list)
+    elapsed_s: float = 0.0
+
+    @property
+    def ok_count(self) -> int:
+        return sum(1 for x in self.items if x.ok)
+
+    @property
+    def failed(self) -> List[BatchItemResult]:
+        return [x for x in self.items if not x.ok]
+
+
+def _transition(
+    action: BatchAction,
+    doc: Document,
+    archive_root: str,
+    log_file: Optional[str],
+    journal: Optional[WorkflowJournal] = None,
+) -> Tuple[Document, WorkflowResult]:
+    if action.key == "release":
+        return release_wip(doc, archive_root, log_file=log_file)
+    if action.key == "create_rev":
+        return create_inrev(doc, archive_root, log_file=log_file)
+    if action.key == "approve":
+        return approve_inrev(doc, archive_root, log_file=log_file, journal=journal)
+    prev_state = str(doc.state or "")
+    doc, res = set_obsolete(doc, log_file=log_file)
+    doc.obs_prev_state = prev_state if prev_state in ("WIP", "REL", "IN_REV") else ""
+    return doc, res
+
+
+def _error_text(e: BaseException) -> str:
+    if isinstance(e, FileExistsError):
+        return f"File destinazione gia presente: {e}"
+    if isinstance(e, PermissionError):
+        return f"File in uso o non accessibile: {e}"
+    return f"{type(e).__name__}: {e}"
+
+
+def _run_files(
+    act: BatchAction,
+    work: List[Document],
+    items: Dict[str, BatchItemResult],
+    archive_root: str,
+    log_file: Optional[str],
+    journals: Dict[str, WorkflowJournal],
+    workers: int,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> List[Tuple[Document, WorkflowResult]]:
+    """Fase file (nessun accesso allo Store): puo girare in un thread di lavoro."""
+    done_docs: List[Tuple[Document, WorkflowResult]] = []
+    with ThreadPoolExecutor(max_workers=max(1, min(int(workers), len(work))), thread_name_prefix="pdm-wf-batch") as pool:
+        # copy_context: i worker vedono il monitor dei tentativi del chiamante (Annulla)
+        futs = {
+            pool.submit(copy_context().run, _transition, act, doc, archive_root, log_file, journals.get(doc.code)): doc.code
+            for doc in work
+        }
+        pending = set(futs)
+        while pending:
+            finished, pending = wait(pending, timeout=0.1)
+            for f in finished:
+                item = items[futs[f]]
+                exc = f.exception()
+                if exc is not None:
+                    item.message = _error_text(exc)
+                    continue
+                doc2, res = f.result()
+                item.result = res
+                if not res.ok:
+                    item.message = res.message
+                    continue
+                done_docs.append((doc2, res))
+            if progress and finished:
+                try:
+                    progress(len(work) - len(pending), len(work))
+                except Exception:
+                    pass
+    return done_docs
+
+
+def run_batch_transition(
+    store: Store,
+    action: str,
+    codes: Sequence[str],
+    note: str,
+    actor: Dict[str, str],
+    archive_root: str = "",
+    log_file: Optional[str] = None,
+    workers: int = DEFAULT_BATCH_WORKERS,
+    lock_ttl_seconds: int = 1200,
+    precheck: Optional[Callable[[Document], str]] = None,
+    before_files: Optional[Callable[[Document], None]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    run_files: Optional[Callable[..., Any]] = None,
+) -> BatchResult:
+    """Esegue `action` (chiave di BATCH_ACTIONS) su `codes`.
+
+    actor: workspace_id, session_id, user_id, user_display, host (lock e
+    activity). precheck(doc) ritorna un messaggio se il codice va escluso;
+    before_files(doc) gira nel thread chiamante prima delle operazioni file
+    (es. chiusura documenti aperti in SolidWorks). run_files(fn, *args,
+    **kwargs), se dato, esegue la fase file (es. in un thread di lavoro con
+    la UI attiva); progress e passato come kwarg.
+    """
+    t0 = time.perf_counter()
+    act = BATCH_ACTIONS[action]
+    out = BatchResult(action=action)
+    items: Dict[str, BatchItemResult] = {}
+    order = list(dict.fromkeys(str(c).strip() for c in codes if str(c).strip()))
+    note_u = (note or "").strip()
+    if not note_u:
+        raise ValueError("Nota stato vuota.")
+
+    docs = store.get_documents(order)
+    candidates: List[Document] = []
+    for code in order:
+        doc = docs.get(code)
+        if doc is None:
+            items[code] = BatchItemResult(code, False, "Documento non trovato.")
+            continue
+        state = str(doc.state or "").strip().upper()
+        item = BatchItemResult(code, False, "", from_state=state, rev_before=int(doc.revision))
+        items[code] = item
+        if state not in act.from_states:
+            item.message = f"Stato {state} non valido per {act.label} (serve {'/'.join(act.from_states)})."
+            continue
+        if act.key != "obsolete" and not archive_root:
+            item.message = "Archivio non configurato (SolidWorks > Archivio)."
+            continue
+        msg = precheck(doc) if precheck else ""
+        if msg:
+            item.message = msg
+            continue
+        candidates.append(doc)
+
+    session_id = str(actor.get("session_id", ""))
+    acquired, refused = store.acquire_document_locks(
+        [d.code for d in candidates],
+        owner_session=session_id,
+        owner_user=str(actor.get("user_display", "")),
+        owner_host=str(actor.get("host", "")),
+        ttl_seconds=lock_ttl_seconds,
+    )
+    for code, holder in refused.items():
+        who = str(holder.get("owner_user", "") or holder.get("owner_session", "altro utente"))
+        host = str(holder.get("owner_host", "") or "")
+        items[code].message = f"Bloccato da {who}" + (f" su {host}" if host else "") + "."
+    locked = set(acquired)
+    work = [d for d in candidates if d.code in locked]
+    journals: Dict[str, WorkflowJournal] = {}
+
+    try:
+        if before_files:
+            for doc in work:
+                try:
+                    before_files(doc)
+                except Exception:
+                    pass
+        if act.key == "approve":
+            # intent write-ahead per codice: un crash a meta viene completato/annullato all'apertura dello Store
+            for doc in work:
+                try:
+                    journals[doc.code] = store.begin_workflow_intent(
+                        doc.code, act.event_type, session_id=session_id, host=str(actor.get("host", "")),
+                        payload={
+                            "event_type": act.event_type, "from_state": str(doc.state), "rev_before": int(doc.revision),
+                            "note": note_u, "clear_checkout": act.clear_checkout,
+                            "user": str(actor.get("user_display", "")),
+                        },
+                    )
+                except Exception:
+                    pass
+
+        done_docs: List[Tuple[Document, WorkflowResult]] = []
+        if work:
+            args = (act, work, items, archive_root, log_file, journals, workers)
+            if run_files is not None:
+                done_docs = run_files(_run_files, *args, progress=progress)
+            else:
+                done_docs = _run_files(*args, progress=progress)
+
+        # tutte le modifiche DB in un unico commit
+        activity = []
+        try:
+            with store.transaction():
+                for doc2, res in done_docs:
+                    item = items[doc2.code]
+                    store.update_document(
+                        doc2.code,
+                        state=doc2.state,
+                        revision=doc2.revision,
+                        obs_prev_state=str(getattr(doc2, "obs_prev_state", "") or ""),
+                        file_wip_path=doc2.file_wip_path,
+                        file_rel_path=doc2.file_rel_path,
+                        file_inrev_path=doc2.file_inrev_path,
+                        file_wip_drw_path=doc2.file_wip_drw_path,
+                        file_rel_drw_path=doc2.file_rel_drw_path,
+                        file_inrev_drw_path=doc2.file_inrev_drw_path,
+                    )
+                    if doc2.code in journals:
+                        store.complete_workflow_intent(journals[doc2.code].intent_id)
+                    if res.checksums:
+                        store.record_file_checksums(
+                            doc2.code, [(x.role, x.revision, x.path, x.sha256, x.size) for x in res.checksums]
+                        )
+                    store.add_state_note(
+                        code=doc2.code,
+                        event_type=act.event_type,
+                        from_state=item.from_state,
+                        to_state=str(doc2.state),
+                        note=note_u,
+                        rev_before=item.rev_before,
+                        rev_after=int(doc2.revision),
+                    )
+                    if act.clear_checkout:
+                        store.clear_document_checkout(doc2.code)
+                    details: Dict[str, Any] = {"batch": len(order)}
+                    if res.copies:
+                        details["copies"] = [c.to_details() for c in res.copies]
+                    activity.append(Store.activity_row(
+                        str(actor.get("workspace_id", "")), session_id, str(actor.get("user_id", "")),
+                        str(actor.get("user_display", "")), str(actor.get("host", "")),
+                        f"WF_{act.key.upper()}", code=doc2.code, status="OK",
+                        message=f"{item.from_state}->{doc2.state} (batch)", details=details,
+                    ))
+                if activity:
+                    store.conn.executemany(ACTIVITY_INSERT_SQL, activity)
+        except Exception as e:
+            for doc2, res in done_docs:
+                item = items[doc2.code]
+                if res.undo is not None:
+                    failed = res.undo.run(log_file)
+                    if failed:
+                        item.message = f"Salvataggio DB fallito ({e}); annullamento file incompleto ({failed} passi, vedi log)."
+                    else:
+                        item.message = f"Salvataggio DB fallito ({e}); operazioni file annullate."
+                elif doc2.code in journals:
+                    item.message = f"File aggiornati ma salvataggio DB fallito ({e}); completato dal ripristino all'avvio."
+                else:
+                    item.message = f"Salvataggio DB fallito: {e}"
+            done_docs = []
+
+        for doc2, _res in done_docs:
+            item = items[doc2.code]
+            item.ok = True
+            item.to_state = str(doc2.state)
+            item.rev_after = int(doc2.revision)
+            item.message = item.result.message if item.result else "OK"
+    finally:
+        for code, j in journals.items():
+            if not items[code].ok:
+                try:
+                    j.discard(items[code].message or "transizione non eseguita")  # solo se nessun passo file
+                except Exception:
+                    pass
+            j.close()
+        store.release_document_locks(acquired, session_id)
+
+    out.items = [items[c] for c in order]
+    out.elapsed_s = round(time.perf_counter() - t0, 3)
+    return out
@@ -0,0 +1,130 @@
+"""Pool LRU delle workspace usate di recente (switch senza riaprire tutto).
+
+Una workspace lasciata con uno switch resta "calda": Store aperto (schema
+gia verificato), configurazione letta, activity writer e backup manager,
+piu lo stato delle viste (righe tabella, albero) salvato dai tab. Tornando
+su di essa lo switch e un rebind: i tab applicano solo le modifiche del
+journal doc_changes avvenute nel frattempo.
+
+Limiti: al massimo `max_size` workspace inattive (la meno recente viene
+chiusa), chiusura delle connessioni inattive da piu di `idle_close_s`.
+"""
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .activity_writer import ActivityWriter
+from .backup import BackupManager
+from .config import AppConfig, ConfigManager
+from .store import Store
+
+DEFAULT_POOL_SIZE = 3
+DEFAULT_IDLE_CLOSE_S = 15 * 60
+
+
+@dataclass
+class WorkspaceContext:
+    ws_id: str
+    cfg_mgr: ConfigManager
+    cfg: AppConfig
+    store: Store
+    activity_writer: Optional[ActivityWriter]
+    backup: BackupManager
+    cfg_mtime_ns: int = 0
+    # stato viste per tab (righe, albero, versione doc_changes)
+    view_state: Dict[str, Any] = field(default_factory=dict)
+    last_used: float = field(default_factory=time.monotonic)
+
+    def config_changed(self) -> bool:
+        """True se config.json e stato modificato (es. da un altro PC) dopo la lettura."""
+        try:
+            return os.stat(self.cfg_mgr.path).st_mtime_ns != self.cfg_mtime_ns
+        except OSError:
+            return False
+
+    def close(self) -> None:
+        # i backup accodati usano una connessione propria: non serve attenderli
+        w = self.activity_writer
+        if w is not None:
+            try:
+                w.close()
+            except Exception:
+                pass
+        try:
+            self.store.close()
+        except Exception:
+            pass
+        self.view_state.clear()
+
+
+def config_mtime_ns(cfg_mgr: ConfigManager) -> int:
+    try:
+        return os.stat(cfg_mgr.path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class WorkspacePool:
+    """Workspace inattive in ordine LRU (la workspace attiva non e nel pool)."""
+
+    def __init__(self, max_size: int = DEFAULT_POOL_SIZE, idle_close_s: float = DEFAULT_IDLE_CLOSE_S):
+        self.max_size = max(0, int(max_size))
+        self.idle_close_s = max(0.0, float(idle_close_s))
+        self._items: "OrderedDict[str, WorkspaceContext]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, ws_id: str) -> bool:
+        return ws_id in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def ids(self) -> List[str]:
+        return list(self._items)
+
+    def take(self, ws_id: str) -> Optional[WorkspaceContext]:
+        """Rimuove e ritorna il contesto di `ws_id` (None se non e nel pool)."""
+        ctx = self._items.pop(ws_id, None)
+        if ctx is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return ctx
+
+    def put(self, ctx: WorkspaceContext) -> List[str]:
+        """Aggiunge un contesto lasciato con uno switch; ritorna le workspace chiuse."""
+        old = self._items.pop(ctx.ws_id, None)
+        if old is not None and old is not ctx:
+            old.close()
+        ctx.last_used = time.monotonic()
+        self._items[ctx.ws_id] = ctx
+        closed = []
+        while len(self._items) > self.max_size:
+            ws_id, victim = self._items.popitem(last=False)
+            victim.close()
+            closed.append(ws_id)
+        return closed
+
+    def discard(self, ws_id: str) -> bool:
+        ctx = self._items.pop(ws_id, None)
+        if ctx is None:
+            return False
+        ctx.close()
+        return True
+
+    def close_idle(self) -> List[str]:
+        """Chiude i contesti inattivi da piu di idle_close_s."""
+        limit = time.monotonic() - self.idle_close_s
+        idle = [k for k, c in self._items.items() if c.last_used < limit]
+        for k in idle:
+            self._items.pop(k).close()
+        return idle
+
+    def close_all(self) -> None:
+        while self._items:
+            self._items.popitem(last=False)[1].close()
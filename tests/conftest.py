@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# i test importano pdm_sw dalla radice del repository
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pdm_sw.models import Document  # noqa: E402
+from pdm_sw.store import Store  # noqa: E402
+
+
+def make_doc(code: str, state: str = "WIP", description: str = "TEST", **paths) -> Document:
+    mmm, rest = code.split("_", 1)
+    gggg, seq = rest.split("-", 1)
+    return Document(
+        id=0, code=code, doc_type="PART", mmm=mmm, gggg=gggg, seq=int(seq), vvv="",
+        revision=int(paths.pop("revision", 0)), state=state, description=description,
+        file_wip_path=paths.get("file_wip_path", ""), file_rel_path=paths.get("file_rel_path", ""),
+        file_inrev_path=paths.get("file_inrev_path", ""),
+        file_wip_drw_path="", file_rel_drw_path="", file_inrev_drw_path="",
+        created_at="", updated_at="",
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    st = Store(tmp_path / "pdm.db")
+    yield st
+    st.close()
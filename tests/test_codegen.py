@@ -0,0 +1,19 @@
+from pdm_sw.codegen import create_codes_batch
+from pdm_sw.config import AppConfig
+
+
+def test_create_codes_batch_returns_stored_rows(store):
+    docs = create_codes_batch(store, AppConfig(), "ABC", "GRPA", "PART", ["staffa", "piastra", "perno"])
+    assert [d.description for d in docs] == ["STAFFA", "PIASTRA", "PERNO"]
+    stored = store.get_documents([d.code for d in docs])
+    for d in docs:
+        row = stored[d.code]
+        assert d.id == row.id and d.id > 0
+        assert d.created_at and d.created_at == row.created_at
+        assert d.updated_at == row.updated_at
+        assert d.state == "WIP"
+    assert [d.seq for d in docs] == [1, 2, 3]
+
+
+def test_create_codes_batch_empty(store):
+    assert create_codes_batch(store, AppConfig(), "ABC", "GRPA", "PART", []) == []
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+from conftest import make_doc
+
+
+def _other(store):
+    return sqlite3.connect(str(store.db_path))
+
+
+def test_commit_deferred_until_outer_transaction_ends(store):
+    with store.transaction():
+        store.add_machine("AAA", "macchina")
+        with _other(store) as c:
+            assert c.execute("SELECT count(*) FROM machines;").fetchone()[0] == 0
+    with _other(store) as c:
+        assert c.execute("SELECT count(*) FROM machines;").fetchone()[0] == 1
+
+
+def test_nested_failure_rolls_back_only_inner_block(store):
+    with store.transaction():
+        store.add_machine("AAA", "esterna")
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.add_machine("BBB", "interna")
+                raise RuntimeError("boom")
+        assert store.in_transaction
+    assert store.list_machines() == [("AAA", "esterna")]
+
+
+def test_outer_failure_rolls_back_everything(store):
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.add_machine("AAA", "m")
+            with store.transaction():
+                store.add_machine("BBB", "m")
+            raise RuntimeError("boom")
+    assert store.list_machines() == []
+    assert not store.in_transaction
+
+
+def test_error_catching_method_inside_transaction_keeps_outer_work(store):
+    store.conn.execute(
+        "INSERT INTO document_locks(code, owner_session, owner_user, owner_host, acquired_at, updated_at, expires_at) "
+        "VALUES('OLD', 'x', 'u', 'h', '2000', '2000', '2000-01-01');"
+    )
+    store.conn.execute(
+        "CREATE TRIGGER boom BEFORE INSERT ON document_locks WHEN new.code='BAD' "
+        "BEGIN SELECT RAISE(ABORT, 'boom'); END;"
+    )
+    store.conn.commit()
+    with store.transaction():
+        store.add_machine("AAA", "m")
+        ok, status, _holder = store.acquire_document_lock("BAD", owner_session="s", owner_user="u", owner_host="h")
+        assert not ok and status.startswith("LOCK_ERROR")
+    assert store.list_machines() == [("AAA", "m")]
+    # la pulizia dei lock scaduti fatta dal metodo fallito e annullata con lui
+    codes = [r[0] for r in store.conn.execute("SELECT code FROM document_locks;")]
+    assert codes == ["OLD"]
+
+
+def test_failed_allocation_inside_transaction_leaves_no_counter(store):
+    with store.transaction():
+        store.add_machine("AAA", "m")
+        with pytest.raises(ValueError):
+            store.allocate_seq_range("AAA", "BBBB", "", "PART", 20000)
+    assert store.conn.execute("SELECT count(*) FROM seq_counters;").fetchone()[0] == 0
+    assert store.list_machines() == [("AAA", "m")]
+
+
+def test_checkout_refusal_inside_transaction(store):
+    store.add_document(make_doc("AAA_BBBB-0001", state="REL"))
+    with store.transaction():
+        ok, msg, _ = store.checkout_document("AAA_BBBB-0001", "u", "h")
+        assert not ok and "REL" in msg
+        ok, msg, _ = store.checkout_document("AAA_BBBB-0002", "u", "h")
+        assert not ok
+    assert not store.in_transaction
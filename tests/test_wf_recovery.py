@@ -0,0 +1,84 @@
+from pdm_sw import wf_journal
+
+from conftest import make_doc
+
+CODE = "AAA_BBBB-0001"
+
+
+def _intent(store, **payload):
+    base = {"event_type": "APPROVE_REV", "from_state": "IN_REV", "rev_before": 0, "note": "nota"}
+    base.update(payload)
+    return store.begin_workflow_intent(CODE, "APPROVE_REV", session_id="s", payload=base)
+
+
+def _status(store, intent_id):
+    return store.conn.execute("SELECT status FROM wf_intents WHERE id=?;", (intent_id,)).fetchone()[0]
+
+
+def test_files_done_intent_is_rolled_forward(store, tmp_path):
+    store.add_document(make_doc(CODE, state="IN_REV"))
+    inrev = tmp_path / "inrev.sldprt"
+    inrev.write_bytes(b"x")
+    j = _intent(store)
+    j.step("DELETE", inrev)
+    after = make_doc(CODE, state="REL", revision=1, file_rel_path=str(tmp_path / "rel.sldprt"))
+    j.files_done(after)
+    j.close()
+
+    out = wf_journal.recover_intents(store, grace_seconds=0)
+
+    assert [x["result"] for x in out] == ["COMPLETED"]
+    doc = store.get_document(CODE)
+    assert (doc.state, doc.revision) == ("REL", 1)
+    assert not inrev.exists()
+    assert _status(store, j.intent_id) == "DONE"
+
+
+def test_pending_intent_is_rolled_back(store, tmp_path):
+    store.add_document(make_doc(CODE, state="IN_REV"))
+    src, dst = tmp_path / "rel.sldprt", tmp_path / "rev.sldprt"
+    dst.write_bytes(b"rel")  # spostamento completato, crash prima del commit
+    j = _intent(store)
+    j.done(j.step("MOVE", src, dst))
+    j.close()
+
+    out = wf_journal.recover_intents(store, grace_seconds=0)
+
+    assert [x["result"] for x in out] == ["ROLLED_BACK"]
+    assert src.read_bytes() == b"rel" and not dst.exists()
+    assert store.get_document(CODE).state == "IN_REV"
+    assert _status(store, j.intent_id) == "ROLLED_BACK"
+
+
+def test_replace_without_restore_copy_fails(store, tmp_path):
+    store.add_document(make_doc(CODE, state="IN_REV"))
+    j = _intent(store)
+    j.done(j.step("REPLACE", tmp_path / "inrev.sldprt", tmp_path / "rel.sldprt", tmp_path / "missing.sldprt"))
+    j.close()
+
+    out = wf_journal.recover_intents(store, grace_seconds=0)
+
+    assert out[0]["result"] == "FAILED" and "missing" in out[0]["message"]
+    assert _status(store, j.intent_id) == "FAILED"
+
+
+def test_recent_or_locked_intents_are_skipped(store):
+    store.add_document(make_doc(CODE, state="IN_REV"))
+    j = _intent(store)
+    j.close()
+    assert wf_journal.recover_intents(store) == []  # periodo di grazia
+    store.acquire_document_lock(CODE, owner_session="other", owner_user="u", owner_host="h", ttl_seconds=600)
+    assert wf_journal.recover_intents(store, grace_seconds=0) == []
+    assert _status(store, j.intent_id) == "PENDING"
+
+
+def test_discard_closes_intent_without_steps(store, tmp_path):
+    j = _intent(store)
+    assert j.discard("rifiutata")
+    assert _status(store, j.intent_id) == "ROLLED_BACK"
+    j2 = _intent(store)
+    j2.step("COPY", tmp_path / "a", tmp_path / "b")
+    assert not j2.discard("x")
+    assert _status(store, j2.intent_id) == "PENDING"
+    j.close()
+    j2.close()